@@ -7,9 +7,8 @@ from views.request_page import show_request_page
 from views.bins_page import show_bins_page
 from views.dispatch_page import show_dispatch_page
 from views.facilities_page import show_facilities_page
-from services.bin_service import BinService
 # from services.city_serivce import create_city_grid # Unused
-from services.facility_service import FacilityService
+from services.registry import registry
 from services.vehicle_service import VehicleService
 
 # Ensure the project root is in sys.path
@@ -17,9 +16,9 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-# Initialize services
-bin_service = BinService()
-service = FacilityService()
+# Shared services: built once per process, rebuilt only when their files change
+bin_service = registry.get("bins")
+service = registry.get("facilities")
 
 # Persist VehicleService in session state
 if "vehicle_service" not in st.session_state:
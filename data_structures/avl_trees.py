@@ -1,10 +1,25 @@
+import gc
+
+
 class FacilityAVLTree:
+    """
+    AVL tree of values ordered by key(value). Nodes cache their key, so
+    key() runs once per insert rather than once per level, and every
+    operation is a loop, so no tree is deep enough to hit the recursion limit.
+    Keys are cached: delete a value under its old key before changing the
+    fields its key is built from, then insert it again.
+    """
+
     class Node:
-        def __init__(self, value):
+        __slots__ = ("value", "key", "left", "right", "height", "size")
+
+        def __init__(self, value, key):
             self.value = value
+            self.key = key
             self.left = None
             self.right = None
             self.height = 1
+            self.size = 1  # nodes in this subtree, for rank/select
 
     def __init__(self, key=lambda f: f.id):
         self.root = None
@@ -16,6 +31,17 @@ class FacilityAVLTree:
     def get_height(self, node):
         return node.height if node else 0
 
+    def get_size(self, node):
+        return node.size if node else 0
+
+    def update(self, node):
+        """Recompute a node's height and subtree size from its children"""
+        left, right = node.left, node.right
+        lh, ls = (left.height, left.size) if left else (0, 0)
+        rh, rs = (right.height, right.size) if right else (0, 0)
+        node.height = (lh if lh > rh else rh) + 1
+        node.size = ls + rs + 1
+
     def get_balance(self, node):
         return self.get_height(node.left) - self.get_height(node.right) if node else 0
 
@@ -27,9 +53,9 @@ class FacilityAVLTree:
         x.right = y
         y.left = T2
 
-        # update heights
-        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
-        x.height = 1 + max(self.get_height(x.left), self.get_height(x.right))
+        # update heights and sizes
+        self.update(y)
+        self.update(x)
 
         return x
 
@@ -41,133 +67,298 @@ class FacilityAVLTree:
         y.left = x
         x.right = T2
 
-        # update heights
-        x.height = 1 + max(self.get_height(x.left), self.get_height(x.right))
-        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
+        # update heights and sizes
+        self.update(x)
+        self.update(y)
 
         return y
 
-    # ---------------------------------------------------
-    # INSERT
-    # ---------------------------------------------------
-    def insert(self, value):
-        self.root = self._insert(self.root, value)
-
-    def _insert(self, node, value):
-        if not node:
-            return self.Node(value)
-
-        if self.key(value) < self.key(node.value):
-            node.left = self._insert(node.left, value)
-        else:
-            node.right = self._insert(node.right, value)
-
-        # update height
-        node.height = 1 + max(self.get_height(node.left), self.get_height(node.right))
-
-        # balance
+    def _rebalance(self, node):
+        """Update a node whose subtree changed and rotate it back into balance; returns the subtree's new root"""
+        self.update(node)
         balance = self.get_balance(node)
 
-        # Left left
-        if balance > 1 and self.key(value) < self.key(node.left.value):
+        if balance > 1:
+            # Left right
+            if self.get_balance(node.left) < 0:
+                node.left = self.rotate_left(node.left)
+            # Left left
             return self.rotate_right(node)
 
-        # Right right
-        if balance < -1 and self.key(value) > self.key(node.right.value):
-            return self.rotate_left(node)
-
-        # Left right
-        if balance > 1 and self.key(value) > self.key(node.left.value):
-            node.left = self.rotate_left(node.left)
-            return self.rotate_right(node)
-
-        # Right left
-        if balance < -1 and self.key(value) < self.key(node.right.value):
-            node.right = self.rotate_right(node.right)
+        if balance < -1:
+            # Right left
+            if self.get_balance(node.right) > 0:
+                node.right = self.rotate_right(node.right)
+            # Right right
             return self.rotate_left(node)
 
         return node
 
+    def _retrace(self, path):
+        """Rebalance the nodes on a root-to-leaf path from the bottom up, relinking rotated subtrees"""
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            subtree = self._rebalance(node)
+            if subtree is node:
+                continue
+            if i == 0:
+                self.root = subtree
+            elif path[i - 1].left is node:
+                path[i - 1].left = subtree
+            else:
+                path[i - 1].right = subtree
+
     # ---------------------------------------------------
-    # DELETE
+    # INSERT
     # ---------------------------------------------------
-    def delete(self, key_value):
-        self.root = self._delete(self.root, key_value)
-
-    def _delete(self, node, key_value):
-        if not node:
-            return None
-
-        if key_value < self.key(node.value):
-            node.left = self._delete(node.left, key_value)
-        elif key_value > self.key(node.value):
-            node.right = self._delete(node.right, key_value)
-        else:
-            # node to delete found
-            if not node.left:
-                return node.right
-            elif not node.right:
-                return node.left
+    def insert(self, value):
+        key = self.key(value)
+        new = self.Node(value, key)
+        if self.root is None:
+            self.root = new
+            return
+
+        # walk down to the leaf position (equal keys go right), remembering the path
+        path = []
+        node = self.root
+        while True:
+            path.append(node)
+            if key < node.key:
+                if node.left is None:
+                    node.left = new
+                    break
+                node = node.left
             else:
-                # smallest right subtree (inorder successor)
-                successor = node.right
-                while successor.left:
-                    successor = successor.left
-
-                node.value = successor.value
-                node.right = self._delete(node.right, self.key(successor.value))
+                if node.right is None:
+                    node.right = new
+                    break
+                node = node.right
 
-        # update height
-        node.height = 1 + max(self.get_height(node.left), self.get_height(node.right))
+        # update height and size, and balance, on the way back up
+        self._retrace(path)
 
-        # balance
-        balance = self.get_balance(node)
-
-        # Left left
-        if balance > 1 and self.get_balance(node.left) >= 0:
-            return self.rotate_right(node)
-
-        # Left right
-        if balance > 1 and self.get_balance(node.left) < 0:
-            node.left = self.rotate_left(node.left)
-            return self.rotate_right(node)
-
-        # Right right
-        if balance < -1 and self.get_balance(node.right) <= 0:
-            return self.rotate_left(node)
+    # ---------------------------------------------------
+    # BULK LOAD
+    # ---------------------------------------------------
+    def bulk_load(self, values):
+        """
+        Replace the tree with `values`, building a perfectly balanced tree in
+        O(n). Values already in key order (facilities.json is saved in id
+        order) are taken as they are; anything else is sorted first.
+        """
+        values = list(values)
+        keys = list(map(self.key, values))
+        # Nothing built here can be garbage, so keep the cycle collector from
+        # rescanning the heap over and over while a large tree is allocated.
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            if any(a > b for a, b in zip(keys, keys[1:])):
+                order = sorted(range(len(keys)), key=keys.__getitem__)  # by key only: values need not be comparable
+                nodes = [self.Node(values[i], keys[i]) for i in order]
+            else:
+                nodes = list(map(self.Node, values, keys))
+
+            # The middle of each slice roots it and the halves become its subtrees.
+            # A subtree built this way from m nodes has size m and height m.bit_length().
+            self.root = nodes[(len(nodes) - 1) // 2] if nodes else None
+            stack = [(0, len(nodes) - 1)] if nodes else []
+            while stack:
+                lo, hi = stack.pop()
+                mid = (lo + hi) // 2
+                node = nodes[mid]
+                node.size = hi - lo + 1
+                node.height = node.size.bit_length()
+                if lo < mid:
+                    node.left = nodes[(lo + mid - 1) // 2]
+                    stack.append((lo, mid - 1))
+                if mid < hi:
+                    node.right = nodes[(mid + 1 + hi) // 2]
+                    stack.append((mid + 1, hi))
+        finally:
+            if collecting:
+                gc.enable()
 
-        # Right left
-        if balance < -1 and self.get_balance(node.right) > 0:
-            node.right = self.rotate_right(node.right)
-            return self.rotate_left(node)
+    # ---------------------------------------------------
+    # DELETE
+    # ---------------------------------------------------
+    def delete(self, key_value):
+        path = []
+        node = self.root
+        while node is not None and node.key != key_value:
+            path.append(node)
+            node = node.left if key_value < node.key else node.right
+        if node is None:
+            return
+
+        if node.left is not None and node.right is not None:
+            # take over the inorder successor (smallest of the right subtree), then unlink it instead
+            path.append(node)
+            successor = node.right
+            while successor.left is not None:
+                path.append(successor)
+                successor = successor.left
+            node.value, node.key = successor.value, successor.key
+            node = successor
+
+        # node has at most one child now: splice it out
+        child = node.left if node.left is not None else node.right
+        if not path:
+            self.root = child
+            return
+        if path[-1].left is node:
+            path[-1].left = child
+        else:
+            path[-1].right = child
 
-        return node
+        self._retrace(path)
 
     # ---------------------------------------------------
     # SEARCH
     # ---------------------------------------------------
     def search(self, key_value):
-        return self._search(self.root, key_value)
+        node = self.root
+        while node is not None:
+            if key_value == node.key:
+                return node.value
+            node = node.left if key_value < node.key else node.right
+        return None
+
+    # ---------------------------------------------------
+    # ORDERED QUERIES
+    # ---------------------------------------------------
+    def __iter__(self):
+        return self.range()
+
+    def range(self, lo=None, hi=None):
+        """
+        Lazily yield the values with lo <= key <= hi in key order (None leaves
+        that side open). Subtrees entirely below lo are never entered and the
+        walk stops at the first key above hi, so it costs O(log n + k).
+        """
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                if lo is not None and node.key < lo:
+                    node = node.right  # this node and its left subtree are below lo
+                else:
+                    stack.append(node)
+                    node = node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if hi is not None and node.key > hi:
+                return
+            yield node.value
+            node = node.right
+
+    def count_range(self, lo=None, hi=None):
+        """Number of values with lo <= key <= hi, from subtree sizes in O(log n)"""
+        below_hi = len(self) if hi is None else self._count_below(hi, inclusive=True)
+        below_lo = 0 if lo is None else self._count_below(lo, inclusive=False)
+        return max(below_hi - below_lo, 0)
+
+    def floor(self, key_value):
+        """Value with the largest key <= key_value (None if there is none)"""
+        node, best = self.root, None
+        while node:
+            k = node.key
+            if k == key_value:
+                return node.value
+            if k < key_value:
+                best = node.value
+                node = node.right
+            else:
+                node = node.left
+        return best
+
+    def ceiling(self, key_value):
+        """Value with the smallest key >= key_value (None if there is none)"""
+        node, best = self.root, None
+        while node:
+            k = node.key
+            if k == key_value:
+                return node.value
+            if k > key_value:
+                best = node.value
+                node = node.left
+            else:
+                node = node.right
+        return best
 
-    def _search(self, node, key_value):
-        if not node:
+    # ---------------------------------------------------
+    # ORDER STATISTICS
+    # ---------------------------------------------------
+    def __len__(self):
+        return self.get_size(self.root)
+
+    def _count_below(self, key_value, inclusive):
+        count, node = 0, self.root
+        while node:
+            k = node.key
+            if k < key_value or (inclusive and k == key_value):
+                count += self.get_size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
+
+    def rank(self, key_value):
+        """Number of values with a key smaller than key_value (its 0-based position if present)"""
+        return self._count_below(key_value, inclusive=False)
+
+    def select(self, k):
+        """The value at 0-based position k in key order (None if out of range), in O(log n)"""
+        if k < 0 or k >= len(self):
             return None
-        if key_value == self.key(node.value):
-            return node.value
-        if key_value < self.key(node.value):
-            return self._search(node.left, key_value)
-        return self._search(node.right, key_value)
+        node = self.root
+        while node:
+            left = self.get_size(node.left)
+            if k < left:
+                node = node.left
+            elif k == left:
+                return node.value
+            else:
+                k -= left + 1
+                node = node.right
+        return None
+
+    def slice(self, offset, limit=None):
+        """
+        Lazily yield up to `limit` values starting at position `offset` in key
+        order (all the rest if limit is None): O(log n + limit), for paging.
+        """
+        if limit is not None and limit <= 0:
+            return
+        # descend to position `offset`, keeping the ancestors still to be visited
+        stack = []
+        node, k = self.root, max(offset, 0)
+        while node:
+            left = self.get_size(node.left)
+            if k < left:
+                stack.append(node)
+                node = node.left
+            elif k == left:
+                stack.append(node)
+                break
+            else:
+                k -= left + 1
+                node = node.right
+        count = 0
+        while stack:
+            node = stack.pop()
+            yield node.value
+            count += 1
+            if limit is not None and count >= limit:
+                return
+            node = node.right
+            while node:
+                stack.append(node)
+                node = node.left
 
     # ---------------------------------------------------
     # INORDER TRAVERSAL
     # ---------------------------------------------------
     def inorder(self):
-        result = []
-        self._inorder(self.root, result)
-        return result
-
-    def _inorder(self, node, result):
-        if node:
-            self._inorder(node.left, result)
-            result.append(node.value)
-            self._inorder(node.right, result)
+        return list(self.range())
@@ -7,6 +7,7 @@ class Node:
 class LinkedList:
     def __init__(self):
         self.head = None
+        self.tail = None  # last node, so append is O(1)
         self.size = 0
 
     def append(self, data):
@@ -14,10 +15,8 @@ class LinkedList:
         if not self.head:
             self.head = new_node
         else:
-            curr = self.head
-            while curr.next:
-                curr = curr.next
-            curr.next = new_node
+            self.tail.next = new_node
+        self.tail = new_node
         self.size += 1
 
     def remove(self, condition_fn):
@@ -30,6 +29,8 @@ class LinkedList:
                     prev.next = curr.next
                 else:
                     self.head = curr.next
+                if curr is self.tail:
+                    self.tail = prev
                 self.size -= 1
                 return True
             prev = curr
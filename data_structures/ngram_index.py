@@ -0,0 +1,102 @@
+class NGramIndex:
+    """
+    Case-insensitive substring search over short texts (names, locations)
+    through an inverted index from character n-grams (trigrams by default)
+    to the ids of the texts containing them.
+
+    A query's n-grams must all occur in a matching text, so intersecting
+    their id sets (smallest first) leaves a few candidates, and only those
+    are checked with a real substring test. Queries shorter than n have no
+    n-gram and fall back to scanning the texts.
+
+    The postings are built on the first search, so services that never
+    search pay only for remembering each text; after that add/remove keep
+    them up to date incrementally.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.texts = {}  # id -> lowercased text
+        self.postings = None  # n-gram -> set of ids, once built
+
+    def _grams(self, text):
+        n = self.n
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    # -------------------- UPDATES --------------------
+
+    def add(self, key, text):
+        """Index (or re-index) the text of one id"""
+        text = (text or "").lower()
+        old = self.texts.get(key)
+        if old == text:
+            return
+        if old is not None:
+            self.remove(key)
+        self.texts[key] = text
+        if self.postings is not None:
+            for gram in self._grams(text):
+                self.postings.setdefault(gram, set()).add(key)
+
+    def add_many(self, items):
+        """Index many (id, text) pairs"""
+        for key, text in items:
+            self.add(key, text)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None or self.postings is None:
+            return
+        for gram in self._grams(text):
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(key)
+                if not ids:
+                    del self.postings[gram]
+
+    def clear(self):
+        self.texts = {}
+        self.postings = None
+
+    def _build(self):
+        postings = {}
+        for key, text in self.texts.items():
+            for gram in self._grams(text):
+                ids = postings.get(gram)
+                if ids is None:
+                    postings[gram] = {key}
+                else:
+                    ids.add(key)
+        self.postings = postings
+
+    # -------------------- QUERIES --------------------
+
+    def search(self, query):
+        """Set of ids whose text contains query (case-insensitive); every id for an empty query"""
+        query = (query or "").lower()
+        if not query:
+            return set(self.texts)
+        if len(query) < self.n:
+            return {key for key, text in self.texts.items() if query in text}
+
+        if self.postings is None:
+            self._build()
+        sets = []
+        for gram in self._grams(query):
+            ids = self.postings.get(gram)
+            if not ids:
+                return set()
+            sets.append(ids)
+        sets.sort(key=len)
+        candidates = sets[0].intersection(*sets[1:])
+        if len(query) == self.n:
+            return candidates  # the query is its own single n-gram
+        # a text can hold every n-gram without the query ("banana" has all of "ananan"'s)
+        texts = self.texts
+        return {key for key in candidates if query in texts[key]}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __contains__(self, key):
+        return key in self.texts
@@ -33,6 +33,7 @@
 #         self._heap.clear()
 
 import heapq
+import itertools
 
 class MaxHeap:
     def __init__(self):
@@ -48,3 +49,244 @@ class MaxHeap:
 
     def is_empty(self):
         return len(self.heap) == 0
+
+
+class IndexedMaxHeap:
+    """
+    Binary max-heap that keeps a key -> position index so any entry can be
+    re-prioritised or removed in O(log n) without rebuilding the heap.
+    Entries with equal priority are ordered by key (smallest key first).
+    """
+
+    def __init__(self):
+        self.heap = []      # list of [priority, key, item]
+        self.position = {}  # key -> index in self.heap
+
+    # ---------------------------------------------------
+    # Utility Functions
+    # ---------------------------------------------------
+    def _higher(self, a, b):
+        """True if entry a should sit above entry b."""
+        if a[0] != b[0]:
+            return a[0] > b[0]
+        return a[1] < b[1]
+
+    def _swap(self, i, j):
+        self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+        self.position[self.heap[i][1]] = i
+        self.position[self.heap[j][1]] = j
+
+    def _sift_up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self._higher(self.heap[i], self.heap[parent]):
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        n = len(self.heap)
+        while True:
+            best = i
+            left = 2 * i + 1
+            right = left + 1
+            if left < n and self._higher(self.heap[left], self.heap[best]):
+                best = left
+            if right < n and self._higher(self.heap[right], self.heap[best]):
+                best = right
+            if best == i:
+                return
+            self._swap(i, best)
+            i = best
+
+    # ---------------------------------------------------
+    # Public API
+    # ---------------------------------------------------
+    def push(self, key, priority, item=None):
+        """Insert a new entry, or re-prioritise it if the key already exists."""
+        if key in self.position:
+            self.heap[self.position[key]][2] = item
+            self.update(key, priority)
+            return
+        self.heap.append([priority, key, item])
+        self.position[key] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def push_many(self, entries):
+        """
+        Insert or re-prioritise many (key, priority, item) entries at once.
+        Instead of a sift per entry the array is re-sorted (a sorted array
+        is a valid heap), which runs in C and beats m Python-level sifts.
+        """
+        for key, priority, item in entries:
+            i = self.position.get(key)
+            if i is not None:
+                self.heap[i][0] = priority
+                self.heap[i][2] = item
+            else:
+                self.heap.append([priority, key, item])
+        self.heap.sort(key=lambda entry: (-entry[0], entry[1]))
+        self.position = {entry[1]: i for i, entry in enumerate(self.heap)}
+
+    def update(self, key, priority):
+        """Change the priority of an existing key. Returns False if missing."""
+        i = self.position.get(key)
+        if i is None:
+            return False
+        old = self.heap[i][0]
+        self.heap[i][0] = priority
+        if priority > old:
+            self._sift_up(i)
+        elif priority < old:
+            self._sift_down(i)
+        return True
+
+    def remove(self, key):
+        """Remove an entry by key and return its item (None if missing)."""
+        i = self.position.pop(key, None)
+        if i is None:
+            return None
+        entry = self.heap[i]
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.position[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self.position[last[1]])
+        return entry[2]
+
+    def pop(self):
+        """Remove and return the item with the highest priority."""
+        if not self.heap:
+            return None
+        return self.remove(self.heap[0][1])
+
+    def peek(self):
+        """Return the item with the highest priority without removing it."""
+        if not self.heap:
+            return None
+        return self.heap[0][2]
+
+    def peek_k(self, k):
+        """
+        Return the k highest-priority items in order without modifying the heap.
+        Walks the heap with a small frontier heap, so it costs O(k log k).
+        """
+        result = []
+        if k <= 0 or not self.heap:
+            return result
+        frontier = [(-self.heap[0][0], self.heap[0][1], 0)]
+        while frontier and len(result) < k:
+            _, _, i = heapq.heappop(frontier)
+            result.append(self.heap[i][2])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self.heap):
+                    entry = self.heap[child]
+                    heapq.heappush(frontier, (-entry[0], entry[1], child))
+        return result
+
+    def priority(self, key):
+        """Return the current priority of a key (None if missing)."""
+        i = self.position.get(key)
+        return self.heap[i][0] if i is not None else None
+
+    def clear(self):
+        self.heap.clear()
+        self.position.clear()
+
+    def is_empty(self):
+        return len(self.heap) == 0
+
+    def __contains__(self, key):
+        return key in self.position
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class LazyPriorityQueue:
+    """
+    Max-priority queue over keyed items using lazy invalidation: updates and
+    removals only touch the key -> entry map, and superseded heap entries are
+    discarded when they reach the top. All operations are O(log n) amortised.
+    """
+
+    def __init__(self):
+        self.heap = []     # (-priority, seq, key)
+        self.entries = {}  # key -> (seq, priority, item)
+        self._counter = itertools.count()  # for stable ordering / versioning
+
+    def push(self, key, priority, item):
+        """Insert an item, or replace the priority of an existing key."""
+        seq = next(self._counter)
+        self.entries[key] = (seq, priority, item)
+        heapq.heappush(self.heap, (-priority, seq, key))
+        self._maybe_compact()
+
+    def update(self, key, priority):
+        """Re-prioritise an existing key. Returns False if missing."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        self.push(key, priority, entry[2])
+        return True
+
+    def remove(self, key):
+        """Invalidate a key; its heap entry is dropped lazily."""
+        entry = self.entries.pop(key, None)
+        return entry[2] if entry else None
+
+    def _is_live(self, heap_entry):
+        entry = self.entries.get(heap_entry[2])
+        return entry is not None and entry[0] == heap_entry[1]
+
+    def _discard_stale(self):
+        while self.heap and not self._is_live(self.heap[0]):
+            heapq.heappop(self.heap)
+
+    def _maybe_compact(self):
+        # keep stale entries bounded so memory stays O(live items)
+        if len(self.heap) > 2 * len(self.entries) + 32:
+            self.heap = [(-p, seq, key) for key, (seq, p, _) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def pop(self):
+        """Remove and return the item with the highest priority."""
+        self._discard_stale()
+        if not self.heap:
+            return None
+        _, _, key = heapq.heappop(self.heap)
+        return self.entries.pop(key)[2]
+
+    def peek(self):
+        """Return the item with the highest priority without removing it."""
+        self._discard_stale()
+        if not self.heap:
+            return None
+        return self.entries[self.heap[0][2]][2]
+
+    def peek_k(self, k):
+        """Return the k highest-priority items in order, leaving the queue intact."""
+        taken = []
+        while len(taken) < k:
+            self._discard_stale()
+            if not self.heap:
+                break
+            taken.append(heapq.heappop(self.heap))
+        for heap_entry in taken:
+            heapq.heappush(self.heap, heap_entry)
+        return [self.entries[key][2] for _, _, key in taken]
+
+    def priority(self, key):
+        """Return the current priority of a key (None if missing)."""
+        entry = self.entries.get(key)
+        return entry[1] if entry else None
+
+    def is_empty(self):
+        return len(self.entries) == 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,6 +1,6 @@
 # data_structures/queue.py
 
-from collections import deque
+from collections import deque, OrderedDict
 
 class Queue:
     def __init__(self):
@@ -31,3 +31,54 @@ class Queue:
     def __iter__(self):
         """Allow iteration through queue items (for displaying in UI)."""
         return iter(self.items)
+
+
+class IndexedQueue:
+    """
+    FIFO queue that also indexes its items by key, so lookup and removal
+    from the middle of the queue are O(1) instead of a scan and rebuild.
+    """
+
+    def __init__(self, key=lambda item: item.id):
+        self.key = key
+        self.items = OrderedDict()  # key -> item, in arrival order
+
+    def enqueue(self, item):
+        """Add element to the back of the queue."""
+        self.items[self.key(item)] = item
+
+    def dequeue(self):
+        """Remove and return the element from the front of the queue."""
+        if self.is_empty():
+            return None
+        return self.items.popitem(last=False)[1]
+
+    def peek(self):
+        """Return the front element without removing it."""
+        if self.is_empty():
+            return None
+        return next(iter(self.items.values()))
+
+    def get(self, key):
+        """Return the element with the given key (None if missing)."""
+        return self.items.get(key)
+
+    def remove(self, key):
+        """Remove and return the element with the given key (None if missing)."""
+        return self.items.pop(key, None)
+
+    def is_empty(self):
+        return len(self.items) == 0
+
+    def size(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        """Allow iteration through queue items (for displaying in UI)."""
+        return iter(self.items.values())
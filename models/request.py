@@ -20,13 +20,15 @@
 from datetime import datetime
 
 class Request:
-    def __init__(self, user, bin_id, request_type, id=None, status="pending", time=None):
+    def __init__(self, user, bin_id, request_type, id=None, status="pending", time=None, reporters=None, count=None):
         self.id = id
         self.user = user
         self.bin_id = bin_id
         self.request_type = request_type
         self.status = status  # pending, processed, cancelled
         self.time = time if time else datetime.now()
+        self.reporters = reporters if reporters else [user]  # everyone who filed this request
+        self.count = count if count else len(self.reporters)  # duplicate reports coalesced into it
 
     def to_dict(self):
         return {
@@ -35,7 +37,9 @@ class Request:
             "bin_id": self.bin_id,
             "request_type": self.request_type,
             "status": self.status,
-            "time": self.time.isoformat()  # convert datetime to string for JSON
+            "time": self.time.isoformat(),  # convert datetime to string for JSON
+            "reporters": list(self.reporters),
+            "count": self.count
         }
 
     @staticmethod
@@ -47,5 +51,7 @@ class Request:
             bin_id=data["bin_id"],
             request_type=data["request_type"],
             status=data.get("status", "pending"),
-            time=datetime.fromisoformat(data["time"])
+            time=datetime.fromisoformat(data["time"]),
+            reporters=data.get("reporters"),
+            count=data.get("count")
         )
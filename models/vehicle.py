@@ -61,3 +61,18 @@ class Vehicle:
         v.dist_return = data.get("dist_return", 0)
         v.total_distance = data.get("total_distance", 0)
         return v
+
+    def update_from_dict(self, data):
+        """Apply fields from a (possibly partial) to_dict() snapshot, e.g. an undo diff"""
+        for key, value in data.items():
+            if key == "id":
+                continue
+            if key == "current_node":
+                value = tuple(value)
+            elif key == "target_bin":
+                from models.bin import Bin
+                value = Bin.from_dict(value) if value else None
+            elif key == "target_facility":
+                from models.facility import Facility
+                value = Facility.from_dict(value) if value else None
+            setattr(self, key, value)
@@ -1,50 +1,516 @@
 import sys
 import os
 import json
+import threading
+import time
 from data_structures.linked_list import LinkedList
+from data_structures.ngram_index import NGramIndex
+from data_structures.priority_queue import IndexedMaxHeap
 from models.bin import Bin
 from services.history_service import HistoryService
+from services.sequence_service import SequenceService
+from services.sqlite_store import get_store
+from services.storage import AppendLog, CorruptSnapshot, atomic_write_json, file_lock, file_version
+from services.unit_of_work import UnitOfWork
 
 # make file path robust relative to project root
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATA_FILE = os.path.join(PROJECT_ROOT, "data", "bins.json")
 
 class BinService:
-    def __init__(self, file_path=DATA_FILE):
+    # Fold the mutation log into a fresh bins.json snapshot after this many
+    # records, or once the oldest un-snapshotted record is this many seconds old
+    COMPACT_EVERY = 1000
+    COMPACT_INTERVAL = 300
+
+    def __init__(self, file_path=DATA_FILE, store=None, history=None):
         self.file_path = file_path
+        # SQLite repository when a store is configured (see services/sqlite_store.py),
+        # otherwise the bins.json snapshot plus the mutation log below
+        self.store = get_store(store)
+        self.repo = self.store.repository("bins") if self.store else None
+        # bins.json is the snapshot; every change since then is appended here
+        self.log_path = os.path.splitext(file_path)[0] + ".log.jsonl"
+        self.log = AppendLog(self.log_path)
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._last_compaction = time.monotonic()
         self.bins = LinkedList()
+        self.by_id = {}  # bin id -> Bin, for O(1) lookups
+        # Bins with waste in them, keyed by bin id and ordered by fill level
+        self.heap = IndexedMaxHeap()
+        # Trigram indexes over bin locations and ids (as text), for search_by_location() and search()
+        self.location_index = NGramIndex()
+        self.id_index = NGramIndex()
+        # Callbacks fired as fn(bin, old_level, timestamp) whenever a fill level changes;
+        # changes made under the lock wait here until it is released (see _notify_fill)
+        self.fill_listeners = []
+        self._deferred = []
+        # While a unit of work is open: log records waiting for commit, and the
+        # state of every touched bin before it started (None if it was added)
+        self._batch = None
+        self._batch_prior = None
+        self._committed_prior = None  # _batch_prior of the last commit(), for compensate()
+        # Version of the on-disk state held in memory (see refresh()): the
+        # snapshot file, how far into which log file we have read, or the
+        # database generation
+        self._snapshot_version = None
+        self._log_ino = None
+        self._log_offset = 0
+        self._generation = 0
+        # bins.json failed to parse: the bins come from the log alone, and
+        # nothing may compact over the file until someone repairs it
+        self._corrupt = False
+        # bin ids are issued from a persistent counter, so a removed bin's id is never reused
+        self.sequence = SequenceService(os.path.join(os.path.dirname(file_path), "sequences.json"),
+                                        store=self.store or False)
         self.load_bins()
-        self.history = HistoryService()
+        self.sequence.ensure_at_least("bin", max(self.by_id, default=0))
+        # undo history: by default the one next to the bins file, so a store
+        # elsewhere (a benchmark, an import) never touches the real data/history
+        self.history = history or HistoryService(os.path.join(os.path.dirname(file_path), "history.json"),
+                                                 store=self.store or False)
+
+    def _read_records(self):
+        """
+        Current state on disk as {bin id: dict}, remembering which version of
+        the files (or which database generation) it reflects.
+        """
+        records = {}  # bin id -> dict, in list order
+        if self.repo is not None:
+            self._generation = self.store.generation("bins")
+            for item in self.repo.all():
+                records[item["id"]] = item
+            return records
+
+        self._snapshot_version = file_version(self.file_path)
+        self._corrupt = False
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, "r") as f:
+                    raw = f.read().strip()
+                    if raw:
+                        for item in json.loads(raw):
+                            records[item["id"]] = item
+            except json.JSONDecodeError:
+                # keep running on the log, but a compaction would replace the
+                # file with only that: see _check_snapshot()
+                self._corrupt = True
+
+        # A log left behind by an interrupted compaction comes before the live one.
+        # Records hold full bin state, so replaying them over a newer snapshot is harmless.
+        for entry in AppendLog.read(self.log_path + ".old"):
+            self._replay(records, entry)
+        live = file_version(self.log_path)
+        entries, self._log_offset = AppendLog.read_from(self.log_path)
+        self._log_ino = live[0] if live else None
+        for entry in entries:
+            self._replay(records, entry)
+        self.log.entries = len(entries)
+        return records
 
     def load_bins(self):
-        """Read JSON file and populate the LinkedList using Bin.from_dict"""
-        if not os.path.exists(self.file_path):
+        """Read the bins.json snapshot, replay the mutation log on top, then populate the LinkedList"""
+        with self._lock:
+            self._reload()
+        self._fire_deferred()
+
+    def _reload(self, locked=False):
+        """Bring every bin in line with the state on disk, updating existing objects in place"""
+        if self.repo is None and not locked:
+            # a compaction in another process holds this lock while it moves the log aside
+            with file_lock(self.file_path, shared=True):
+                return self._reload(locked=True)
+        records = self._read_records()
+        if not self.by_id:
+            # first load: build the list and heap in one go
+            self._add_many([Bin.from_dict(item) for item in records.values()])
+            return bool(records)
+        changed = False
+        for bin_id in [i for i in self.by_id if i not in records]:
+            changed = self._apply_delete(bin_id) or changed
+        for item in records.values():
+            changed = self._apply_put(item) or changed
+        return changed
+
+    def refresh(self):
+        """
+        Catch up with changes other processes (or other BinService instances)
+        wrote. A no-op costing a couple of stat calls (or one query) when
+        nothing changed; new log records (or the rows changed since the
+        table generation we hold) are applied as deltas, and only a
+        rewritten snapshot forces a full re-read. Returns True if a bin changed.
+        """
+        with self._lock:
+            if self._batch is not None or self._compacting:
+                return False
+            changed = self._catch_up()
+        self._fire_deferred()
+        return changed
+
+    def _catch_up(self, locked=False):
+        if self.repo is not None:
+            generation = self.store.generation("bins")
+            if generation == self._generation:
+                return False
+            if generation < self._generation:
+                return self._reload()  # a different (or recreated) database
+            # only the rows written since the generation we hold
+            self._generation, changes = self.repo.changed_since(self._generation)
+            changed = False
+            for bin_id, data in changes.items():
+                changed = (self._apply_delete(bin_id) if data is None else self._apply_put(data)) or changed
+            return changed
+
+        if file_version(self.file_path) != self._snapshot_version:
+            return self._reload(locked)
+        live = file_version(self.log_path)
+        if live is None or (live[0] == self._log_ino and live[2] == self._log_offset):
+            return False
+        if live[0] != self._log_ino:
+            if self._log_offset:
+                return self._reload(locked)  # the log we were reading was rotated away
+            self._log_ino = live[0]
+        entries, self._log_offset = AppendLog.read_from(self.log_path, self._log_offset)
+        changed = False
+        for entry in entries:
+            changed = self._apply_record(entry) or changed
+        return changed
+
+    def _apply_record(self, entry):
+        """Apply one log record to memory only (no log write, no history)"""
+        if entry.get("op") == "put":
+            return self._apply_put(entry["bin"], entry.get("time"))
+        if entry.get("op") == "del":
+            return self._apply_delete(entry["id"])
+        if entry.get("op") == "batch":
+            changed = False
+            for op in entry["ops"]:
+                changed = self._apply_record(op) or changed
+            return changed
+        return False
+
+    def _apply_put(self, data, timestamp=None):
+        b = self.by_id.get(data["id"])
+        fresh = Bin.from_dict(data)
+        if b is None:
+            self.bins.append(fresh)
+            self.by_id[fresh.id] = fresh
+            self._index_bin(fresh)
+            self.location_index.add(fresh.id, fresh.location)
+            self.id_index.add(fresh.id, str(fresh.id))
+            return True
+        if b.to_dict() == fresh.to_dict():
+            return False
+        # update the existing object: vehicles and requests keep pointing at it
+        old_level = b.fill_level
+        for key, value in vars(fresh).items():
+            setattr(b, key, value)
+        self._index_bin(b)
+        self.location_index.add(b.id, b.location)
+        if b.fill_level != old_level:
+            self._notify_fill(b, old_level, timestamp)
+        return True
+
+    def _apply_delete(self, bin_id):
+        if bin_id not in self.by_id:
+            return False
+        self.bins.remove(lambda node: node.id == bin_id)
+        self.heap.remove(bin_id)
+        self.location_index.remove(bin_id)
+        self.id_index.remove(bin_id)
+        del self.by_id[bin_id]
+        return True
+
+    @staticmethod
+    def _replay(records, entry):
+        if entry.get("op") == "put":
+            records[entry["bin"]["id"]] = entry["bin"]
+        elif entry.get("op") == "del":
+            records.pop(entry["id"], None)
+        elif entry.get("op") == "batch":
+            # one unit of work, written as a single line so it applies all or nothing
+            for op in entry["ops"]:
+                BinService._replay(records, op)
+
+    def _log(self, record):
+        if self._batch is not None:
+            self._batch.append(record)
+        elif self.repo is not None:
+            self._write_repo([record])
+        else:
+            self._skip_own(self.log.append(record))
+            self._maybe_compact()
+
+    def _write_repo(self, records):
+        """Apply log records to the SQLite repository in one transaction"""
+        generation = self.repo.write([("put", r["bin"]) if r["op"] == "put" else ("del", r["id"])
+                                      for r in records])
+        if generation == self._generation + 1:
+            self._generation = generation  # nobody else wrote in between
+
+    def _skip_own(self, written):
+        """Move the refresh offset past our own append if nobody else appended before it"""
+        ino, end, size = written
+        if self._log_ino in (None, ino) and end - size == self._log_offset:
+            self._log_ino, self._log_offset = ino, end
+
+    def _log_put(self, b, timestamp=None):
+        """
+        Append the bin's new state to the mutation log (O(1) bytes per
+        change), with the time of the sensor reading behind it if there is
+        one, so other processes hand their fill listeners the same time.
+        """
+        record = {"op": "put", "bin": b.to_dict()}
+        if timestamp is not None:
+            record["time"] = timestamp
+        self._log(record)
+
+    def _log_delete(self, bin_id):
+        self._log({"op": "del", "id": bin_id})
+
+    def _maybe_compact(self):
+        """Start a background compaction once the log is large or old enough"""
+        if self.repo is not None or self._compacting or self._corrupt or self.log.entries == 0:
             return
+        if (self.log.entries >= self.COMPACT_EVERY
+                or time.monotonic() - self._last_compaction >= self.COMPACT_INTERVAL):
+            self.compact(background=True)
+
+    def compact(self, background=False):
+        """
+        Write every bin to a new bins.json snapshot (temp file + atomic rename)
+        and drop the log records it now covers.
+        """
+        if self.repo is not None:
+            return  # every change is already in the database
+        with self._lock:
+            if self._compacting or self._batch is not None:
+                return  # an open unit of work compacts after its commit
+            self._check_snapshot()
+            self._compacting = True
+
+        if background:
+            threading.Thread(target=self._compact, daemon=True).start()
+        else:
+            self._compact()
+
+    def _check_snapshot(self):
+        if self._corrupt:
+            raise CorruptSnapshot(f"{self.file_path} could not be parsed; repair or remove it "
+                                  f"before it is compacted over (the bins in memory come from the log alone)")
 
+    def _compact(self, add=()):
+        """Write the snapshot; bins in `add` (a bulk import) are added under the same locks first"""
+        old_log = self.log_path + ".old"
         try:
-            with open(self.file_path, "r") as f:
-                raw = f.read().strip()
-                if not raw:
-                    return
-                data = json.loads(raw)
-                for item in data:
-                    # use from_dict or explicit keywords
-                    b = Bin.from_dict(item)
-                    self.bins.append(b)
-        except json.JSONDecodeError:
-            # empty or corrupted file — ignore for now
-            return
+            # One compaction at a time across processes; readers wait for it too
+            with file_lock(self.file_path):
+                with self._lock, self.log.locked():
+                    # fold in what other processes appended, then capture the
+                    # state and cut the log at the same point
+                    self._catch_up(locked=True)
+                    self._check_snapshot()
+                    if add:
+                        self._add_many(add)
+                    data = [b.to_dict() for b in self.bins]
+                    self.log.rotate(old_log)
+                    self._log_ino, self._log_offset = None, 0
+                atomic_write_json(self.file_path, data, one_per_line=True)
+                self._snapshot_version = file_version(self.file_path)
+                if os.path.exists(old_log):
+                    os.remove(old_log)
+        finally:
+            self._last_compaction = time.monotonic()
+            self._compacting = False
+        self._fire_deferred()
 
     def save_bins(self):
-        """Convert LinkedList back to JSON using each bin.to_dict()"""
-        data = [b.to_dict() for b in self.bins]
-        # ensure data folder exists
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        with open(self.file_path, "w") as f:
-            json.dump(data, f, indent=4)
+        """Convert LinkedList back to JSON using each bin.to_dict() (a full snapshot)"""
+        self.compact()
+
+    def close(self):
+        """Flush and close the mutation log"""
+        self.log.close()
+
+    def _add_many(self, bins):
+        for b in bins:
+            self.bins.append(b)
+            self.by_id[b.id] = b
+        self.location_index.add_many((b.id, b.location) for b in bins)
+        self.id_index.add_many((b.id, str(b.id)) for b in bins)
+        self.heap.push_many((b.id, b.fill_level, b) for b in bins if b.fill_level > 0)
+
+    def _index_bin(self, b):
+        """Keep the urgency heap in sync with a bin's current fill level"""
+        if b.fill_level > 0:
+            self.heap.push(b.id, b.fill_level, b)
+        else:
+            self.heap.remove(b.id)
+
+    def add_fill_listener(self, fn):
+        """
+        Register fn(bin, old_level, timestamp) to be called after a bin's fill
+        level changes. timestamp is the reading's time (epoch seconds) when
+        the change came from a timestamped sensor reading, else None (now).
+        """
+        self.fill_listeners.append(fn)
+
+    def remove_fill_listener(self, fn):
+        if fn in self.fill_listeners:
+            self.fill_listeners.remove(fn)
+
+    def _notify_fill(self, b, old_level, timestamp=None):
+        # Listeners take their own services' locks, and those services call
+        # back in here under them: never call one while holding ours
+        if self._lock._is_owned():
+            self._deferred.append((b, old_level, timestamp))
+            return
+        for fn in self.fill_listeners:
+            fn(b, old_level, timestamp)
+
+    def _fire_deferred(self):
+        """Notify the fill changes made while the lock was held, once it is released"""
+        if self._lock._is_owned():
+            return  # still inside an outer lock: its release fires them
+        with self._lock:
+            deferred, self._deferred = self._deferred, []
+        for b, old_level, timestamp in deferred:
+            self._notify_fill(b, old_level, timestamp)
+
+    def most_urgent_bins(self, k):
+        """Return the k fullest non-empty bins, fullest first"""
+        with self._lock:
+            return self.heap.peek_k(k)
+
+    # -------------------- UNIT OF WORK --------------------
+    # The lock is held from begin() to commit()/rollback(), so a compaction
+    # never snapshots changes that may still be rolled back.
+
+    def begin(self):
+        """Start buffering log records until commit() (see services/unit_of_work.py)"""
+        self._lock.acquire()
+        if self._batch is not None:
+            self._lock.release()
+            raise RuntimeError("BinService already has an open unit of work")
+        self._batch = []
+        self._batch_prior = {}
+        self._committed_prior = None
+
+    def commit(self):
+        """Write every buffered change as one log record with one fsync"""
+        if self._batch is None:
+            return
+        try:
+            if self._batch and self.repo is not None:
+                self._write_repo(self._batch)
+            elif self._batch:
+                self._skip_own(self.log.append({"op": "batch", "ops": self._batch}))
+                self.log.sync()
+            self._batch = None
+            # kept until the next unit of work, in case compensate() is needed
+            self._committed_prior, self._batch_prior = self._batch_prior, None
+        finally:
+            if self._batch is None:
+                self._lock.release()
+        self._fire_deferred()
+        self._maybe_compact()
+
+    def rollback(self):
+        """Drop the buffered records and put the touched bins back as they were"""
+        if self._batch is None:
+            return
+        try:
+            self._restore(self._batch_prior)
+        finally:
+            self._batch = None
+            self._batch_prior = None
+            self._lock.release()
+        self._fire_deferred()
+
+    def compensate(self):
+        """
+        Undo the last commit() because a later participant of its unit of
+        work failed: the bins go back as they were and, in JSON mode, their
+        prior states are logged over the batch (with SQLite the unit of
+        work's transaction was rolled back instead).
+        """
+        prior, self._committed_prior = self._committed_prior, None
+        if not prior:
+            return
+        with self._lock:
+            self._restore(prior)
+            if self.repo is None:
+                self._log({"op": "batch", "ops": [{"op": "del", "id": bin_id} if state is None
+                                                  else {"op": "put", "bin": state}
+                                                  for bin_id, state in prior.items()]})
+        self._fire_deferred()
+
+    def _restore(self, prior):
+        """Put the bins in `prior` ({bin id: dict, or None if it was added}) back as they were"""
+        for bin_id, state in reversed(list(prior.items())):
+            b = self.by_id.get(bin_id)
+            if state is None:
+                if b is not None:
+                    self.bins.remove(lambda node: node.id == bin_id)
+                    self.heap.remove(bin_id)
+                    self.location_index.remove(bin_id)
+                    self.id_index.remove(bin_id)
+                    del self.by_id[bin_id]
+            elif b is None:
+                b = Bin.from_dict(state)
+                self.bins.append(b)
+                self.by_id[bin_id] = b
+                self._index_bin(b)
+                self.location_index.add(bin_id, b.location)
+                self.id_index.add(bin_id, str(bin_id))
+            elif b.fill_level != state["fill_level"]:
+                old_level = b.fill_level
+                b.fill_level = state["fill_level"]
+                self._index_bin(b)
+                self._notify_fill(b, old_level)
+
+    def _remember(self, bin_id):
+        """Inside a unit of work, keep a bin's state from before its first change"""
+        if self._batch_prior is not None and bin_id not in self._batch_prior:
+            b = self.by_id.get(bin_id)
+            self._batch_prior[bin_id] = b.to_dict() if b is not None else None
+
+    # -------------------- MUTATIONS --------------------
+    # Each one updates memory, the indexes and the log under one lock, so a
+    # compaction never snapshots a change that is not yet in the log.
+
+    def _insert(self, b):
+        with self._lock:
+            self._remember(b.id)
+            self.bins.append(b)
+            self.by_id[b.id] = b
+            self._index_bin(b)
+            self.location_index.add(b.id, b.location)
+            self.id_index.add(b.id, str(b.id))
+            self._log_put(b)
+
+    def _delete(self, bin_id):
+        with self._lock:
+            self._remember(bin_id)
+            removed = self.bins.remove(lambda node: node.id == bin_id)
+            if removed:
+                self.heap.remove(bin_id)
+                self.location_index.remove(bin_id)
+                self.id_index.remove(bin_id)
+                self.by_id.pop(bin_id, None)
+                self._log_delete(bin_id)
+            return removed
+
+    def _set_fill(self, b, level, timestamp=None):
+        with self._lock:
+            self._remember(b.id)
+            b.fill_level = level
+            self._index_bin(b)
+            self._log_put(b, timestamp)
 
     def add_bin(self, location, fill=0.0, x=0.0, y=0.0, bin_type="household"):
-        new_id = len(self.bins) + 1
+        new_id = self.sequence.next_id("bin")
         b = Bin(
             id=new_id,
             location=location,
@@ -53,38 +519,80 @@ class BinService:
             fill_level=fill,
             bin_type=bin_type    
         )
-        self.bins.append(b)
-        self.save_bins()
+        self._insert(b)
         self.history.push_action("bin", "add_bin", b.to_dict())
         return b
 
+    def bulk_add(self, rows):
+        """
+        Add many bins (dicts without ids, as in bins.json) with one write:
+        ids come from the "bin" sequence, the urgency heap is rebuilt once
+        and everything lands in a single snapshot (or one transaction with
+        SQLite) instead of a log record and history action per bin. Bulk
+        imports are not undoable. Returns the number of bins added.
+        """
+        self._check_snapshot()  # before any ids are handed out
+        new = [Bin.from_dict({**row, "id": bin_id}) for bin_id, row in self.sequence.assign("bin", rows)]
+        if not new:
+            return 0
+        with self._lock:
+            if self._batch is not None:
+                raise RuntimeError("bulk_add cannot run inside a unit of work")
+            if self.repo is not None:
+                self._add_many(new)
+                self._write_repo([{"op": "put", "bin": b.to_dict()} for b in new])
+                return len(new)
+            self._compacting = True
+        self._compact(add=new)
+        return len(new)
+
     def update_bin(self, bin_id, new_level):
-        b = self.bins.find(lambda node: node.id == bin_id)
+        b = self.by_id.get(bin_id)
         if b is not None:
             old_level = b.fill_level
-            b.fill_level = new_level
             # optional: clamp to [0,100]
-            if b.fill_level < 0:
-                b.fill_level = 0
-            if b.fill_level > 100:
-                b.fill_level = 100
-            self.save_bins()
+            self._set_fill(b, min(max(new_level, 0), 100))
             self.history.push_action("bin", "update_bin", {
                 "id": bin_id,
                 "old_level": old_level,
                 "new_level": b.fill_level
             })
+            self._notify_fill(b, old_level)
             return True
         return False
 
+    def apply_fill_levels(self, levels, timestamps=None):
+        """
+        Set many fill levels at once from {bin_id: level} (e.g. sensor readings),
+        with {bin_id: epoch seconds} of the readings passed on to the fill
+        listeners (here, and through the log in other processes), so they
+        learn from when a level was read, not applied.
+        Every change goes into one log record; unknown bins and unchanged
+        levels are skipped. Sensor data is not a user action, so nothing is
+        pushed onto the undo history (the readings themselves are kept by
+        the fill series store). Returns the number of bins that changed.
+        """
+        changes = []  # [bin id, old level, new level]
+        timestamps = timestamps or {}
+        with UnitOfWork(self):
+            for bin_id, level in levels.items():
+                b = self.by_id.get(bin_id)
+                if b is None:
+                    continue
+                level = min(max(level, 0), 100)
+                if b.fill_level != level:
+                    changes.append([bin_id, b.fill_level, level])
+                    self._set_fill(b, level, timestamps.get(bin_id))
+        for bin_id, old_level, _ in changes:
+            self._notify_fill(self.by_id[bin_id], old_level, timestamps.get(bin_id))
+        return len(changes)
+
     def remove_bin(self, bin_id):
         # Get bin data before removing for history
-        bin_to_remove = self.bins.find(lambda node: node.id == bin_id)
-        removed = self.bins.remove(lambda node: node.id == bin_id)
-        if removed:
-            self.save_bins()
-            if bin_to_remove:
-                self.history.push_action("bin", "remove_bin", bin_to_remove.to_dict())
+        bin_to_remove = self.by_id.get(bin_id)
+        removed = self._delete(bin_id)
+        if removed and bin_to_remove:
+            self.history.push_action("bin", "remove_bin", bin_to_remove.to_dict())
         return removed
     
     def undo_last(self):
@@ -96,8 +604,7 @@ class BinService:
             data = last_action["data"]
             bin_id = data["id"]
             # remove the bin that was added
-            self.bins.remove(lambda node: node.id == bin_id)
-            self.save_bins()
+            self._delete(bin_id)
             return f"Undid adding Bin {bin_id}"
         
         elif last_action["type"] == "update_bin":
@@ -105,25 +612,50 @@ class BinService:
             bin_id = data["id"]
             old_level = data["old_level"]
             # restore the old fill level
-            b = self.bins.find(lambda node: node.id == bin_id)
+            b = self.by_id.get(bin_id)
             if b is not None:
-                b.fill_level = old_level
-                self.save_bins()
+                previous_level = b.fill_level
+                self._set_fill(b, old_level)
+                self._notify_fill(b, previous_level)
                 return f"Restored Bin {bin_id} to {old_level}%"
         
         elif last_action["type"] == "remove_bin":
             data = last_action["data"]
             # re-add the bin that was removed
             b = Bin.from_dict(data)
-            self.bins.append(b)
-            self.save_bins()
+            self._insert(b)
             return f"Restored deleted Bin {b.id}"
 
         return False
+
+    def restore_fill_levels(self, levels):
+        """Set fill levels in place from {bin_id: level} without recording bin history (used by undo)"""
+        for bin_id, level in levels.items():
+            b = self.by_id.get(bin_id)
+            if b is not None and b.fill_level != level:
+                previous_level = b.fill_level
+                self._set_fill(b, level)
+                self._notify_fill(b, previous_level)
+
     def get_bin_by_id(self, bin_id):
         """Return a bin object by its ID"""
-        for b in self.bins:
-            if b.id == bin_id:
-                return b
-        return None
+        with self._lock:
+            return self.by_id.get(bin_id)
+
+    def get_all_bins(self):
+        """Every bin as a list, copied under the lock so a concurrent refresh() can't change it mid-iteration"""
+        with self._lock:
+            return list(self.bins)
+
+    def search_by_location(self, query):
+        """Bins whose location contains query (case-insensitive), in id order"""
+        with self._lock:
+            # the index builds its postings on the first search, from texts refresh() changes
+            return [self.by_id[bin_id] for bin_id in sorted(self.location_index.search(query))]
+
+    def search(self, query):
+        """Bins whose location or id (as text) contains query (case-insensitive), in id order"""
+        with self._lock:
+            ids = self.location_index.search(query) | self.id_index.search(query)
+            return [self.by_id[bin_id] for bin_id in sorted(ids)]
 
@@ -0,0 +1,197 @@
+# services/bulk_service.py
+import csv
+import json
+import os
+from itertools import islice
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet support is optional; CSV and JSONL always work
+    pyarrow = None
+
+BATCH_SIZE = 10000
+
+# Columns written by the exporters, the numeric ones CSV hands back as strings,
+# and the list ones CSV holds as JSON text (Parquet and JSONL keep them as lists)
+FIELDS = {
+    "bins": ["id", "location", "bin_type", "capacity", "fill_level", "x", "y"],
+    "facilities": ["id", "name", "location", "type", "capacity", "efficiency", "x", "y",
+                   "operational_status", "processing_cost"],
+    "requests": ["id", "user", "bin_id", "request_type", "status", "time", "count", "reporters"],
+}
+NUMBERS = {"id", "bin_id", "capacity", "fill_level", "x", "y", "efficiency", "processing_cost", "count"}
+LISTS = {"reporters"}
+
+
+def _format(path, fmt):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    return {".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}.get(ext, "jsonl")
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise ImportError("Parquet files need pyarrow (pip install pyarrow)")
+
+
+def _coerce(row):
+    """Turn the numeric and list columns of a CSV row back into numbers and lists and drop empty cells"""
+    out = {}
+    for key, value in row.items():
+        if value == "" or value is None:
+            continue
+        if key in LISTS:
+            value = json.loads(value)
+        elif key in NUMBERS:
+            try:
+                value = int(value)
+            except ValueError:
+                value = float(value)
+        out[key] = value
+    return out
+
+
+# -------------------- READ --------------------
+
+def read_rows(path, fmt=None, batch_size=BATCH_SIZE):
+    """
+    Stream the records of a CSV, JSONL or Parquet file as dicts, one at a
+    time (Parquet is read batch_size rows at a time), so a file is never
+    loaded whole.
+    """
+    fmt = _format(path, fmt)
+    if fmt == "parquet":
+        _require_pyarrow()
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+            for row in batch.to_pylist():
+                yield {key: value for key, value in row.items() if value is not None}
+        return
+    with open(path, "r", newline="") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield _coerce(row)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+# -------------------- WRITE --------------------
+
+def write_rows(path, rows, fields, fmt=None, batch_size=BATCH_SIZE):
+    """
+    Stream dicts to a CSV, JSONL or Parquet file (via a temp file renamed
+    into place) and return how many were written. CSV and Parquet get the
+    given columns, JSONL whole records. Only batch_size rows are held in
+    memory at a time.
+    """
+    fmt = _format(path, fmt)
+    tmp_path = path + ".tmp"
+    count = 0
+    rows = iter(rows)
+    try:
+        if fmt == "parquet":
+            _require_pyarrow()
+            writer = None
+            try:
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    table = pyarrow.Table.from_pylist([{k: r.get(k) for k in fields} for r in batch])
+                    if writer is None:
+                        writer = pyarrow.parquet.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+                    count += len(batch)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is None:
+                pyarrow.parquet.write_table(
+                    pyarrow.table({k: pyarrow.array([], pyarrow.string()) for k in fields}), tmp_path)
+        else:
+            with open(tmp_path, "w", newline="") as f:
+                if fmt == "csv":
+                    writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+                    writer.writeheader()
+                    for row in rows:
+                        writer.writerow({key: json.dumps(value) if key in LISTS else value
+                                         for key, value in row.items()})
+                        count += 1
+                else:
+                    for row in rows:
+                        f.write(json.dumps(row, separators=(",", ":")) + "\n")
+                        count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+# -------------------- IMPORT --------------------
+
+def import_bins(bin_service, path, fmt=None):
+    """Add every bin in the file (its ids are ignored; new ones are issued). Returns the count."""
+    return bin_service.bulk_add(_without_id(read_rows(path, fmt)))
+
+
+def import_facilities(facility_service, path, fmt=None):
+    return len(facility_service.bulk_add(_without_id(read_rows(path, fmt))))
+
+
+def import_requests(request_service, path, fmt=None):
+    """
+    Add every request in the file as a pending one, with the reporters and
+    count it was exported with (duplicates are coalesced)
+    """
+    return request_service.bulk_add(_without_id(read_rows(path, fmt)))
+
+
+def _without_id(rows):
+    for row in rows:
+        row.pop("id", None)
+        yield row
+
+
+# -------------------- EXPORT --------------------
+
+def export_bins(bin_service, path, fmt=None):
+    return write_rows(path, (b.to_dict() for b in bin_service.get_all_bins()), FIELDS["bins"], fmt)
+
+
+def export_facilities(facility_service, path, fmt=None):
+    return write_rows(path, (f.to_dict() for f in facility_service.get_all()), FIELDS["facilities"], fmt)
+
+
+def export_requests(request_service, path, fmt=None):
+    """Pending requests, with their reporters (a JSON list in a CSV cell) and report count"""
+    return write_rows(path, (r.to_dict() for r in request_service.get_all_requests()), FIELDS["requests"], fmt)
+
+
+if __name__ == "__main__":
+    # python -m services.bulk_service import|export bins|facilities|requests <file.csv|.jsonl|.parquet>
+    import sys
+    import time
+
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export") or sys.argv[2] not in FIELDS:
+        sys.exit("usage: python -m services.bulk_service import|export bins|facilities|requests <file>")
+    action, kind, path = sys.argv[1:]
+    if kind == "bins":
+        from services.bin_service import BinService
+        service = BinService()
+    elif kind == "facilities":
+        from services.facility_service import FacilityService
+        service = FacilityService()
+    else:
+        from services.request_service import RequestService
+        service = RequestService()
+
+    started = time.perf_counter()
+    count = globals()[f"{action}_{kind}"](service, path)
+    print(f"{action}ed {count} {kind} {'from' if action == 'import' else 'to'} {path} "
+          f"in {time.perf_counter() - started:.2f}s")
@@ -5,183 +5,396 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
     
+import copy
 import json
+import math
+import threading
 from models.facility import Facility
 from data_structures.avl_trees import FacilityAVLTree
+from data_structures.ngram_index import NGramIndex
+from services.sequence_service import SequenceService
+from services.sqlite_store import get_store
+from services.storage import VersionConflict, file_version, merge_records, read_json, update_json, write_json
 
 
 class FacilityService:
-    def __init__(self, file_path="data/facilities.json"):
+    # Secondary orderings kept next to the id tree. Every key ends in the id,
+    # so keys are unique and a facility can always be found (and deleted) again.
+    INDEX_KEYS = {
+        "name": lambda f: (f.name.lower(), f.id),
+        "type": lambda f: (f.type, f.id),
+        "capacity": lambda f: (f.capacity, f.id),
+        "efficiency": lambda f: (f.efficiency, f.id),
+    }
+    # ...so every facility needs these fields (see _checked)
+    INDEXED_FIELDS = ("name", "type", "capacity", "efficiency")
+
+    def __init__(self, file_path="data/facilities.json", store=None):
         self.file_path = file_path
+        self.store = get_store(store)
+        self.repo = self.store.repository("facilities") if self.store else None
+        # Shared between Streamlit sessions (threads): refresh() rebuilds the
+        # trees in place, so every read and change holds this lock
+        self._lock = threading.RLock()
         
-        # AVL tree sorted by ID initially
+        # Primary AVL tree by ID, plus one tree per secondary ordering
         self.tree = FacilityAVLTree(key=lambda f: f.id)
-
+        self.indexes = {name: FacilityAVLTree(key=key) for name, key in self.INDEX_KEYS.items()}
+        self.sort_attribute = "id"  # ordering get_all() returns (see sort_by)
+        # Trigram indexes for substring search on names and locations
+        self.name_index = NGramIndex()
+        self.location_index = NGramIndex()
+        # ids for bulk imports (see bulk_add)
+        self.sequence = SequenceService(os.path.join(os.path.dirname(file_path), "sequences.json"),
+                                        store=self.store or False)
+
+        self._version = None  # version() of the data currently in the tree
         self.load_facilities()
 
+    def version(self):
+        """Changes whenever the stored facilities do: the file's version or the table's generation"""
+        return self.store.generation("facilities") if self.store is not None else file_version(self.file_path)
+
+    def refresh(self):
+        """Rebuild the tree if another process changed the facilities; a no-op otherwise"""
+        with self._lock:
+            if self.version() == self._version:
+                return False
+            self.load_facilities()
+            return True
+
     # -------------------- LOAD --------------------
 
     def load_facilities(self):
-        """Load all facilities from JSON into AVL tree."""
-        if not os.path.exists(self.file_path):
-            return  # No file yet
+        """Load all facilities from JSON into the AVL trees."""
+        with self._lock:
+            self._version = self.version()
+            if self.repo is not None:
+                self._rebuild([Facility.from_dict(item) for item in self.repo.all()])
+                return
 
-        try:
-            with open(self.file_path, "r") as f:
-                data = json.load(f)
-                for item in data:
-                    fac = Facility(
-                        id=item["id"],
-                        name=item["name"],
-                        location=item["location"],
-                        x=item["x"],
-                        y=item["y"],
-                        type=item["type"],
-                        capacity=item["capacity"],
-                        efficiency=item["efficiency"],
-                    )
-                    self.tree.insert(fac)
-        except json.JSONDecodeError:
-            pass  # File exists but is empty or corrupted
+            try:
+                data, self._version = read_json(self.file_path, [])
+            except json.JSONDecodeError:
+                return  # File exists but is corrupted
+
+            facilities = []
+            for item in data:
+                fac = Facility(
+                    id=item["id"],
+                    name=item["name"],
+                    location=item["location"],
+                    x=item["x"],
+                    y=item["y"],
+                    type=item["type"],
+                    capacity=item["capacity"],
+                    efficiency=item["efficiency"],
+                )
+                facilities.append(fac)
+            self._rebuild(facilities)
+
+    # -------------------- INDEXES --------------------
+
+    def _rebuild(self, facilities):
+        """Bulk-load the id tree and every secondary index from a list of facilities"""
+        self.tree.bulk_load(facilities)
+        for index in self.indexes.values():
+            index.bulk_load(facilities)
+        self.name_index.clear()
+        self.name_index.add_many((f.id, f.name) for f in facilities)
+        self.location_index.clear()
+        self.location_index.add_many((f.id, f.location) for f in facilities)
+
+    def _index(self, fac):
+        self.tree.insert(fac)
+        for index in self.indexes.values():
+            index.insert(fac)
+        self.name_index.add(fac.id, fac.name)
+        self.location_index.add(fac.id, fac.location)
+
+    def _unindex(self, fac):
+        self.tree.delete(fac.id)
+        for index in self.indexes.values():
+            index.delete(index.key(fac))
+        self.name_index.remove(fac.id)
+        self.location_index.remove(fac.id)
 
     # -------------------- SAVE --------------------
 
     def save_facilities(self):
         """Save AVL tree contents back to JSON."""
-        facilities = self.tree.inorder()  # sorted list
-
-        data = [
-            {
-                "id": f.id,
-                "name": f.name,
-                "location": f.location,
-                "x": f.x,
-                "y": f.y,
-                "type": f.type,
-                "capacity": f.capacity,
-                "efficiency": f.efficiency,
-            }
-            for f in facilities
-        ]
-
-        with open(self.file_path, "w") as f:
-            json.dump(data, f, indent=4)
+        with self._lock:
+            facilities = self.tree.inorder()  # sorted list
+
+            if self.repo is not None:
+                self._track(self.repo.put_many([f.to_dict() for f in facilities]))
+                return
+
+            data = [self._record(f) for f in facilities]
+            self._version = write_json(self.file_path, data)
+
+    @staticmethod
+    def _record(f):
+        """A facility as stored in facilities.json"""
+        return {
+            "id": f.id,
+            "name": f.name,
+            "location": f.location,
+            "x": f.x,
+            "y": f.y,
+            "type": f.type,
+            "capacity": f.capacity,
+            "efficiency": f.efficiency,
+        }
+
+    def _track(self, generation):
+        if generation == self._version + 1:
+            self._version = generation  # our own write, nobody else's in between
+
+    def _persist(self, changed=(), deleted=(), added=()):
+        """Store changed facilities: point writes with SQLite, else a rewrite of the JSON file"""
+        if self.repo is not None:
+            self._track(self.repo.write([("put", f.to_dict()) for f in list(added) + list(changed)]
+                                        + [("del", i) for i in deleted]))
+            return
+        try:
+            data = [self._record(f) for f in self.tree.inorder()]
+            self._version = write_json(self.file_path, data, expected_version=self._version)
+        except VersionConflict:
+            # Another session saved since we read the file. Apply just our
+            # changes to its version instead of overwriting it, then reload.
+            def merge(current):
+                current = current or []
+                taken = {item["id"] for item in current}
+                moved = []
+                for f in added:
+                    fac_id = f.id
+                    if fac_id in taken:
+                        fac_id = max(taken) + 1  # the other session took this id
+                        moved.append((f, fac_id))
+                    taken.add(fac_id)
+                # re-index the moved facilities under their new ids (all out first:
+                # a new id can be the old one of another facility added here)
+                for f, _ in moved:
+                    self._unindex(f)
+                for f, fac_id in moved:
+                    f.id = fac_id
+                    self._index(f)
+                return merge_records(current, [self._record(f) for f in list(added) + list(changed)], deleted)
+
+            update_json(self.file_path, merge, default=[])
+            self.refresh()
 
     # -------------------- CRUD --------------------
 
     def add_facility(self, name, location, x, y, type, capacity, efficiency):
         """Create a new facility with auto-increment ID."""
-        # ID = max ID + 1
-        facilities = self.tree.inorder()
-        new_id = facilities[-1].id + 1 if facilities else 1
-
-        fac = Facility(new_id, name, location, x, y, type, capacity, efficiency)
-        self.tree.insert(fac)
-        self.save_facilities()
-        return fac
+        with self._lock:
+            # ID = max ID + 1 (the rightmost node of the id tree)
+            node = self.tree.root
+            while node and node.right:
+                node = node.right
+            new_id = node.value.id + 1 if node else 1
+
+            fac = Facility(new_id, name, location, type, capacity, efficiency, x=x, y=y)
+            self._index(fac)
+            self._persist(added=[fac])
+            return fac
+
+    def bulk_add(self, rows):
+        """
+        Add many facilities (dicts without ids) with one save. Ids come from
+        the "facility" sequence and the tree is rebuilt balanced once instead
+        of an insert per facility. Every row is checked before anything is
+        added (ValueError if one lacks a field the indexes are keyed on).
+        Returns the new facilities.
+        """
+        rows = [self._checked(row, i) for i, row in enumerate(rows, 1)]
+        with self._lock:
+            existing = self.tree.inorder()
+            self.sequence.ensure_at_least("facility", max((f.id for f in existing), default=0))
+            added = [Facility.from_dict({**row, "id": fac_id})
+                     for fac_id, row in self.sequence.assign("facility", rows)]
+            if added:
+                self._rebuild(existing + added)
+                self._persist(added=added)
+            return added
+
+    @classmethod
+    def _checked(cls, row, number):
+        """A bulk_add row with a name, a type and numeric capacity and efficiency"""
+        missing = [field for field in cls.INDEXED_FIELDS if row.get(field) in (None, "")]
+        if missing:
+            raise ValueError(f"Facility row {number} has no {', '.join(missing)}")
+        row = {**row, "name": str(row["name"]), "type": str(row["type"])}
+        for field in ("capacity", "efficiency"):
+            value = row[field]
+            try:
+                row[field] = value if isinstance(value, (int, float)) else float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Facility row {number}: {field} {value!r} is not a number") from None
+        return row
 
     def update_facility(self, fac_id, **updates):
         """Update any field in the facility."""
-        facility = self.tree.search(fac_id)
-        if not facility:
-            return False
-
-        # Update only provided fields
-        for key, value in updates.items():
-            if hasattr(facility, key):
+        with self._lock:
+            facility = self.tree.search(fac_id)
+            if not facility:
+                return False
+
+            # Take the facility out of the indexes whose key changes, update only
+            # the provided fields, then put it back under its new keys
+            updates = {key: value for key, value in updates.items() if key != "id" and hasattr(facility, key)}
+            stale = [index for index in self.indexes.values()
+                     if index.key(facility) != index.key(_updated(facility, updates))]
+            for index in stale:
+                index.delete(index.key(facility))
+            for key, value in updates.items():
                 setattr(facility, key, value)
+            for index in stale:
+                index.insert(facility)
+            self.name_index.add(fac_id, facility.name)  # no-ops when unchanged
+            self.location_index.add(fac_id, facility.location)
 
-        # Rebuild tree only if sorting key changed
-        self.save_facilities()
-        return True
-
-    # ------- DELETE (requires AVL delete later) -------
-    # For now we'll implement a simple workaround:
-    # Remove by rebuilding the tree without the facility.
+            self._persist([facility])
+            return True
 
     def remove_facility(self, fac_id):
-        """Delete a facility by ID (temporary implementation)."""
-        facilities = self.tree.inorder()
-        new_list = [f for f in facilities if f.id != fac_id]
-
-        if len(new_list) == len(facilities):
-            return False  # Not found
+        """Delete a facility by ID from every index."""
+        with self._lock:
+            found = self.tree.search(fac_id)
+            if not found:
+                return False
 
-        # Rebuild AVL tree
-        self.tree = FacilityAVLTree(key=self.tree.key)
-        for fac in new_list:
-            self.tree.insert(fac)
-
-        self.save_facilities()
-        return True
+            self._unindex(found)
+            self._persist(deleted=[fac_id])
+            return True
 
     # -------------------- SEARCH --------------------
 
     def get_by_id(self, fac_id):
-        return self.tree.search(fac_id)
+        with self._lock:
+            return self.tree.search(fac_id)
 
     def get_all(self):
-        return self.tree.inorder()
+        """Every facility, in the order chosen with sort_by() (id by default)"""
+        with self._lock:
+            return self.get_sorted(self.sort_attribute)
 
     # -------------------- SORTING STRATEGY --------------------
 
+    def _ordering(self, attribute):
+        if attribute == "id":
+            return self.tree
+        if attribute not in self.indexes:
+            raise ValueError("Invalid sorting attribute")
+        return self.indexes[attribute]
+
     def sort_by(self, attribute):
-        """Rebuild AVL tree with a new sorting key."""
+        """Make get_all() follow another index. Nothing is rebuilt."""
+        with self._lock:
+            self._ordering(attribute)  # validate
+            self.sort_attribute = attribute
+
+    def get_sorted(self, attribute, descending=False):
+        """All facilities ordered by id, name, type, capacity or efficiency: an in-order walk of that index"""
+        with self._lock:
+            facilities = self._ordering(attribute).inorder()
+            if descending:
+                facilities.reverse()
+            return facilities
+
+    def count(self):
+        with self._lock:
+            return len(self.tree)
+
+    def get_page(self, attribute, offset, limit, descending=False):
+        """
+        One page of facilities in the given ordering, read straight from that
+        index at O(log n + limit) however deep the page is.
+        """
+        with self._lock:
+            index = self._ordering(attribute)
+            if not descending:
+                return list(index.slice(offset, limit))
+            # the same page counted from the other end
+            start = max(len(index) - offset - limit, 0)
+            page = list(index.slice(start, len(index) - offset - start))
+            page.reverse()
+            return page
+
+    def percentile(self, attribute, q):
+        """
+        Value of a numeric attribute at percentile q (0-100, nearest rank),
+        e.g. percentile("efficiency", 50) for the median. O(log n).
+        """
+        with self._lock:
+            n = len(self.tree)
+            if n == 0:
+                return None
+            k = min(max(math.ceil(q / 100 * n) - 1, 0), n - 1)
+            return getattr(self.indexes[attribute].select(k), attribute)
 
-        key_func = {
-            "id": lambda f: f.id,
-            "name": lambda f: f.name.lower(),
-            "type": lambda f: f.type,
-            "capacity": lambda f: f.capacity,
-            "efficiency": lambda f: f.efficiency,
-        }.get(attribute)
+    def search_by_name(self, name):
+        """Case-insensitive name search (substring), in id order."""
+        with self._lock:
+            return self._by_ids(self.name_index.search(name))
 
-        if not key_func:
-            raise ValueError("Invalid sorting attribute")
+    def search_by_location(self, location):
+        """Case-insensitive location search (substring), in id order."""
+        with self._lock:
+            return self._by_ids(self.location_index.search(location))
 
-        # rebuild AVL tree using new key
-        facilities = self.tree.inorder()
-        self.tree = FacilityAVLTree(key=key_func)
+    def _by_ids(self, ids):
+        return [self.tree.search(fac_id) for fac_id in sorted(ids)]
 
-        for fac in facilities:
-            self.tree.insert(fac)
-    def remove_facility(self, fac_id):
-        found = self.tree.search(fac_id)
-        if not found:
-            return False
+    def search_by_name_prefix(self, prefix):
+        """Facilities whose name starts with prefix (case-insensitive), in name order."""
+        with self._lock:
+            prefix = prefix.lower()
+            return list(self.indexes["name"].range((prefix,), (prefix + "\U0010ffff",)))
 
-        self.tree.delete(fac_id)
-        self.save_facilities()
-        return True
-    def search_by_name(self, name):
-        """Case-insensitive name search."""
-        name = name.lower()
-        return [f for f in self.tree.inorder() if name in f.name.lower()]
     def search_by_type(self, type_name):
-        """Search facilities by type."""
-        return [f for f in self.tree.inorder() if f.type == type_name]
-
+        """Search facilities by type (a range of the type index)."""
+        with self._lock:
+            return self._between("type", type_name, type_name)
 
     def search_by_efficiency_range(self, min_e, max_e):
-        return [f for f in self.tree.inorder() if min_e <= f.efficiency <= max_e]
-
+        with self._lock:
+            return self._between("efficiency", min_e, max_e)
 
     def search_by_capacity_range(self, min_c, max_c):
-        return [f for f in self.tree.inorder() if min_c <= f.capacity <= max_c]
+        with self._lock:
+            return self._between("capacity", min_c, max_c)
+
+    def count_between(self, attribute, low, high):
+        """Number of facilities with low <= attribute <= high."""
+        with self._lock:
+            lo, hi = self._bounds(low, high)
+            return self.indexes[attribute].count_range(lo, hi)
+
+    def _between(self, attribute, low, high):
+        lo, hi = self._bounds(low, high)
+        return list(self.indexes[attribute].range(lo, hi))
+
+    @staticmethod
+    def _bounds(low, high):
+        # index keys are (value, id): (low,) sorts before every id, (high, inf) after
+        return (low,), (high, math.inf)
+
     # services/facility_service.py
 
     def get_all_facilities(self):
         """Return a list of all facilities in the AVL tree."""
-        facilities = []
+        with self._lock:
+            return self.tree.inorder()
 
-        def in_order_traversal(node):
-            if node is None:
-                return
-            in_order_traversal(node.left)
-            facilities.append(node.value)  # assuming node.value is Facility object
-            in_order_traversal(node.right)
 
-        in_order_traversal(self.tree.root)  # assuming your tree has root
-        return facilities
+def _updated(fac, updates):
+    """A copy of a facility with some fields changed (used to compute its new index keys)"""
+    updated = copy.copy(fac)
+    for key, value in updates.items():
+        setattr(updated, key, value)
+    return updated
 
 
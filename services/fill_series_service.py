@@ -0,0 +1,333 @@
+# services/fill_series_service.py
+import json
+import os
+import threading
+import time
+import numpy as np
+from services.storage import atomic_write_json, file_lock, file_version
+
+
+class FillSeriesStore:
+    """
+    Recent (time, fill level) samples of every bin, in fixed-size ring
+    buffers memory-mapped from `folder`:
+
+        times.f8    float64 epoch seconds, one row of `depth` slots per bin
+        levels.f4   float32 fill levels (%), same layout
+        ids.i8      bin id of each row
+        head.i8     slot the next sample of each row goes to
+        count.i8    samples held by each row (at most depth)
+        meta.json   depth, rows allocated and rows used
+
+    A bin's newest `depth` samples are kept; older ones are overwritten in
+    place, so the files never grow past capacity x depth x 12 bytes.
+    Adding bins grows every file at its end (rows are contiguous), which
+    leaves the samples already written where they are. The depth of an
+    existing store wins over the one passed in.
+
+    Several processes may share a folder. Rows are handed out under the
+    lock of meta.json, after re-reading it: bins another process added are
+    adopted (and the files remapped if it grew them) rather than given a
+    second row. refresh() picks up such bins without allocating any.
+
+    Samples come from BinService's fill listeners, stamped with the time
+    the sensor read them (or, without one, the time they were heard), or
+    in bulk through append_many(). A sample no newer than the newest one of
+    its bin is dropped, so every row stays in time order and window queries
+    are binary searches: O(log depth + samples returned). That also drops
+    a reading heard twice: the ingest process records it, and the log
+    record it wrote hands the same time to every other process's listeners.
+    """
+
+    DEFAULT_DEPTH = 1024
+    INITIAL_ROWS = 256
+    FLUSH_INTERVAL = 30
+    CHUNK = 4096  # rows per block in the all-bins queries
+
+    FILES = (("ids", "ids.i8", np.int64, False),
+             ("head", "head.i8", np.int64, False),
+             ("count", "count.i8", np.int64, False),
+             ("times", "times.f8", np.float64, True),
+             ("levels", "levels.f4", np.float32, True))
+
+    def __init__(self, bin_service=None, folder="data/fill_series", depth=DEFAULT_DEPTH):
+        self.bin_service = bin_service
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.capacity = 0
+        self.used = 0
+        self.rows = {}  # bin id -> row
+        self._meta_version = None
+        # Fill listeners append from whichever thread changed a bin: the maps
+        # (remapped when they grow), the rows and every head/count update
+        # change only under this lock, and queries read under it too
+        self._lock = threading.RLock()
+        with file_lock(self._path("meta.json")):
+            meta = self._read_meta()
+            if not meta:
+                # the rows can't be trusted without it: start over
+                for _, file_name, _, _ in self.FILES:
+                    if os.path.exists(self._path(file_name)):
+                        os.remove(self._path(file_name))
+            self.depth = meta.get("depth", depth)
+            self._resize(max(meta.get("capacity", 0), self.INITIAL_ROWS))
+            self._adopt(meta)
+            if self.capacity != meta.get("capacity"):
+                self._save_meta()
+        self._flushed_at = time.monotonic()
+
+        if self.bin_service is not None:
+            self.bin_service.add_fill_listener(self._on_fill_changed)
+
+    def close(self):
+        if self.bin_service is not None:
+            self.bin_service.remove_fill_listener(self._on_fill_changed)
+        self.flush()
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    # -------------------- FILES --------------------
+
+    def _resize(self, capacity):
+        """Make room for `capacity` rows: extend every file with zeros (if not yet that long) and map it again"""
+        for name, file_name, dtype, per_slot in self.FILES:
+            path = self._path(file_name)
+            size = capacity * (self.depth if per_slot else 1) * np.dtype(dtype).itemsize
+            old = getattr(self, name, None)
+            if isinstance(old, np.memmap):
+                old.flush()
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            shape = (capacity, self.depth) if per_slot else (capacity,)
+            setattr(self, name, np.memmap(path, dtype=dtype, mode="r+", shape=shape))
+        self.capacity = capacity
+
+    def _read_meta(self):
+        """meta.json's contents ({} if missing or unreadable); call under its lock"""
+        path = self._path("meta.json")
+        self._meta_version = file_version(path)
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_meta(self):
+        """Write meta.json; call under its lock"""
+        path = self._path("meta.json")
+        atomic_write_json(path, {"depth": self.depth, "capacity": self.capacity, "rows": self.used})
+        self._meta_version = file_version(path)
+
+    def _adopt(self, meta):
+        """Map the rows other processes allocated since we last looked (and the files they grew)"""
+        if meta.get("capacity", 0) > self.capacity:
+            self._resize(meta["capacity"])
+        rows = min(meta.get("rows", 0), self.capacity)
+        if rows > self.used:
+            for row, bin_id in enumerate(self.ids[self.used:rows].tolist(), self.used):
+                self.rows[bin_id] = row
+            self.used = rows
+
+    def refresh(self):
+        """Adopt bins other processes added rows for. A stat call when none did; returns True if some were."""
+        if file_version(self._path("meta.json")) == self._meta_version:
+            return False
+        with self._lock:
+            used = self.used
+            with file_lock(self._path("meta.json"), shared=True):
+                self._adopt(self._read_meta())
+            return self.used != used
+
+    def flush(self):
+        """Write dirty pages of every map back to disk"""
+        with self._lock:
+            for name, _, _, _ in self.FILES:
+                getattr(self, name).flush()
+            self._flushed_at = time.monotonic()
+
+    def _rows_for(self, bin_ids):
+        """Rows of the given bins, allocating rows for bins not seen before; call under the lock"""
+        new = [bin_id for bin_id in dict.fromkeys(bin_ids) if bin_id not in self.rows]
+        if new:
+            with file_lock(self._path("meta.json")):
+                # another process may have allocated rows (maybe for these very bins) since
+                self._adopt(self._read_meta())
+                new = [bin_id for bin_id in new if bin_id not in self.rows]
+                if new:
+                    if self.used + len(new) > self.capacity:
+                        self._resize(max(self.used + len(new), 2 * self.capacity))
+                    first = self.used
+                    self.ids[first:first + len(new)] = new
+                    self.head[first:first + len(new)] = 0
+                    self.count[first:first + len(new)] = 0
+                    for row, bin_id in enumerate(new, first):
+                        self.rows[bin_id] = row
+                    self.used += len(new)
+                    self.ids.flush()  # on disk before meta.json counts the rows
+                    self._save_meta()
+        rows = self.rows
+        return np.fromiter((rows[bin_id] for bin_id in bin_ids), dtype=np.intp, count=len(bin_ids))
+
+    # -------------------- APPENDING --------------------
+
+    def _on_fill_changed(self, bin_obj, old_level, timestamp=None):
+        self.append(bin_obj.id, bin_obj.fill_level, timestamp)
+        if time.monotonic() - self._flushed_at >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def append(self, bin_id, level, t=None):
+        """Record one sample (t in epoch seconds, default now). Returns False if no newer than the bin's newest."""
+        t = time.time() if t is None else t
+        with self._lock:
+            row = self.rows.get(bin_id)
+            if row is None:
+                row = int(self._rows_for([bin_id])[0])
+            head, count = int(self.head[row]), int(self.count[row])
+            if count and t <= self.times[row, head - 1]:  # head - 1 wraps to the last slot
+                return False
+            self.times[row, head] = t
+            self.levels[row, head] = level
+            self.head[row] = (head + 1) % self.depth
+            self.count[row] = min(count + 1, self.depth)
+            return True
+
+    def append_many(self, bin_ids, levels, times):
+        """
+        Record many samples: parallel sequences of bin ids, levels and epoch
+        seconds, in any order. Returns how many were kept.
+        """
+        levels = np.asarray(levels, dtype=np.float32)
+        times = np.asarray(times, dtype=np.float64)
+        with self._lock:
+            return self._append_many(list(bin_ids), levels, times)
+
+    def _append_many(self, bin_ids, levels, times):
+        rows = self._rows_for(bin_ids)
+        # group by row, in time order within each row
+        order = np.lexsort((times, rows))
+        rows, levels, times = rows[order], levels[order], times[order]
+
+        # drop samples no newer than their row's newest
+        newest = np.where(self.count[rows] > 0, self.times[rows, (self.head[rows] - 1) % self.depth], -np.inf)
+        keep = times > newest
+        rows, levels, times = rows[keep], levels[keep], times[keep]
+        if not len(rows):
+            return 0
+
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        sizes = np.diff(np.r_[starts, len(rows)])
+        rank = np.arange(len(rows)) - np.repeat(starts, sizes)  # position within its row's group
+        # of more than depth new samples for a row only the last depth survive
+        last = rank >= np.repeat(sizes, sizes) - self.depth
+        slots = (self.head[rows] + rank) % self.depth
+        self.times[rows[last], slots[last]] = times[last]
+        self.levels[rows[last], slots[last]] = levels[last]
+
+        grouped = rows[starts]
+        self.head[grouped] = (self.head[grouped] + sizes) % self.depth
+        self.count[grouped] = np.minimum(self.count[grouped] + sizes, self.depth)
+        return len(rows)
+
+    # -------------------- QUERIES --------------------
+
+    def _series(self, row):
+        """A row's samples in time order (views while the ring has not wrapped yet)"""
+        head, count = int(self.head[row]), int(self.count[row])
+        if count < self.depth:
+            return self.times[row, :count], self.levels[row, :count]
+        return (np.concatenate([self.times[row, head:], self.times[row, :head]]),
+                np.concatenate([self.levels[row, head:], self.levels[row, :head]]))
+
+    def window(self, bin_id, start=None, end=None):
+        """
+        (times, levels) arrays of one bin's samples with start <= time < end
+        (epoch seconds; None leaves that side open), oldest first.
+        """
+        with self._lock:
+            row = self.rows.get(bin_id)
+            if row is None:
+                return np.zeros(0), np.zeros(0, dtype=np.float32)
+            times, levels = self._series(row)
+            lo = 0 if start is None else np.searchsorted(times, start, side="left")
+            hi = len(times) if end is None else np.searchsorted(times, end, side="left")
+            return np.array(times[lo:hi]), np.array(levels[lo:hi])
+
+    def downsample(self, bin_id, start=None, end=None, every=3600):
+        """
+        One bin's samples in buckets of `every` seconds (hours by default,
+        aligned to the epoch): a dict of arrays "time" (bucket start),
+        "min", "max", "mean" and "count", for the non-empty buckets only.
+        """
+        times, levels = self.window(bin_id, start, end)
+        if not len(times):
+            return {"time": np.zeros(0), "min": np.zeros(0), "max": np.zeros(0),
+                    "mean": np.zeros(0), "count": np.zeros(0, dtype=np.int64)}
+        buckets = times // every
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        counts = np.diff(np.r_[starts, len(times)])
+        return {
+            "time": buckets[starts] * every,
+            "min": np.minimum.reduceat(levels, starts),
+            "max": np.maximum.reduceat(levels, starts),
+            "mean": np.add.reduceat(levels.astype(np.float64), starts) / counts,
+            "count": counts,
+        }
+
+    def _chunks(self, start, end):
+        """(rows, times, levels, mask of samples in [start, end)) per block of rows; iterate under the lock"""
+        slot = np.arange(self.depth)
+        for lo in range(0, self.used, self.CHUNK):
+            hi = min(lo + self.CHUNK, self.used)
+            times, levels = self.times[lo:hi], self.levels[lo:hi]
+            mask = slot < self.count[lo:hi, None]  # slots written so far
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times < end
+            yield np.arange(lo, hi), times, levels, mask
+
+    def stats(self, start=None, end=None):
+        """
+        Every bin's samples in [start, end) summed up at once (for anomaly
+        checks across the fleet): a dict of arrays "id", "min", "max",
+        "mean" and "count" (NaN statistics where a bin has no samples).
+        """
+        parts = {"id": [], "min": [], "max": [], "mean": [], "count": []}
+        with self._lock:
+            for rows, _, levels, mask in self._chunks(start, end):
+                count = mask.sum(axis=1)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    parts["min"].append(np.where(mask, levels, np.inf).min(axis=1))
+                    parts["max"].append(np.where(mask, levels, -np.inf).max(axis=1))
+                    parts["mean"].append(np.where(mask, levels, 0).sum(axis=1, dtype=np.float64) / count)
+                parts["id"].append(self.ids[rows])
+                parts["count"].append(count)
+        result = {name: np.concatenate(arrays) if arrays else np.zeros(0) for name, arrays in parts.items()}
+        empty = result["count"] == 0
+        for name in ("min", "max", "mean"):
+            result[name] = np.where(empty, np.nan, result[name])
+        return result
+
+    def samples(self, start=None, end=None):
+        """
+        (bin ids, levels, times) of every sample in [start, end) as flat
+        arrays, e.g. to teach PredictionService.observe_many() what was
+        recorded while it was not running.
+        """
+        ids, levels, times = [], [], []
+        with self._lock:
+            for rows, row_times, row_levels, mask in self._chunks(start, end):
+                ids.append(np.repeat(self.ids[rows], mask.sum(axis=1)))
+                levels.append(row_levels[mask])
+                times.append(row_times[mask])
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), np.zeros(0)
+        return np.concatenate(ids), np.concatenate(levels), np.concatenate(times)
+
+    def __len__(self):
+        return self.used
+
+    def __contains__(self, bin_id):
+        return bin_id in self.rows
@@ -1,66 +1,373 @@
 # services/history_service.py
 import json
 import os
+from datetime import datetime
 from data_structures.stack import Stack  # your custom stack implementation
+from services.storage import (AppendLog, append_record, append_records, atomic_write_json, file_lock,
+                              file_version, read_last_record)
+from services.sqlite_store import get_store
+
+DEFAULT_CATEGORIES = ("request", "bin", "dispatch")
+
 
 class HistoryService:
-    def __init__(self, file_path="data/history.json"):
+    """
+    Undo history per category, stored as append-only segment files:
+
+        data/history/index.json            sealed segments and their record counts
+        data/history/<category>-000001.jsonl
+
+    A push appends one line to the category's newest segment and a pop
+    truncates that line off again, so neither touches the rest of the
+    history. Stacks are only materialised when a page asks for them.
+
+    With a SQLite store configured the stacks are rows of its history table
+    instead (see services/sqlite_store.py).
+
+    Listeners registered with add_listener() are called as
+    fn(category, action, undone): with undone=False for every push, just
+    before it is written (so a listener may add fields to action["data"]
+    and they are stored with it), and with undone=True for every action
+    popped or rolled back. Aggregates over the history (see
+    ReportService) stay current this way without re-reading it.
+    """
+
+    SEGMENT_MAX_BYTES = 256 * 1024  # start a new segment once the newest one reaches this size
+
+    def __init__(self, file_path="data/history.json", segments_dir=None, store=None):
         self.file_path = file_path
-        # Initialize stacks for each category
-        self.history = {
-            "request": Stack(),
-            "bin": Stack(),
-            "dispatch": Stack()
-        }
+        self.store = get_store(store)
+        self.repo = self.store.history() if self.store else None  # legacy single-file history, imported once
+        self.segments_dir = segments_dir or os.path.splitext(file_path)[0]
+        self.index_path = os.path.join(self.segments_dir, "index.json")
+        self.index = {}  # category -> [{"file": name, "count": n}, ...] (count unused for the newest)
+        self._index_mtime = None
+        # Stacks for each category, loaded lazily by get_stack()
+        self.history = {}
+        # (category, action) pairs held back while a unit of work is open
+        self._pending = None
+        # what the last commit() wrote, for compensate(): the pairs, and the
+        # (segment path, end offset, bytes) of each append in JSON mode
+        self._committed = None
+        self._version = None  # version() when the cached stacks were last known current
+        self.listeners = []  # fn(category, action, undone), see the class docstring
         self.load_history()
+        self._version = self.version()
+
+    # -------------------- INDEX --------------------
+
+    def _segment_path(self, name):
+        return os.path.join(self.segments_dir, name)
+
+    def _refresh_index(self):
+        """Re-read index.json if another HistoryService has changed it"""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._index_mtime:
+            with open(self.index_path, "r") as f:
+                self.index = json.load(f)
+            self._index_mtime = mtime
+
+    def _save_index(self):
+        atomic_write_json(self.index_path, self.index)
+        self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    @staticmethod
+    def _count_records(path):
+        return sum(1 for _ in AppendLog.read(path))
+
+    def _tail_segment(self, category, create=False):
+        """Newest segment of a category, rolling over to a new one when it is full"""
+        segments = self.index.setdefault(category, [])
+        if segments:
+            tail = segments[-1]
+            path = self._segment_path(tail["file"])
+            if not create or not os.path.exists(path) or os.path.getsize(path) < self.SEGMENT_MAX_BYTES:
+                return tail
+            # seal the full segment with its final count
+            tail["count"] = self._count_records(path)
+        elif not create:
+            return None
+
+        number = int(segments[-1]["file"].rsplit("-", 1)[1].split(".")[0]) + 1 if segments else 1
+        tail = {"file": f"{category}-{number:06d}.jsonl", "count": 0}
+        segments.append(tail)
+        self._save_index()
+        return tail
+
+    # -------------------- PUSH / POP --------------------
 
     def push_action(self, category, action_type, data):
         """Push an action to the stack of a specific category"""
-        if category not in self.history:
-            self.history[category] = Stack()
-        self.history[category].push({
+        action = {
             "type": action_type,
-            "data": data
-        })
-        self.save_history()
+            "data": data,
+            "time": datetime.now().isoformat(timespec="seconds"),  # when it happened (for the rollups)
+        }
+        self._notify(category, action, False)
+        if self._pending is not None:
+            self._pending.append((category, action))
+            return
+        if self.repo is not None:
+            self.repo.push(category, action)
+        else:
+            with file_lock(self.index_path):
+                self._refresh_index()
+                tail = self._tail_segment(category, create=True)
+                append_record(self._segment_path(tail["file"]), action)
+
+        if category in self.history:
+            self.history[category].push(action)
 
     def pop_action(self, category):
         """Pop last action from a specific category"""
+        if self._pending is not None:
+            # an action pushed in the open unit of work is only in memory
+            for i in range(len(self._pending) - 1, -1, -1):
+                if self._pending[i][0] == category:
+                    action = self._pending.pop(i)[1]
+                    self._notify(category, action, True)
+                    return action
+        if self.repo is not None:
+            action = self.repo.pop(category)
+        else:
+            with file_lock(self.index_path):
+                action = self._pop_segment(category)
+        if action is None:
+            return None
+
         if category in self.history and not self.history[category].is_empty():
-            action = self.history[category].pop()
-            self.save_history()
-            return action
-        return None
+            self.history[category].pop()
+        self._notify(category, action, True)
+        return action
+
+    def _pop_segment(self, category):
+        """Truncate the last record off the category's newest non-empty segment"""
+        self._refresh_index()
+        while True:
+            tail = self._tail_segment(category)
+            if tail is None:
+                return None
+            path = self._segment_path(tail["file"])
+            offset, action = read_last_record(path)
+            if action is not None:
+                os.truncate(path, offset)
+                break
+            # newest segment is empty: drop it and continue with the previous one
+            if os.path.exists(path):
+                os.remove(path)
+            self.index[category].pop()
+            self._save_index()
+        return action
 
     def peek_last(self, category):
         """Peek last action from a specific category"""
-        if category in self.history and not self.history[category].is_empty():
-            return self.history[category].peek()
+        for pending_category, action in reversed(self._pending or []):
+            if pending_category == category:
+                return action
+        if self.repo is not None:
+            return self.repo.peek(category)
+        self._refresh_index()
+        for segment in reversed(self.index.get(category, [])):
+            _, action = read_last_record(self._segment_path(segment["file"]))
+            if action is not None:
+                return action
         return None
 
-    def save_history(self):
-        """Persist history to JSON"""
-        # Convert each stack to a list for JSON serialization
-        serializable_history = {category: stack.to_list() for category, stack in self.history.items()}
-        with open(self.file_path, "w") as f:
-            json.dump(serializable_history, f, indent=4)
+    def count(self, category):
+        """Number of actions in a category (only the newest segment is read)"""
+        if self.repo is not None:
+            return self.repo.count(category)
+        self._refresh_index()
+        segments = self.index.get(category, [])
+        if not segments:
+            return 0
+        sealed = sum(s["count"] for s in segments[:-1])
+        return sealed + self._count_records(self._segment_path(segments[-1]["file"]))
+
+    def actions_since(self, category, position):
+        """
+        The actions of a category from 0-based `position` on, oldest first,
+        read without loading the rest: sealed segments entirely before
+        position are skipped using their record counts.
+        """
+        if self.repo is not None:
+            return self.repo.actions(category, offset=position)
+        self._refresh_index()
+        segments = self.index.get(category, [])
+        actions = []
+        start = 0  # position of the first record of the segment
+        for i, segment in enumerate(segments):
+            if i < len(segments) - 1 and start + segment["count"] <= position:
+                start += segment["count"]
+                continue
+            for action in AppendLog.read(self._segment_path(segment["file"])):
+                if start >= position:
+                    actions.append(action)
+                start += 1
+        return actions
+
+    def version(self):
+        """Changes whenever any category does: the newest segments' file versions or the table's generation"""
+        if self.store is not None:
+            return self.store.generation("history")
+        self._refresh_index()
+        paths = [self.index_path] + [self._segment_path(segments[-1]["file"])
+                                     for segments in self.index.values() if segments]
+        return tuple(file_version(path) for path in paths)
+
+    def refresh(self):
+        """Drop the cached stacks if the history changed on disk; they are re-read on next use"""
+        version = self.version()
+        if version == self._version:
+            return False
+        self._version = version
+        self.history = {}
+        return True
+
+    # -------------------- UNIT OF WORK --------------------
+
+    def begin(self):
+        """Hold pushes in memory until commit() (see services/unit_of_work.py)"""
+        if self._pending is not None:
+            raise RuntimeError("HistoryService already has an open unit of work")
+        self._pending = []
+        self._committed = None
+
+    def commit(self):
+        """Write the held actions with one append per category"""
+        if self._pending is None:
+            return
+        by_category = {}
+        for category, action in self._pending:
+            by_category.setdefault(category, []).append(action)
+        appended = []
+        if self.repo is not None:
+            self.repo.push_many(self._pending)  # one transaction
+        else:
+            with file_lock(self.index_path):
+                self._refresh_index()
+                for category, actions in by_category.items():
+                    path = self._segment_path(self._tail_segment(category, create=True)["file"])
+                    size = append_records(path, actions)
+                    appended.append((path, os.path.getsize(path), size))
+        self._committed = (self._pending, appended)
+        self._pending = None
+        for category, actions in by_category.items():
+            if category in self.history:
+                for action in actions:
+                    self.history[category].push(action)
+
+    def rollback(self):
+        """Forget the held actions"""
+        pending, self._pending = self._pending, None
+        for category, action in reversed(pending or []):
+            self._notify(category, action, True)
+
+    def compensate(self):
+        """
+        Take back the actions of the last commit() because a later
+        participant of its unit of work failed. In JSON mode their records
+        are cut out of the segments (actions appended since by others stay);
+        with SQLite the unit of work's transaction was rolled back instead.
+        """
+        if self._committed is None:
+            return
+        (pairs, appended), self._committed = self._committed, None
+        if appended:
+            with file_lock(self.index_path):
+                for path, end, size in appended:
+                    self._cut(path, end - size, end)
+        for category, action in reversed(pairs):
+            stack = self.history.get(category)
+            if stack is not None and not stack.is_empty():
+                stack.pop()
+            self._notify(category, action, True)
+
+    @staticmethod
+    def _cut(path, start, end):
+        """Remove bytes [start, end) of a segment: a truncate if they are still its tail"""
+        if not os.path.exists(path) or os.path.getsize(path) < end:
+            return  # popped or rolled over since
+        if os.path.getsize(path) == end:
+            os.truncate(path, start)
+            return
+        # others appended after them: rewrite the segment without them (temp file + rename)
+        with open(path, "rb") as f:
+            raw = f.read()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(raw[:start] + raw[end:])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # -------------------- LISTENERS --------------------
+
+    def add_listener(self, fn):
+        """Register fn(category, action, undone) (see the class docstring)"""
+        self.listeners.append(fn)
+
+    def remove_listener(self, fn):
+        if fn in self.listeners:
+            self.listeners.remove(fn)
+
+    def _notify(self, category, action, undone):
+        for fn in self.listeners:
+            fn(category, action, undone)
+
+    # -------------------- LOAD --------------------
 
     def load_history(self):
-        """Load history from JSON"""
-        if not os.path.exists(self.file_path):
+        """Load the segment index, importing the legacy history.json the first time"""
+        if self.repo is not None:
+            return  # import into SQLite with `python -m services.sqlite_store import`
+        if os.path.exists(self.index_path):
+            self._refresh_index()
             return
-        try:
-            with open(self.file_path, "r") as f:
-                data = json.load(f)
-                # Convert lists back into stack objects
-                for category, actions in data.items():
-                    stack = Stack()  # your stack implementation
+        with file_lock(self.index_path):
+            if os.path.exists(self.index_path):
+                self._refresh_index()  # another process imported it first
+            else:
+                self._import_legacy()
+
+    def _import_legacy(self):
+        legacy = {}
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, "r") as f:
+                    legacy = json.load(f)
+            except json.JSONDecodeError:
+                legacy = {}
+
+        self.index = {category: [] for category in DEFAULT_CATEGORIES}
+        for category, actions in legacy.items():
+            if actions:
+                name = f"{category}-000001.jsonl"
+                with open(self._segment_path(name), "w") as f:
                     for action in actions:
-                        stack.push(action)
-                    self.history[category] = stack
-        except json.JSONDecodeError:
-            self.history = { "request": Stack(), "bin": Stack(), "dispatch": Stack() }
+                        f.write(json.dumps(action, separators=(",", ":")) + "\n")
+                self.index[category] = [{"file": name, "count": len(actions)}]
+        self._save_index()
 
     def get_stack(self, category):
-        """Return the stack for a category"""
-        return self.history.get(category)
\ No newline at end of file
+        """Return the stack for a category (read from its segments on first use)"""
+        if category not in self.history:
+            stack = Stack()
+            if self.repo is not None:
+                actions = self.repo.actions(category)
+                if not actions and category not in DEFAULT_CATEGORIES:
+                    return None
+                for action in actions:
+                    stack.push(action)
+            else:
+                self._refresh_index()
+                if category not in self.index and category not in DEFAULT_CATEGORIES:
+                    return None
+                for segment in self.index.get(category, []):
+                    for action in AppendLog.read(self._segment_path(segment["file"])):
+                        stack.push(action)
+            self.history[category] = stack
+        return self.history.get(category)
@@ -0,0 +1,245 @@
+# services/ingest_service.py
+import csv
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+
+def _parse_timestamp(value):
+    """Seconds since the epoch from a number or an ISO 8601 string (None if missing or unreadable)"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_reading(row):
+    """(bin_id, fill_level, timestamp) from a parsed row, or None if it is not a valid reading"""
+    try:
+        return int(row["bin_id"]), float(row["fill_level"]), _parse_timestamp(row.get("timestamp"))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def read_readings(source, fmt=None, errors=None):
+    """
+    Stream sensor readings as (bin_id, fill_level, timestamp) tuples.
+
+    source is a path, "-" for stdin, or an open text file. fmt is "jsonl"
+    or "csv" (with a bin_id,fill_level,timestamp header); by default it is
+    taken from the file extension, or sniffed from the first line. Lines
+    that are not valid readings are skipped and counted in
+    errors["invalid"] when a dict is given.
+    """
+    if isinstance(source, str):
+        if source == "-":
+            yield from read_readings(sys.stdin, fmt, errors)
+            return
+        if fmt is None:
+            ext = os.path.splitext(source)[1].lower()
+            fmt = "csv" if ext == ".csv" else "jsonl" if ext in (".jsonl", ".json", ".ndjson") else None
+        with open(source, "r", newline="") as f:
+            yield from read_readings(f, fmt, errors)
+        return
+
+    first = source.readline()
+    if not first:
+        return
+    if fmt is None:
+        fmt = "jsonl" if first.lstrip().startswith("{") else "csv"
+
+    if fmt == "csv":
+        rows = csv.DictReader(_chain_line(first, source))
+    else:
+        rows = _json_rows(_chain_line(first, source), errors)
+    for row in rows:
+        reading = parse_reading(row)
+        if reading is None:
+            if errors is not None:
+                errors["invalid"] = errors.get("invalid", 0) + 1
+            continue
+        yield reading
+
+
+def _chain_line(first, rest):
+    yield first
+    yield from rest
+
+
+def _json_rows(lines, errors):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            if errors is not None:
+                errors["invalid"] = errors.get("invalid", 0) + 1
+
+
+def keep_newest(latest, reading):
+    """Fold a reading into {bin_id: (timestamp, level)} unless an already newer one is there"""
+    bin_id, level, ts = reading
+    seen = latest.get(bin_id)
+    if seen is None or ts is None or seen[0] is None or ts >= seen[0]:
+        latest[bin_id] = (ts, level)
+
+
+def split_newest(latest):
+    """({bin_id: level}, {bin_id: timestamp}) from keep_newest()'s map; readings without a time have no timestamp entry"""
+    levels = {bin_id: level for bin_id, (_, level) in latest.items()}
+    timestamps = {bin_id: ts for bin_id, (ts, _) in latest.items() if ts is not None}
+    return levels, timestamps
+
+
+def coalesce(readings, batch_size=5000, window=1.0):
+    """
+    Group a reading stream into {bin_id: fill_level} batches, keeping only
+    the newest reading of each bin (by timestamp; arrival order breaks ties
+    and stands in for missing ones). A batch is closed after batch_size
+    readings or once it has been open `window` seconds, whichever comes
+    first. Yields (levels, {bin_id: timestamp} of the readings that have
+    one, number of readings folded into it).
+    """
+    latest = {}  # bin_id -> (timestamp, level)
+    count = 0
+    opened = time.monotonic()
+    for reading in readings:
+        keep_newest(latest, reading)
+        count += 1
+        if count >= batch_size or time.monotonic() - opened >= window:
+            yield split_newest(latest) + (count,)
+            latest, count = {}, 0
+            opened = time.monotonic()
+    if count:
+        yield split_newest(latest) + (count,)
+
+
+class SensorIngestService:
+    """
+    Applies streams of bin sensor readings to a BinService in batches.
+
+    Readings are coalesced per bin (see coalesce()), and every batch is
+    applied with BinService.apply_fill_levels(): one log record per batch
+    instead of a save and a history push per reading. Sensor batches stay
+    off the undo history, so Undo on the Bins page still reverts the last
+    user action.
+    """
+
+    def __init__(self, bin_service, batch_size=5000, window=1.0):
+        self.bin_service = bin_service
+        self.batch_size = batch_size
+        self.window = window
+
+    def ingest(self, readings):
+        """
+        Apply an iterable of (bin_id, fill_level, timestamp) readings.
+        Returns counters: readings, batches, bins changed and readings for
+        unknown bins.
+        """
+        stats = {"readings": 0, "batches": 0, "changed": 0, "unknown": 0}
+        for levels, timestamps, count in coalesce(readings, self.batch_size, self.window):
+            unknown = [bin_id for bin_id in levels if bin_id not in self.bin_service.by_id]
+            for bin_id in unknown:
+                del levels[bin_id]
+            stats["readings"] += count
+            stats["unknown"] += len(unknown)
+            stats["batches"] += 1
+            stats["changed"] += self.bin_service.apply_fill_levels(levels, timestamps)
+        return stats
+
+    def ingest_file(self, source, fmt=None):
+        """Ingest a JSONL/CSV file (or "-" for stdin); the counters include invalid lines"""
+        errors = {"invalid": 0}
+        stats = self.ingest(read_readings(source, fmt, errors))
+        stats["invalid"] = errors["invalid"]
+        return stats
+
+
+def synthetic_readings(bin_ids, count, seed=0, start=None):
+    """Generate `count` random readings spread over bin_ids, one second apart"""
+    rng = random.Random(seed)
+    bin_ids = list(bin_ids)
+    ts = start if start is not None else time.time()
+    for i in range(count):
+        yield rng.choice(bin_ids), round(rng.uniform(0, 100), 1), ts + i
+
+
+def write_synthetic(path, bin_ids, count, seed=0):
+    """Write synthetic readings as JSONL or CSV (by extension), for benchmarks and demos"""
+    with open(path, "w", newline="") as f:
+        if path.lower().endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(["bin_id", "fill_level", "timestamp"])
+            writer.writerows(synthetic_readings(bin_ids, count, seed))
+        else:
+            for bin_id, level, ts in synthetic_readings(bin_ids, count, seed):
+                f.write(json.dumps({"bin_id": bin_id, "fill_level": level, "timestamp": ts}) + "\n")
+
+
+def benchmark(count=200_000, bins=1000, batch_size=5000, fmt="jsonl"):
+    """
+    Ingest `count` synthetic readings over `bins` bins into a throwaway copy
+    of the bin store and return (stats, seconds, readings per second).
+    Parsing is included: the readings are written to a file first.
+    """
+    import tempfile
+    from services.bin_service import BinService
+    from services.history_service import HistoryService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bins_path = os.path.join(tmp, "bins.json")
+        with open(bins_path, "w") as f:
+            json.dump([{"id": i, "location": f"Bin {i}", "fill_level": 0, "x": 0.0, "y": 0.0}
+                       for i in range(1, bins + 1)], f)
+        bin_service = BinService(file_path=bins_path, store=False,
+                                 history=HistoryService(os.path.join(tmp, "history.json"), store=False))
+        readings_path = os.path.join(tmp, f"readings.{fmt}")
+        write_synthetic(readings_path, range(1, bins + 1), count)
+
+        started = time.perf_counter()
+        stats = SensorIngestService(bin_service, batch_size=batch_size).ingest_file(readings_path)
+        elapsed = time.perf_counter() - started
+        bin_service.close()
+    return stats, elapsed, count / elapsed if elapsed else float("inf")
+
+
+if __name__ == "__main__":
+    # python -m services.ingest_service <readings.jsonl|readings.csv|->
+    # python -m services.ingest_service bench [readings] [bins] [jsonl|csv]
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m services.ingest_service <file|-> | bench [readings] [bins] [jsonl|csv]")
+    if sys.argv[1] == "bench":
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+        bins = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+        fmt = sys.argv[4] if len(sys.argv) > 4 else "jsonl"
+        stats, elapsed, rate = benchmark(count, bins, fmt=fmt)
+        print(f"{stats['readings']} readings in {stats['batches']} batches, "
+              f"{stats['changed']} bin updates: {elapsed:.2f}s ({rate:,.0f} readings/s)")
+    else:
+        from services.bin_service import BinService
+        from services.fill_series_service import FillSeriesStore
+        from services.prediction_service import PredictionService
+
+        bin_service = BinService()
+        # the readings' history and learned fill rates are kept here, with
+        # the times the readings were taken, whether or not the app is running
+        series = FillSeriesStore(bin_service)
+        predictions = PredictionService(bin_service, series=series)
+        try:
+            stats = SensorIngestService(bin_service).ingest_file(sys.argv[1])
+        finally:
+            predictions.close()
+            series.close()
+            bin_service.close()
+        print(", ".join(f"{key}: {value}" for key, value in stats.items()))
@@ -1,43 +1,561 @@
-import heapq
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from data_structures.avl_trees import FacilityAVLTree
 from services.bin_service import BinService
-from datetime import datetime, timedelta
+
+
+def _hour_of_week(times, utc_offset):
+    """Hour of the week (0 = Monday 00:00) of epoch seconds, as an int array"""
+    hours = (np.asarray(times, dtype=np.float64) + utc_offset) // 3600
+    return ((hours + 72) % 168).astype(np.intp)  # 1970-01-01 was a Thursday
+
 
 class PredictionService:
+    """
+    Learns how fast every bin fills and forecasts fill levels.
+
+    Each bin has a base fill rate (% per hour, an EWMA) times an
+    hour-of-day factor times a day-of-week factor, so a bin that fills
+    over lunch or on market days is predicted that way. The factors average
+    1 per bin, so the base rate stays the bin's mean rate. All of it lives
+    in NumPy arrays indexed by a slot per bin (about 150 bytes a bin).
+
+    Fill levels arrive through BinService's fill listeners, buffered and
+    learned in one batch by the next query (or through observe_many() for
+    recorded readings). Given a FillSeriesStore, it first catches up on
+    the readings recorded since it last saved, e.g. by the ingest process
+    while this one was not running. A rise between two readings is one rate sample
+    for the hour of the week it started in. A drop means the bin was emptied
+    and only restarts the clock. Bins without samples yet fill at
+    DEFAULT_FILL_RATE.
+
+    forecast() integrates the rates from each bin's last reading to the end
+    of the horizon for every bin at once. Growth since a fixed point in
+    time follows from prefix sums of the 24 + 7 factors (the week is day
+    after day of the same hours), so a week costs the same as an hour.
+    The learned arrays are saved to `path` every SAVE_INTERVAL seconds and
+    on close().
+
+    The same rates give each bin the time it will reach OVERFLOW_LEVEL. An
+    AVL tree ordered by that time answers next_to_overflow() without
+    looking at any other bin. It is built on the first query and, from then
+    on, a bin is re-keyed only when a reading of that bin comes in.
+    """
+
     DEFAULT_FILL_RATE = 5  # % per hour if no historical data
+    ALPHA = 0.1  # EWMA weight of a new sample in the base rate
+    BETA = 0.05  # learning rate of the seasonal factors
+    MIN_GAP_HOURS = 1 / 60  # readings closer than this carry no usable rate
+    MAX_GAP_HOURS = 48  # nor do readings further apart (sensor outage)
+    SAVE_INTERVAL = 300
+    OVERFLOW_LEVEL = 100  # fill level (%) at which a bin counts as overflowing
+    CHUNK = 4096  # rows per block when solving for overflow times
+    MAX_PENDING = 10_000  # buffered readings that force a batch before the next query
 
-    def __init__(self, bin_service: BinService):
+    def __init__(self, bin_service: BinService = None, path="data/fill_rates.npz", utc_offset=None, series=None):
         self.bin_service = bin_service
+        self.path = path
+        # seconds to add to epoch time for local wall-clock hours
+        self.utc_offset = time.localtime().tm_gmtoff if utc_offset is None else utc_offset
+
+        self.slots = {}  # bin id -> row in the arrays below
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.base = np.zeros(0, dtype=np.float32)  # % per hour
+        self.hod = np.ones((0, 24), dtype=np.float32)  # hour-of-day factors
+        self.dow = np.ones((0, 7), dtype=np.float32)  # day-of-week factors
+        self.samples = np.zeros(0, dtype=np.int32)  # rate samples learned from
+        self.last_level = np.zeros(0, dtype=np.float32)
+        self.last_time = np.zeros(0, dtype=np.float64)  # epoch seconds
+        self._saved_at = time.monotonic()
+        self._dirty = False
+        self._pending = []  # (bin id, level, time) heard from the bin service, not learned yet
+        # Fill listeners run on whichever thread changed a bin: the arrays, the
+        # slots, the overflow index and _pending change only under this lock
+        # (never held while calling into the bin service, whose listeners take it)
+        self._lock = threading.RLock()
+        # bin ids keyed by (overflow time, id), once built (see next_to_overflow)
+        self.overflow = None
+        self.overflow_at = {}  # bin id -> overflow time it is indexed under
+
+        self._load()
+        if series is not None:
+            self.learn_from(series, self._learned_until())
+        if self.bin_service is not None:  # without one it learns only through observe_many()
+            self.sync()
+            self.bin_service.add_fill_listener(self._on_fill_changed)
+
+    def close(self):
+        if self.bin_service is not None:
+            self.bin_service.remove_fill_listener(self._on_fill_changed)
+        self.save()
+
+    # -------------------- SLOTS --------------------
+
+    def _grow(self, count):
+        """Add `count` fresh rows to every array (capacity doubles, so this is amortised O(1) a bin)"""
+        size = len(self.slots) + count
+        if size <= len(self.ids):
+            return
+        capacity = max(size, 2 * len(self.ids), 1024)
+        extra = capacity - len(self.ids)
+        self.ids = np.concatenate([self.ids, np.full(extra, -1, dtype=np.int64)])
+        self.base = np.concatenate([self.base, np.full(extra, self.DEFAULT_FILL_RATE, dtype=np.float32)])
+        self.hod = np.concatenate([self.hod, np.ones((extra, 24), dtype=np.float32)])
+        self.dow = np.concatenate([self.dow, np.ones((extra, 7), dtype=np.float32)])
+        self.samples = np.concatenate([self.samples, np.zeros(extra, dtype=np.int32)])
+        self.last_level = np.concatenate([self.last_level, np.zeros(extra, dtype=np.float32)])
+        self.last_time = np.concatenate([self.last_time, np.zeros(extra, dtype=np.float64)])
+
+    def _slots_for(self, bin_ids, levels=None, now=None):
+        """
+        Rows of the given bins, adding rows for bins not seen before. A new
+        row starts at `levels` as of `now`; without `now` its first reading
+        only starts the clock.
+        """
+        new = [bin_id for bin_id in dict.fromkeys(bin_ids) if bin_id not in self.slots]
+        if new:
+            self._grow(len(new))
+            first = len(self.slots)
+            for i, bin_id in enumerate(new, first):
+                self.slots[bin_id] = i
+            rows = np.arange(first, first + len(new))
+            self.ids[rows] = new
+            self.last_time[rows] = np.nan if now is None else now  # NaN gaps are never usable
+            if levels is not None:
+                self.last_level[rows] = levels
+            if now is not None:
+                self._reindex(rows)
+        slots = self.slots
+        return np.fromiter((slots[bin_id] for bin_id in bin_ids), dtype=np.intp, count=len(bin_ids))
+
+    def sync(self):
+        """
+        Catch up with the bin service: learn the buffered readings and give
+        every bin a row (new bins start at their current level).
+        """
+        bins = self.bin_service.get_all_bins() if self.bin_service is not None else ()
+        with self._lock:
+            if self._pending:
+                bin_ids, levels, times = zip(*self._pending)
+                self._pending = []
+                self.observe_many(bin_ids, levels, times)
+            if len(self.slots) >= len(bins) and all(b.id in self.slots for b in bins):
+                return
+            bins = [b for b in bins if b.id not in self.slots]
+            self._slots_for([b.id for b in bins], [b.fill_level for b in bins], time.time())
+
+    # -------------------- LEARNING --------------------
+
+    def _on_fill_changed(self, bin_obj, old_level, timestamp=None):
+        with self._lock:
+            self._pending.append((bin_obj.id, bin_obj.fill_level, time.time() if timestamp is None else timestamp))
+            full = len(self._pending) >= self.MAX_PENDING
+        if time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+            self.save()
+        elif full:
+            self.sync()
+
+    def learn_from(self, series, start=None):
+        """Learn from the samples a FillSeriesStore recorded since `start` (epoch seconds)"""
+        bin_ids, levels, times = series.samples(start)
+        if len(bin_ids):
+            self.observe_many(bin_ids, levels, times)
+
+    def _learned_until(self):
+        """
+        Earliest last-reading time over the bins with one (None if none
+        has): every sample a bin has not learned from is at or after it.
+        Older ones would be ignored anyway (see _learn).
+        """
+        with self._lock:
+            known = self.last_time[:len(self.slots)]
+            known = known[~np.isnan(known)]
+            return float(known.min()) if len(known) else None
+
+    def observe_many(self, bin_ids, levels, times):
+        """
+        Learn from fill readings: parallel sequences of bin ids, levels (%)
+        and epoch seconds. Readings are applied in time order; a batch is
+        processed in vectorized rounds of at most one reading per bin.
+        """
+        levels = np.asarray(levels, dtype=np.float32)
+        times = np.asarray(times, dtype=np.float64)
+        if not len(times):
+            return
+        with self._lock:
+            unique, inverse = np.unique(np.asarray(bin_ids), return_inverse=True)
+            slots = self._slots_for(unique.tolist())[inverse.ravel()]
+            # every bin's readings in time order, numbered; round r learns each bin's r-th reading
+            order = np.lexsort((times, slots))
+            slots, levels, times = slots[order], levels[order], times[order]
+            starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+            sizes = np.diff(np.r_[starts, len(slots)])
+            rank = np.arange(len(slots)) - np.repeat(starts, sizes)
+            by_rank = np.argsort(rank, kind="stable")
+            bounds = np.searchsorted(rank[by_rank], np.arange(sizes.max() + 1))
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                batch = by_rank[lo:hi]
+                self._learn(slots[batch], levels[batch], times[batch])
+            self._dirty = True
+
+    def _learn(self, slots, levels, times):
+        """One reading per slot: fold the rate since its previous reading into the estimates"""
+        newer = ~(times < self.last_time[slots])  # readings older than what was learned are ignored
+        slots, levels, times = slots[newer], levels[newer], times[newer]
+        hours = (times - self.last_time[slots]) / 3600
+        rise = levels - self.last_level[slots]
+        usable = (rise >= 0) & (hours >= self.MIN_GAP_HOURS) & (hours <= self.MAX_GAP_HOURS)
+        s = slots[usable]
+        if len(s):
+            rate = (rise[usable] / hours[usable]).astype(np.float32)
+            week_hour = _hour_of_week(self.last_time[s], self.utc_offset)
+            h, d = week_hour % 24, week_hour // 24
+            factor = self.hod[s, h] * self.dow[s, d]
+
+            # base rate: the sample with its seasonal factors taken out (the first sample replaces the default)
+            deseasoned = rate / factor
+            fresh = self.samples[s] == 0
+            self.base[s] = np.where(fresh, deseasoned, self.base[s] + self.ALPHA * (deseasoned - self.base[s]))
+            self.samples[s] += 1
+
+            # seasonal factors: move toward the ratio the sample showed
+            ratio = rate / np.maximum(self.base[s], 1e-3)
+            hod, dow = self.hod[s, h], self.dow[s, d]
+            self.hod[s, h] = np.clip(hod + self.BETA * (ratio / dow - hod), 0.05, 20)
+            self.dow[s, d] = np.clip(dow + self.BETA * (ratio / hod - dow), 0.05, 20)
+            # keep each bin's factors averaging 1, moving the scale into the base rate
+            for factors in (self.hod, self.dow):
+                mean = factors[s].mean(axis=1)
+                factors[s] /= mean[:, None]
+                self.base[s] *= mean
+
+        self.last_level[slots] = levels
+        self.last_time[slots] = times
+        self._reindex(slots)
+
+    # -------------------- FORECAST --------------------
+
+    def _growth(self, rows, start, end):
+        """
+        Growth (%) of each row from `start` to `end` (epoch seconds, one per
+        row or one for all) at its learned rates. Each time is placed in its
+        week: whole weeks grow by the weekly total, and the growth into a
+        week is a prefix sum over the days before it and the hours before
+        that in its day.
+        """
+        hod, dow = self.hod[rows], self.dow[rows]
+        hod_before = np.cumsum(hod, axis=1) - hod  # growth of the hours of the day before each hour, over dow
+        dow_before = np.cumsum(dow, axis=1) - dow
+        hod_day = hod_before[:, -1] + hod[:, -1]
+        row = np.arange(len(hod))
+
+        def position(times):
+            hours = (np.asarray(times, dtype=np.float64) + self.utc_offset) / 3600 + 72  # 1970-01-01 was a Thursday
+            weeks = np.floor(hours / 168)
+            into_week = hours - weeks * 168
+            day = (into_week // 24).astype(np.intp)
+            hour = (into_week % 24).astype(np.intp)
+            partial = into_week - np.floor(into_week)
+            return weeks, hod_day * dow_before[row, day] + dow[row, day] * (hod_before[row, hour] + partial * hod[row, hour])
+
+        start_weeks, start_into = position(start)
+        end_weeks, end_into = position(end)
+        return self.base[rows] * ((end_weeks - start_weeks) * hod_day * (dow_before[:, -1] + dow[:, -1])
+                                  + end_into - start_into)
+
+    def rates(self, now=None):
+        """Expected fill rate (% per hour) of every row at time `now`"""
+        self.sync()
+        week_hour = _hour_of_week(time.time() if now is None else now, self.utc_offset)
+        with self._lock:
+            n = len(self.slots)
+            return self.base[:n] * self.hod[:n, week_hour % 24] * self.dow[:n, week_hour // 24]
+
+    def forecast(self, hours_ahead=2, now=None, bin_ids=None):
+        """
+        Predicted fill level of every known bin (or just `bin_ids`)
+        `hours_ahead` hours after `now` (epoch seconds, default the current
+        time), capped at 100: the last reading plus the learned growth from
+        then on. Returns (bin ids, levels) as NumPy arrays.
+        """
+        self.sync()
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = np.arange(len(self.slots)) if bin_ids is None else self._slots_for(list(bin_ids))
+            # a bin has kept filling since its last reading (one without a reading starts now)
+            since = self.last_time[rows]
+            since = np.where(np.isnan(since), now, since)
+            growth = self._growth(rows, since, now + hours_ahead * 3600)
+            return self.ids[rows], np.minimum(self.last_level[rows] + np.maximum(growth, 0), 100)
 
     def predict_fill(self, hours_ahead=2):
         """
         Predict fill level of all bins after `hours_ahead` hours.
         Returns a list of tuples: (predicted_fill, bin_obj)
         """
-        predicted_list = []
+        ids, levels = self.forecast(hours_ahead)
+        by_id = self.bin_service.by_id
+        return [(float(level), by_id[bin_id]) for bin_id, level in zip(ids.tolist(), levels.tolist())
+                if bin_id in by_id]
 
-        for b in self.bin_service.bins:
-            # Simple prediction: current fill + (fill_rate * hours)
-            fill_rate = getattr(b, "avg_fill_rate", self.DEFAULT_FILL_RATE)
-            predicted_fill = b.fill_level + fill_rate * hours_ahead
-            predicted_fill = min(predicted_fill, 100)  # cap at 100%
-            predicted_list.append((predicted_fill, b))
+    def top_overflow_bins(self, hours_ahead=2, top_n=5):
+        """
+        Return top_n bins predicted to overflow soonest, as tuples
+        (predicted fill after `hours_ahead` hours, bin), soonest first.
+        Reads them off the overflow index: O(top_n log n).
+        """
+        soonest = [b for _, b in self.next_to_overflow(top_n)]
+        if not soonest:
+            return []
+        _, levels = self.forecast(hours_ahead, bin_ids=[b.id for b in soonest])
+        return list(zip(levels.tolist(), soonest))
 
-        return predicted_list
+    # -------------------- OVERFLOW INDEX --------------------
 
-    def top_overflow_bins(self, hours_ahead=2, top_n=5):
+    def _overflow_times(self, slots):
         """
-        Return top_n bins predicted to overflow soonest.
-        Uses a min-heap to track bins with highest predicted fill.
+        Epoch time each row reaches OVERFLOW_LEVEL, growing from its last
+        reading at the learned rates (inf if it never fills, NaN before its
+        first reading). The rates repeat weekly, so whole weeks are skipped
+        at once and only the hours of the last one are searched.
         """
-        predicted = self.predict_fill(hours_ahead)
-        
-        # Create a max-heap based on predicted fill
-        max_heap = [(-fill, b) for fill, b in predicted]
-        heapq.heapify(max_heap)
+        slots = np.asarray(slots, dtype=np.intp)
+        times = np.full(len(slots), np.nan)
+        # a week of hours per row: in chunks, so the temporaries stay in cache
+        for lo in range(0, len(slots), self.CHUNK):
+            times[lo:lo + self.CHUNK] = self._overflow_chunk(slots[lo:lo + self.CHUNK])
+        return times
+
+    def _overflow_chunk(self, slots):
+        t0 = self.last_time[slots]
+        need = self.OVERFLOW_LEVEL - self.last_level[slots].astype(np.float64)
+        times = np.full(len(slots), np.nan)
+        known = ~np.isnan(t0)
+        slots, t0, need = slots[known], t0[known], need[known]
+
+        hours = (t0 + self.utc_offset) / 3600
+        phase = hours - np.floor(hours)  # part of the first hour already gone
+        # the week's hourly rates (Monday 00:00 first), turned to start at the hour of the reading
+        week_rates = (self.dow[slots][:, :, None] * self.hod[slots][:, None, :]).reshape(len(slots), 168)
+        steps = (_hour_of_week(t0, self.utc_offset)[:, None] + np.arange(168)) % 168
+        rates = np.take_along_axis(week_rates, steps, axis=1) * self.base[slots, None].astype(np.float64)
+        grown = np.cumsum(rates, axis=1)  # growth up to the end of each hour of the week ahead
+        week = grown[:, -1]
+
+        # growth needed counted from the start of the first hour
+        target = need + phase * rates[:, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weeks = np.maximum(np.ceil(target / week) - 1, 0)
+            rest = target - weeks * week
+            hour = np.minimum((grown < rest[:, None]).sum(axis=1), 167)
+            row = np.arange(len(slots))
+            within = (rest - grown[row, hour] + rates[row, hour]) / rates[row, hour]
+            reached = t0 + (weeks * 168 + hour + within - phase) * 3600
+        reached = np.where(week > 0, reached, np.inf)
+        times[known] = np.where(need <= 0, t0, reached)
+        return times
+
+    def _build_overflow(self):
+        n = len(self.slots)
+        times = self._overflow_times(np.arange(n))
+        ids = self.ids[:n]
+        known = ~np.isnan(times)
+        order = np.lexsort((ids[known], times[known]))
+        ids, times = ids[known][order].tolist(), times[known][order].tolist()
+        self.overflow_at = dict(zip(ids, times))
+        self.overflow = FacilityAVLTree(key=lambda bin_id: (self.overflow_at[bin_id], bin_id))
+        self.overflow.bulk_load(ids)  # already in key order
+
+    def _reindex(self, slots):
+        """Re-key rows whose level or rates changed (a rebuild if that is most of them)"""
+        if self.overflow is None:
+            return
+        if len(slots) > len(self.overflow_at) // 4:
+            self._build_overflow()
+            return
+        tree, overflow_at = self.overflow, self.overflow_at
+        for bin_id, at in zip(self.ids[slots].tolist(), self._overflow_times(slots).tolist()):
+            old = overflow_at.pop(bin_id, None)
+            if old is not None:
+                tree.delete((old, bin_id))
+            if at == at:  # not NaN
+                overflow_at[bin_id] = at
+                tree.insert(bin_id)
+
+    def next_to_overflow(self, k=10, before=None):
+        """
+        The k bins predicted to overflow first, optionally only those before
+        `before` (epoch seconds), as (overflow time, bin) tuples (bin ids
+        without a bin service), soonest first. A bin that is already full has the time of its reading.
+        O(k log n) once the index is built.
+        """
+        self.sync()
+        by_id = self.bin_service.by_id if self.bin_service is not None else None
+        found = []
+        if k <= 0:
+            return found
+        with self._lock:
+            if self.overflow is None:
+                self._build_overflow()
+            for bin_id in self.overflow.range(hi=None if before is None else (before,)):
+                if by_id is None:
+                    found.append((self.overflow_at[bin_id], bin_id))
+                else:
+                    b = by_id.get(bin_id)
+                    if b is not None:  # deleted bins keep their row until restart
+                        found.append((self.overflow_at[bin_id], b))
+                if len(found) >= k:
+                    break
+        return found
+
+    def overflow_time(self, bin_id):
+        """Predicted overflow time of one bin (epoch seconds; inf if it never fills, None if unknown)"""
+        self.sync()
+        with self._lock:
+            slot = self.slots.get(bin_id)
+            if slot is None:
+                return None
+            at = self._overflow_times([slot])[0]
+        return None if at != at else float(at)
+
+    # -------------------- PERSISTENCE --------------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as saved:
+                arrays = {name: saved[name] for name in saved.files}
+        except (OSError, ValueError, KeyError):
+            return  # unreadable: learn again from scratch
+        n = len(arrays["ids"])
+        self._grow(n)
+        for name in ("ids", "base", "hod", "dow", "samples", "last_level", "last_time"):
+            getattr(self, name)[:n] = arrays[name]
+        self.slots = {bin_id: i for i, bin_id in enumerate(arrays["ids"].tolist())}
+
+    def save(self):
+        """Write the learned arrays (via a temp file renamed into place)"""
+        self.sync()
+        with self._lock:
+            if not self._dirty:
+                return
+            n = len(self.slots)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, ids=self.ids[:n], base=self.base[:n], hod=self.hod[:n], dow=self.dow[:n],
+                         samples=self.samples[:n], last_level=self.last_level[:n], last_time=self.last_time[:n])
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+
+def backtest(bins=100_000, days=21, test_days=7, hours_ahead=6, seed=0, stale_share=0.1, stale_hours=5):
+    """
+    Replay `days` of hourly readings from `bins` synthetic bins (each with
+    its own rate, busy hours and weekend factor, noise, and collections once
+    nearly full) through observe_many(). A `stale_share` of the bins report
+    only every `stale_hours` hours, so their last reading is often hours old
+    when they are forecast. Over the last `test_days`, every 6 hours all
+    bins are forecast `hours_ahead` hours ahead and compared with what they
+    then hold, skipping bins collected since the reading the forecast
+    started from.
+
+    Returns mean absolute errors (learned model, the learned model on the
+    stale bins, and the flat DEFAULT_FILL_RATE from the last reading), the
+    mean signed error on the stale bins (growth missed since their reading
+    would show up as a negative bias), and throughput of learning and
+    forecasting.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.lognormal(0.3, 0.6, bins).astype(np.float32)
+    hours = np.arange(24)
+    peak = rng.uniform(7, 19, bins)[:, None]
+    hod = 0.3 + np.exp(-0.5 * ((hours - peak) / rng.uniform(2, 4, bins)[:, None]) ** 2)
+    hod = (hod / hod.mean(axis=1, keepdims=True)).astype(np.float32)
+    dow = np.ones((bins, 7), dtype=np.float32)
+    dow[:, 5:] = rng.uniform(0.4, 2.5, bins)[:, None]
+    dow /= dow.mean(axis=1, keepdims=True)
+    threshold = rng.uniform(80, 100, bins)
+    stale = rng.random(bins) < stale_share
+    stale_phase = rng.integers(0, stale_hours, bins)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = PredictionService(path=os.path.join(tmp, "fill_rates.npz"), utc_offset=0)
+        ids = np.arange(1, bins + 1)
+        level = rng.uniform(0, 50, bins).astype(np.float32)
+        reported = level.copy()  # what each bin last reported
+        reported_at = np.zeros(bins, dtype=np.int64)  # and at which step
+        collected_at = np.full(bins, -1, dtype=np.int64)  # step of each bin's latest collection
+        start = 4 * 24 * 3600  # 1970-01-05, a Monday
+        train_hours, total_hours = (days - test_days) * 24, days * 24
+        pending = {}  # hour due -> (predicted, flat baseline, step of each bin's reading it started from)
+        errors, stale_errors, flat_errors = [], [], []
+        learn_seconds = forecast_seconds = 0.0
+        forecasts = readings = 0
+
+        for step in range(total_hours + 1):
+            now = start + step * 3600
+            reports = ~stale | ((step + stale_phase) % stale_hours == 0) | (step == 0)
+            reported[reports] = level[reports]
+            reported_at[reports] = step
+            started = time.perf_counter()
+            service.observe_many(ids[reports], level[reports], np.full(reports.sum(), now, dtype=np.float64))
+            learn_seconds += time.perf_counter() - started
+            readings += int(reports.sum())
+
+            due = pending.pop(step, None)
+            if due is not None:
+                predicted, flat, since = due
+                keep = collected_at < since  # nothing can foresee a collection after the reading
+                errors.append(np.abs(predicted[keep] - level[keep]))
+                stale_errors.append(predicted[keep & stale] - level[keep & stale])
+                flat_errors.append(np.abs(flat[keep] - level[keep]))
+            if step >= train_hours and step % 6 == 0 and step + hours_ahead <= total_hours:
+                started = time.perf_counter()
+                _, predicted = service.forecast(hours_ahead, now)
+                forecast_seconds += time.perf_counter() - started
+                forecasts += bins
+                flat = np.minimum(reported + PredictionService.DEFAULT_FILL_RATE * hours_ahead, 100)
+                pending[step + hours_ahead] = (predicted.copy(), flat, reported_at.copy())
+
+            # the next hour: the bins fill at their true rate (with noise); full ones get collected
+            week_hour = _hour_of_week(now, 0)
+            rate = base * hod[:, week_hour % 24] * dow[:, week_hour // 24]
+            rate *= rng.normal(1, 0.25, bins).clip(0).astype(np.float32)
+            collected_at[level >= threshold] = step
+            level = np.where(level >= threshold, 0, np.minimum(level + rate, 100)).astype(np.float32)
+
+        started = time.perf_counter()
+        service.forecast(24 * 7 * 4 + 0.5, start)  # a four-week horizon costs the same
+        long_seconds = time.perf_counter() - started
+
+    return {
+        "mae": float(np.concatenate(errors).mean()),
+        "stale_mae": float(np.abs(np.concatenate(stale_errors)).mean()) if stale.any() else float("nan"),
+        "stale_bias": float(np.concatenate(stale_errors).mean()) if stale.any() else float("nan"),
+        "flat_mae": float(np.concatenate(flat_errors).mean()),
+        "readings_per_second": readings / learn_seconds,
+        "forecasts_per_second": forecasts / forecast_seconds,
+        "four_week_forecast_seconds": long_seconds,
+    }
 
-        top_bins = []
-        for _ in range(min(top_n, len(max_heap))):
-            neg_fill, b = heapq.heappop(max_heap)
-            top_bins.append((-neg_fill, b))  # convert back to positive fill
 
-        return top_bins
+if __name__ == "__main__":
+    # python -m services.prediction_service bench [bins] [days]
+    if len(sys.argv) < 2 or sys.argv[1] != "bench":
+        sys.exit("usage: python -m services.prediction_service bench [bins] [days]")
+    bins = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else 21
+    result = backtest(bins, days)
+    print(f"{bins} bins, {days} days of hourly readings: "
+          f"MAE {result['mae']:.2f} points ({result['stale_mae']:.2f} on bins with stale readings, "
+          f"bias {result['stale_bias']:+.2f}; "
+          f"{result['flat_mae']:.2f} at a flat {PredictionService.DEFAULT_FILL_RATE}%/h), "
+          f"learning {result['readings_per_second']:,.0f} readings/s, "
+          f"forecasting {result['forecasts_per_second']:,.0f} bins/s "
+          f"(4-week horizon for all bins: {result['four_week_forecast_seconds'] * 1000:.1f} ms)")
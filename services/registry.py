@@ -0,0 +1,107 @@
+# services/registry.py
+import threading
+from services.bin_service import BinService
+from services.facility_service import FacilityService
+from services.fill_series_service import FillSeriesStore
+from services.history_service import HistoryService
+from services.prediction_service import PredictionService
+from services.reporting_service import ReportService
+from services.request_service import RequestService
+from services.rollup_service import HistoryRollup
+from services.user_service import UserService
+
+
+class ServiceRegistry:
+    """
+    Process-wide service singletons, shared by every Streamlit session and rerun.
+
+    A service is built on first use and handed out again from then on.
+    Services with a refresh() method are asked to catch up on every get();
+    they compare a stored version (file stat or database generation) and
+    only re-read what changed. A service is rebuilt, under the registry
+    lock, only when a service it depends on is, and the old instance is
+    closed.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._factories = {}  # name -> (factory, depends)
+        self._entries = {}  # name -> [service, generations of its dependencies, own generation]
+        self._generation = 0
+
+    def register(self, name, factory, depends=()):
+        """
+        factory(registry) builds the service. depends names the services it
+        was given, so it is rebuilt whenever one of them is.
+        """
+        with self._lock:
+            self._factories[name] = (factory, tuple(depends))
+            self._drop(name)
+
+    def _signature(self, name):
+        _, depends = self._factories[name]
+        return tuple(self._entry(dep)[2] for dep in depends)
+
+    def _entry(self, name):
+        if name not in self._factories:
+            raise KeyError(f"No service registered as '{name}'")
+        entry = self._entries.get(name)
+        if entry is not None and self._signature(name) == entry[1]:
+            if hasattr(entry[0], "refresh"):
+                entry[0].refresh()
+            return entry
+
+        self._drop(name)
+        factory, _ = self._factories[name]
+        service = factory(self)
+        self._generation += 1
+        entry = [service, self._signature(name), self._generation]
+        self._entries[name] = entry
+        return entry
+
+    def get(self, name):
+        """Return the shared instance of a service, rebuilding it if it is stale"""
+        with self._lock:
+            return self._entry(name)[0]
+
+    def _drop(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is not None and hasattr(entry[0], "close"):
+            entry[0].close()
+
+    def invalidate(self, name=None):
+        """Force a rebuild of one service (or all of them) on the next get()"""
+        with self._lock:
+            for key in ([name] if name else list(self._entries)):
+                self._drop(key)
+
+
+def _register_defaults(reg):
+    reg.register("bins", lambda r: BinService())
+    reg.register("facilities", lambda r: FacilityService())
+    reg.register("history", lambda r: HistoryService())
+    reg.register("rollups", lambda r: HistoryRollup(r.get("history")), depends=("history",))
+    reg.register("fill_series", lambda r: FillSeriesStore(r.get("bins")), depends=("bins",))
+    reg.register("predictions", lambda r: PredictionService(r.get("bins"), series=r.get("fill_series")),
+                 depends=("bins", "fill_series"))
+    reg.register("users", lambda r: UserService())
+    reg.register("requests", lambda r: RequestService(bin_service=r.get("bins")), depends=("bins",))
+    reg.register(
+        "reports",
+        lambda r: ReportService(
+            bin_service=r.get("bins"),
+            request_service=r.get("requests"),
+            facility_service=r.get("facilities"),
+            history_service=r.get("history"),
+        ),
+        depends=("bins", "requests", "facilities", "history"),
+    )
+
+
+registry = ServiceRegistry()
+_register_defaults(registry)
+
+
+def get_service(name):
+    """Shorthand for registry.get(name)"""
+    return registry.get(name)
@@ -1,67 +1,168 @@
 # services/report_service.py
+import hashlib
+import json
+import math
+import threading
 from services.request_service import RequestService
 from services.bin_service import BinService
 from services.facility_service import FacilityService
 from services.history_service import HistoryService
+from services.storage import atomic_write_json, read_json
 
 class ReportService:
     EMISSION_FACTOR = 0.2  # kg CO2 per km, example
 
-    def __init__(self):
-        self.request_service = RequestService()
-        self.bin_service = BinService()
-        self.facility_service = FacilityService()
-        self.history_service = HistoryService()
+    def __init__(self, bin_service=None, request_service=None, facility_service=None, history_service=None,
+                 report_path="data/co2_report.json"):
+        # Pass shared instances (see services/registry.py) to avoid reloading every file
+        self.bin_service = bin_service or BinService()
+        self.request_service = request_service or RequestService(bin_service=self.bin_service)
+        self.facility_service = facility_service or FacilityService()
+        self.history_service = history_service or HistoryService()
+
+        # Materialized CO2 report: facility id -> kg over every processed
+        # request in the request history. Each processed request is
+        # attributed once, when it is recorded, and the attribution is stored
+        # in its history record so an undo takes back exactly that amount.
+        self.report_path = report_path
+        self.co2_totals = {}
+        # listeners fire from whichever session (thread) changed the history
+        self._lock = threading.RLock()
+        # High-water mark: (request actions in history, fingerprint of the
+        # newest) that co2_totals covers, as saved in report_path
+        self._mark = None
+        self._history_version = None  # history version() when the mark was last checked
+        self.request_history = self.request_service.history
+        self._load_report()
+        self.request_history.add_listener(self._on_history)
+
+    def close(self):
+        self.request_history.remove_listener(self._on_history)
+
+    # -------------------- CO2 REPORT --------------------
 
     def co2_saved_per_facility(self):
-        """Return dict {facility_name: co2_saved}"""
-        facilities = self.facility_service.get_all()
-        result = {f.name: 0 for f in facilities}
-        
-        # Get processed requests from history
-        stack = self.history_service.get_stack("request")
-        if not stack or stack.is_empty():
+        """Return dict {facility_name: co2_saved}, read from the materialized totals in O(F)"""
+        with self._lock:
+            self._catch_up()
+            result = {}
+            for f in self.facility_service.get_all():
+                result[f.name] = result.get(f.name, 0) + self.co2_totals.get(f.id, 0)
             return result
-            
-        history_list = stack.to_list()
-        
-        for h in history_list:
-            if h["type"] == "process_request":
-                data = h["data"]
-                bin_id = data.get("bin_id")
-                
-                bin_obj = self.bin_service.get_bin_by_id(bin_id)
-                if not bin_obj:
-                    continue
-                    
-                # Find nearest facility of same type
-                matching_facilities = [f for f in facilities if f.type == bin_obj.bin_type]
-                if not matching_facilities:
-                    continue
-                    
-                # Find closest facility (Haversine distance)
-                best_fac = None
-                min_dist_km = float('inf')
-                
-                for fac in matching_facilities:
-                    # x is lat, y is lon based on data inspection
-                    dist_km = self._haversine_distance(bin_obj.x, bin_obj.y, fac.x, fac.y)
-                    if dist_km < min_dist_km:
-                        min_dist_km = dist_km
-                        best_fac = fac
-                
-                if best_fac:
-                    co2 = min_dist_km * self.EMISSION_FACTOR
-                    result[best_fac.name] += co2
-
-        return result
+
+    @staticmethod
+    def _processed(action):
+        """The processed request records of a request history action"""
+        if action["type"] == "process_request":
+            return [action["data"]]
+        if action["type"] == "process_bin":
+            return action["data"]["requests"]
+        return []
+
+    @staticmethod
+    def _fingerprint(action):
+        if action is None:
+            return None
+        return hashlib.sha1(json.dumps(action, sort_keys=True).encode()).hexdigest()
+
+    def _attribute(self, data):
+        """
+        {"facility": id, "kg": co2} for a processed request: the trip from its
+        bin to the nearest facility of the bin's type (None if there is none).
+        Uses the bin details saved with the request, else the bin as it is now.
+        """
+        if "bin_x" in data:
+            bin_type, x, y = data.get("bin_type"), data["bin_x"], data["bin_y"]
+        else:
+            bin_obj = self.bin_service.get_bin_by_id(data.get("bin_id"))
+            if not bin_obj:
+                return None
+            bin_type, x, y = bin_obj.bin_type, bin_obj.x, bin_obj.y
+
+        # Find closest facility of the same type (Haversine distance)
+        best_fac = None
+        min_dist_km = float('inf')
+        for fac in self.facility_service.search_by_type(bin_type):
+            # x is lat, y is lon based on data inspection
+            dist_km = self._haversine_distance(x, y, fac.x, fac.y)
+            if dist_km < min_dist_km:
+                min_dist_km = dist_km
+                best_fac = fac
+
+        if best_fac is None:
+            return None
+        return {"facility": best_fac.id, "kg": min_dist_km * self.EMISSION_FACTOR}
+
+    def _add(self, attribution, sign):
+        if attribution:
+            fac_id = attribution["facility"]
+            self.co2_totals[fac_id] = self.co2_totals.get(fac_id, 0) + sign * attribution["kg"]
+
+    def _on_history(self, category, action, undone):
+        """Fold one request history push (or pop) into the totals"""
+        with self._lock:
+            if category != "request":
+                return
+            for data in self._processed(action):
+                if not undone and "co2" not in data:
+                    data["co2"] = self._attribute(data)  # stored with the history record
+                # records from before the report existed carry no attribution
+                self._add(data["co2"] if "co2" in data else self._attribute(data), -1 if undone else 1)
+            if self._mark is None:
+                return  # not caught up yet: the next report rebuilds anyway
+            if undone:
+                self._mark = (self._mark[0] - 1, self._fingerprint(self.request_history.peek_last("request")))
+            else:
+                self._mark = (self._mark[0] + 1, self._fingerprint(action))
+            self._save_report()
+
+    def _catch_up(self):
+        """
+        Rebuild the totals from the whole request history if it no longer
+        ends where the mark says (another process changed it). A couple of
+        stat calls when the history has not changed at all.
+        """
+        with self._lock:
+            version = self.request_history.version()
+            if version == self._history_version:
+                return
+            current = (self.request_history.count("request"),
+                       self._fingerprint(self.request_history.peek_last("request")))
+            if current != self._mark:
+                self._rebuild_report()
+            self._history_version = version
+
+    def _rebuild_report(self):
+        self.co2_totals = {}
+        self.request_history.refresh()  # drop stacks cached before another process wrote
+        stack = self.request_history.get_stack("request")
+        actions = stack.to_list() if stack else []
+        for action in actions:
+            for data in self._processed(action):
+                self._add(data["co2"] if "co2" in data else self._attribute(data), 1)
+        self._mark = (len(actions), self._fingerprint(actions[-1] if actions else None))
+        self._save_report()
+
+    def _load_report(self):
+        try:
+            report, _ = read_json(self.report_path, {})
+        except json.JSONDecodeError:
+            return  # rebuilt on first use
+        if report.get("high_water"):
+            self._mark = tuple(report["high_water"])
+            self.co2_totals = {int(fac_id): kg for fac_id, kg in report.get("totals", {}).items()}
+
+    def _save_report(self):
+        atomic_write_json(self.report_path, {
+            "high_water": list(self._mark),
+            "totals": {str(fac_id): kg for fac_id, kg in self.co2_totals.items()},
+        })
 
     def _haversine_distance(self, lat1, lon1, lat2, lon2):
         """
         Calculate the great circle distance between two points 
         on the earth (specified in decimal degrees)
         """
-        import math
         # Convert decimal degrees to radians 
         lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
 
@@ -1,144 +1,552 @@
 # services/request_service.py
 import os
 import json
+import threading
 from models.request import Request
-from data_structures.queue import Queue  # your custom queue
+from datetime import datetime
+from data_structures.queue import IndexedQueue  # your custom queue
+from data_structures.priority_queue import LazyPriorityQueue
 from services.history_service import HistoryService
+from services.sequence_service import SequenceService
+from services.sqlite_store import get_store
+from services.storage import AppendLog, CorruptSnapshot, atomic_write_json, file_lock, file_version
 
 class RequestService:
-    def __init__(self, file_path="data/requests.json"):
+    # Scheduling weights: score = type + fill% * FILL_WEIGHT
+    #                              + extra reports * DUPLICATE_WEIGHT + hours waiting * AGING_PER_HOUR
+    REQUEST_TYPE_PRIORITY = {"Collect": 100, "Maintain": 40}
+    DEFAULT_TYPE_PRIORITY = 20
+    FILL_WEIGHT = 1.0
+    DUPLICATE_WEIGHT = 15
+    AGING_PER_HOUR = 5  # a waiting ticket gains this much per hour, so nothing starves
+    # Fold the request log into a fresh requests.json snapshot after this many records
+    COMPACT_EVERY = 1000
+
+    def __init__(self, file_path="data/requests.json", bin_service=None, store=None):
         self.file_path = file_path
-        self.queue = Queue()  # custom queue
-        self.history = HistoryService()  # stack-based history per category
+        # SQLite keeps every request (any status); requests.json only the pending ones,
+        # with changes since its last rewrite appended to the log next to it
+        self.store = get_store(store)
+        self.repo = self.store.repository("requests") if self.store else None
+        self.log_path = os.path.splitext(file_path)[0] + ".log.jsonl"
+        self.log = AppendLog(self.log_path)
+        # how far into which snapshot and log file the queue reflects (JSON mode)
+        self._snapshot_version = None
+        self._log_ino = None
+        self._log_offset = 0
+        self._corrupt = False  # requests.json failed to parse: never compact over it
+        self.queue = IndexedQueue(key=lambda r: r.id)  # custom queue, indexed by request id (FIFO order)
+        self.scheduler = LazyPriorityQueue()  # same requests, ordered by priority
+        self.bin_requests = {}  # bin_id -> set of open (pending) request ids
+        # The registry shares one instance between Streamlit sessions (threads):
+        # every read or change of the queue, scheduler and bin_requests holds this
+        # lock, since refresh() replaces them and even peeking pops stale heap entries
+        self._lock = threading.RLock()
+        # stack-based history per category and the persistent request id counter,
+        # next to the requests file (data/ by default)
+        folder = os.path.dirname(file_path)
+        self.history = HistoryService(os.path.join(folder, "history.json"), store=self.store or False)
+        self.sequence = SequenceService(os.path.join(folder, "sequences.json"), store=self.store or False)
+
+        if bin_service is None:
+            from services.bin_service import BinService  # Local import to avoid circular dependency
+            bin_service = BinService(store=self.store or False)
+        self.bin_service = bin_service
+        self.bin_service.add_fill_listener(self._on_fill_changed)
+
+        self._version = None  # generation of the table the queue reflects (SQLite mode)
         self.load_requests()
 
-    def load_requests(self):
-        """Load requests from JSON file into the queue"""
-        if not os.path.exists(self.file_path):
-            return
-        try:
-            with open(self.file_path, "r") as f:
-                data = json.load(f)
-                for item in data:
-                    req = Request.from_dict(item)
-                    self.queue.enqueue(req)
-        except json.JSONDecodeError:
-            pass  # empty or corrupted file
+    # -------------------- SCHEDULING --------------------
+
+    def _base_priority(self, req):
+        """Time-independent part of a request's score"""
+        score = self.REQUEST_TYPE_PRIORITY.get(req.request_type, self.DEFAULT_TYPE_PRIORITY)
+        bin_obj = self.bin_service.get_bin_by_id(req.bin_id)
+        if bin_obj:
+            score += bin_obj.fill_level * self.FILL_WEIGHT
+        # every extra report on the same bin (coalesced or not) raises urgency
+        duplicates = self.bin_report_count(req.bin_id) - 1
+        score += max(duplicates, 0) * self.DUPLICATE_WEIGHT
+        return score
+
+    def _heap_priority(self, req):
+        # Aging adds AGING_PER_HOUR * (now - created) to every score. "now" is the
+        # same for all requests, so ordering by (base - rate * created) is equivalent
+        # and never has to be recomputed as time passes.
+        created_hours = req.time.timestamp() / 3600
+        return self._base_priority(req) - self.AGING_PER_HOUR * created_hours
+
+    def request_priority(self, req, now=None):
+        """Current score of a pending request (higher is served first)"""
+        now = now or datetime.now()
+        waited_hours = (now - req.time).total_seconds() / 3600
+        return self._base_priority(req) + self.AGING_PER_HOUR * waited_hours
+
+    def _schedule(self, req):
+        self.queue.enqueue(req)
+        self.bin_requests.setdefault(req.bin_id, set()).add(req.id)
+        self.scheduler.push(req.id, self._heap_priority(req), req)
+        self.reprioritize_bin(req.bin_id)
+
+    def _unschedule(self, request_id):
+        req = self.queue.remove(request_id)
+        if req is None:
+            return None
+        self.scheduler.remove(request_id)
+        ids = self.bin_requests.get(req.bin_id)
+        if ids is not None:
+            ids.discard(request_id)
+            if not ids:
+                del self.bin_requests[req.bin_id]
+        self.reprioritize_bin(req.bin_id)
+        return req
+
+    def open_requests_for_bin(self, bin_id):
+        """Pending requests that reference a bin"""
+        with self._lock:
+            return [self.queue.get(request_id) for request_id in self.bin_requests.get(bin_id, ())]
+
+    def bin_report_count(self, bin_id):
+        """Total number of reports (including coalesced duplicates) open on a bin"""
+        return sum(req.count for req in self.open_requests_for_bin(bin_id))
+
+    def reprioritize_bin(self, bin_id):
+        """Recompute the priority of every pending request on a bin"""
+        with self._lock:
+            for request_id in self.bin_requests.get(bin_id, ()):
+                req = self.queue.get(request_id)
+                self.scheduler.update(request_id, self._heap_priority(req))
+
+    def _on_fill_changed(self, bin_obj, old_level, timestamp=None):
+        self.reprioritize_bin(bin_obj.id)
+
+    def next_request(self):
+        """Highest-priority pending request (None if the queue is empty)"""
+        with self._lock:
+            return self.scheduler.peek()
+
+    def next_batch(self, n):
+        """Top-n pending requests in priority order, without removing them"""
+        with self._lock:
+            return self.scheduler.peek_k(n)
+
+    def process_next(self):
+        """Process the highest-priority pending request and return it"""
+        with self._lock:
+            req = self.next_request()
+            if req is None:
+                return None
+            self.process_request(req.id)
+            return req
+
+    def version(self):
+        """Changes whenever the stored requests do: the snapshot and log versions or the table's generation"""
+        if self.store is not None:
+            return self.store.generation("requests")
+        return file_version(self.file_path), file_version(self.log_path)
+
+    def refresh(self):
+        """
+        Catch up with requests other processes changed. A no-op costing a
+        couple of stat calls (or one query) when nothing changed; new log
+        records (or the rows changed since the table generation we hold)
+        are applied as deltas, and only a rewritten snapshot forces a full
+        reload. Returns True if anything changed.
+        """
+        with self._lock:
+            if self.repo is not None:
+                generation = self.version()
+                if generation == self._version:
+                    return False
+                if generation < self._version:
+                    return self._reload()  # a different (or recreated) database
+                self._version, changes = self.repo.changed_since(self._version)
+                changed = False
+                for request_id, data in changes.items():
+                    if data is None or data.get("status") != "pending":
+                        changed = self._unschedule(request_id) is not None or changed
+                    else:
+                        changed = self._apply_record({"op": "put", "request": data}) or changed
+                return changed
+            return self._catch_up()
+
+    def _catch_up(self, locked=False):
+        if file_version(self.file_path) != self._snapshot_version:
+            return self._reload(locked)
+        live = file_version(self.log_path)
+        if live is None or (live[0] == self._log_ino and live[2] == self._log_offset):
+            return False
+        if live[0] != self._log_ino:
+            if self._log_offset:
+                return self._reload(locked)  # the log we were reading was rotated away
+            self._log_ino = live[0]
+        entries, self._log_offset = AppendLog.read_from(self.log_path, self._log_offset)
+        changed = False
+        for entry in entries:
+            changed = self._apply_record(entry) or changed
+        return changed
+
+    def _reload(self, locked=False):
+        self.queue = IndexedQueue(key=lambda r: r.id)
+        self.scheduler = LazyPriorityQueue()
+        self.bin_requests = {}
+        self.load_requests(locked)
+        return True
+
+    def close(self):
+        """Stop following the bin service's fill changes and close the request log"""
+        self.bin_service.remove_fill_listener(self._on_fill_changed)
+        self.log.close()
+
+    def load_requests(self, locked=False):
+        """Load the pending requests (requests.json plus its log, or the table) into the queue"""
+        with self._lock:
+            if self.repo is not None:
+                self._version = self.version()
+                for item in self.repo.find(status="pending"):
+                    self._schedule(Request.from_dict(item))
+                return
+            if not locked:
+                # a compaction in another process holds this lock while it moves the log aside
+                with file_lock(self.file_path, shared=True):
+                    return self.load_requests(locked=True)
+            max_id = 0
+            for item in self._read_records().values():
+                req = Request.from_dict(item)
+                self._schedule(req)
+                if req.id is not None and req.id > max_id:
+                    max_id = req.id
+            # ids already on disk must never be handed out again
+            self.sequence.ensure_at_least("request", max_id)
+
+    def _read_records(self):
+        """
+        Pending requests on disk as {id: dict}: the snapshot with the log
+        replayed on top. Callers hold the snapshot's lock (shared, or
+        exclusive in compact()), so the file is read without asking for it again.
+        """
+        self._snapshot_version = file_version(self.file_path)
+        self._corrupt = False
+        data = []
+        if self._snapshot_version is not None:
+            try:
+                with open(self.file_path, "r") as f:
+                    raw = f.read()
+                data = json.loads(raw) if raw.strip() else []
+            except json.JSONDecodeError:
+                self._corrupt = True  # run on the log alone until it is repaired
+        records = {item["id"]: item for item in data}
+        # a log left behind by an interrupted compaction comes before the live one
+        for entry in AppendLog.read(self.log_path + ".old"):
+            self._replay(records, entry)
+        live = file_version(self.log_path)
+        entries, self._log_offset = AppendLog.read_from(self.log_path)
+        self._log_ino = live[0] if live else None
+        for entry in entries:
+            self._replay(records, entry)
+        self.log.entries = len(entries)
+        return records
+
+    @staticmethod
+    def _replay(records, entry):
+        if entry.get("op") == "put":
+            records[entry["request"]["id"]] = entry["request"]
+        elif entry.get("op") == "del":
+            records.pop(entry["id"], None)
+
+    def _apply_record(self, entry):
+        """Apply one log record to the queue only (no log write, no history)"""
+        if entry.get("op") == "del":
+            return self._unschedule(entry["id"]) is not None
+        if entry.get("op") != "put":
+            return False
+        fresh = Request.from_dict(entry["request"])
+        req = self.queue.get(fresh.id)
+        if req is None:
+            self._schedule(fresh)
+            return True
+        if req.to_dict() == fresh.to_dict():
+            return False  # e.g. our own record, read back after someone else's
+        # update in place, so the request keeps its place in the FIFO order
+        for key, value in vars(fresh).items():
+            setattr(req, key, value)
+        self.reprioritize_bin(req.bin_id)
+        return True
 
     def save_requests(self):
-        """Save all requests to JSON"""
-        data = [req.to_dict() for req in self.queue.items]  # assuming Queue has .items
-        with open(self.file_path, "w") as f:
-            json.dump(data, f, indent=4)
+        """Write every pending request to a fresh requests.json snapshot"""
+        self.compact()
+
+    def compact(self):
+        """
+        Write the pending requests to a new requests.json snapshot (temp file
+        + atomic rename) and drop the log records it now covers.
+        """
+        with self._lock:
+            if self.repo is not None:
+                return  # every change is already in the database
+            old_log = self.log_path + ".old"
+            # one compaction at a time across processes; readers wait for it too
+            with file_lock(self.file_path):
+                with self.log.locked():
+                    # fold in what other processes appended, then capture the
+                    # queue and cut the log at the same point
+                    self._catch_up(locked=True)
+                    if self._corrupt:
+                        raise CorruptSnapshot(f"{self.file_path} could not be parsed; repair or remove it "
+                                              f"before it is compacted over (the queue comes from the log alone)")
+                    data = [req.to_dict() for req in self.queue]
+                    self.log.rotate(old_log)
+                    self._log_ino, self._log_offset = None, 0
+                atomic_write_json(self.file_path, data)
+                self._snapshot_version = file_version(self.file_path)
+                if os.path.exists(old_log):
+                    os.remove(old_log)
+
+    def _persist(self, changed=(), deleted=()):
+        """
+        Store changed requests: point writes with SQLite, else one appended
+        log record per request (the full state of a pending one, a delete for
+        one that left the queue), so a change costs O(1) bytes, not a rewrite.
+        """
+        if self.repo is None:
+            records = [{"op": "put", "request": req.to_dict()} if req.status == "pending"
+                       else {"op": "del", "id": req.id} for req in changed]
+            records += [{"op": "del", "id": request_id} for request_id in deleted]
+            if records:
+                self._skip_own(self.log.append_many(records))
+                if self.log.entries >= self.COMPACT_EVERY and not self._corrupt:
+                    self.compact()
+            return
+        generation = self.repo.write([("put", req.to_dict()) for req in changed] + [("del", i) for i in deleted])
+        if generation == self._version + 1:
+            self._version = generation  # nobody else wrote in between
+
+    def _skip_own(self, written):
+        """Move the refresh offset past our own append if nobody else appended before it"""
+        ino, end, size = written
+        if self._log_ino in (None, ino) and end - size == self._log_offset:
+            self._log_ino, self._log_offset = ino, end
 
     def _get_next_id(self):
-        """Generate next request ID"""
-        if not self.queue.items:
-            return 1
-        max_id = max((r.id for r in self.queue.items if r.id is not None), default=0)
-        return max_id + 1
+        """Generate next request ID from the persistent sequence"""
+        return self.sequence.next_id("request")
 
     def add_request(self, user, bin_id, request_type):
-        """Add a new request"""
-        new_id = self._get_next_id()
-        req = Request(user=user, bin_id=bin_id, request_type=request_type, id=new_id, status="pending")
-        self.queue.enqueue(req)
-        self.save_requests()
-        # Push undo info with category
-        self.history.push_action("request", "add_request", req.to_dict())
+        """Add a new request, or coalesce it into an open one of the same type on the same bin"""
+        with self._lock:
+            for existing in self.open_requests_for_bin(bin_id):
+                if existing.request_type == request_type:
+                    return self._coalesce(existing, user)
+
+            new_id = self._get_next_id()
+            req = Request(user=user, bin_id=bin_id, request_type=request_type, id=new_id, status="pending")
+            self._schedule(req)
+            self._persist([req])
+            # Push undo info with category
+            self.history.push_action("request", "add_request", req.to_dict())
+            return req
+
+    def bulk_add(self, rows):
+        """
+        Add many reports (dicts with user, bin_id, request_type and optionally
+        time, and reporters and count for requests that already had several,
+        as export_requests writes them) with one save. Reports on a bin that
+        already has an open request of the same type are coalesced into it,
+        as add_request does; new requests take their ids from the sequence in
+        chunks. Bulk imports are not recorded in the undo history. Returns the
+        number of new requests.
+        """
+        with self._lock:
+            touched = {}  # request id -> request, for existing requests that got extra reports
+            new = {}  # (bin_id, request_type) -> report dict collecting its duplicates
+
+            def fresh_reports():
+                for row in rows:
+                    key = (row["bin_id"], row["request_type"])
+                    reporters = list(row.get("reporters") or [row["user"]])
+                    count = row.get("count") or len(reporters)
+                    existing = next((r for r in self.open_requests_for_bin(key[0]) if r.request_type == key[1]), None)
+                    if existing is not None:
+                        existing.reporters.extend(reporters)
+                        existing.count += count
+                        touched[existing.id] = existing
+                    elif key in new:
+                        new[key]["reporters"].extend(reporters)
+                        new[key]["count"] += count
+                    else:
+                        new[key] = {**row, "reporters": reporters, "count": count}
+                        yield new[key]
+
+            added = []
+            for request_id, row in self.sequence.assign("request", fresh_reports()):
+                time = row.get("time")
+                added.append((Request(user=row["user"], bin_id=row["bin_id"], request_type=row["request_type"],
+                                      id=request_id, status="pending",
+                                      time=datetime.fromisoformat(time) if isinstance(time, str) else time,
+                                      reporters=row["reporters"]), row))
+            for req, row in added:
+                req.count = row["count"]  # duplicates may have arrived after its id was issued
+                self._schedule(req)
+            added = [req for req, _ in added]
+            for req in touched.values():
+                self.reprioritize_bin(req.bin_id)
+            if added or touched:
+                self._persist(added + list(touched.values()))
+            return len(added)
+
+    def _coalesce(self, req, user):
+        """Record another report on an open request instead of queueing a duplicate"""
+        req.reporters.append(user)
+        req.count += 1
+        self.reprioritize_bin(req.bin_id)
+        self._persist([req])
+        self.history.push_action("request", "coalesce_request", {
+            "id": req.id,
+            "user": user,
+            "bin_id": req.bin_id,
+            "request_type": req.request_type,
+            "count": req.count,
+            "time": datetime.now().isoformat()
+        })
         return req
 
+    def _enrich(self, request_data, bin_obj):
+        """Add bin details to a processed request record"""
+        if bin_obj:
+            request_data["bin_location"] = bin_obj.location
+            request_data["bin_type"] = bin_obj.bin_type
+            request_data["bin_x"] = bin_obj.x
+            request_data["bin_y"] = bin_obj.y
+        return request_data
+
     def process_request(self, request_id):
         """Process a request - removes it from queue and logs to history"""
-        from services.bin_service import BinService  # Local import to avoid circular dependency
-        bin_service = BinService()
+        with self._lock:
+            req = self._unschedule(request_id)
+            if req is None:
+                return False
+
+            # Store request data after removing
+            req.status = "processed"
+            request_data = req.to_dict()
 
-        for req in self.queue.items:
-            if req.id == request_id:
-                # Store request data before removing
+            # Enrich with bin details
+            self._enrich(request_data, self.bin_service.get_bin_by_id(req.bin_id))
+
+            self._persist([req])
+
+            # Log to history
+            self.history.push_action("request", "process_request", request_data)
+            return True
+
+    def process_bin(self, bin_id):
+        """Close every open request on a bin with a single save and history entry"""
+        with self._lock:
+            request_ids = list(self.bin_requests.get(bin_id, ()))
+            if not request_ids:
+                return 0
+
+            bin_obj = self.bin_service.get_bin_by_id(bin_id)
+            closed = []
+            processed = []
+            for request_id in request_ids:
+                req = self._unschedule(request_id)
                 req.status = "processed"
-                request_data = req.to_dict()
-                
-                # Enrich with bin details
-                bin_obj = bin_service.get_bin_by_id(req.bin_id)
-                if bin_obj:
-                    request_data["bin_location"] = bin_obj.location
-                    request_data["bin_type"] = bin_obj.bin_type
-                    request_data["bin_x"] = bin_obj.x
-                    request_data["bin_y"] = bin_obj.y
-                
-                # Remove from queue
-                self.queue.items = [r for r in self.queue.items if r.id != request_id]
-                self.save_requests()
-                
-                # Log to history
-                self.history.push_action("request", "process_request", request_data)
-                return True
-        return False
+                closed.append(req)
+                processed.append(self._enrich(req.to_dict(), bin_obj))
+            self._persist(closed)
+
+            self.history.push_action("request", "process_bin", {
+                "bin_id": bin_id,
+                "requests": processed
+            })
+            return len(processed)
 
     def cancel_request(self, request_id):
         """Cancel a request - removes it from queue and logs to history"""
-        for req in self.queue.items:
-            if req.id == request_id:
-                # Store request data before removing
-                req.status = "cancelled"
-                request_data = req.to_dict()
-                
-                # Remove from queue
-                self.queue.items = [r for r in self.queue.items if r.id != request_id]
-                self.save_requests()
-                
-                # Log to history
-                self.history.push_action("request", "cancel_request", request_data)
-                return True
-        return False
+        with self._lock:
+            req = self._unschedule(request_id)
+            if req is None:
+                return False
+
+            req.status = "cancelled"
+            request_data = req.to_dict()
+            self._persist([req])
+
+            # Log to history
+            self.history.push_action("request", "cancel_request", request_data)
+            return True
 
     def undo_last(self):
         """Undo last request action"""
-        last_action = self.history.pop_action("request")
-        if not last_action:
-            return False
+        with self._lock:
+            last_action = self.history.pop_action("request")
+            if not last_action:
+                return False
 
-        action_type = last_action["type"]
-        data = last_action["data"]
+            action_type = last_action["type"]
+            data = last_action["data"]
 
-        if action_type == "add_request":
-            # Remove the request from the queue
-            request_id = data["id"]
-            self.queue.items = [r for r in self.queue.items if r.id != request_id]
-            self.save_requests()
-            return True
+            if action_type == "add_request":
+                # Remove the request from the queue
+                self._unschedule(data["id"])
+                self._persist(deleted=[data["id"]])
+                return True
 
-        elif action_type == "process_request":
-            # Restore request back to queue with pending status
-            data["status"] = "pending"
-            req = Request.from_dict(data)
-            self.queue.enqueue(req)
-            self.save_requests()
-            return True
+            elif action_type == "process_request":
+                # Restore request back to queue with pending status
+                data["status"] = "pending"
+                req = Request.from_dict(data)
+                self._schedule(req)
+                self._persist([req])
+                return True
 
-        elif action_type == "cancel_request":
-            # Restore request back to queue with pending status
-            data["status"] = "pending"
-            req = Request.from_dict(data)
-            self.queue.enqueue(req)
-            self.save_requests()
-            return True
+            elif action_type == "cancel_request":
+                # Restore request back to queue with pending status
+                data["status"] = "pending"
+                req = Request.from_dict(data)
+                self._schedule(req)
+                self._persist([req])
+                return True
+
+            elif action_type == "process_bin":
+                # Restore every request closed for the bin
+                restored = []
+                for item in data["requests"]:
+                    item["status"] = "pending"
+                    restored.append(Request.from_dict(item))
+                    self._schedule(restored[-1])
+                self._persist(restored)
+                return True
 
-        return False
+            elif action_type == "coalesce_request":
+                # Drop the extra report from the request it was merged into
+                req = self.queue.get(data["id"])
+                if req is not None:
+                    req.count -= 1
+                    if data["user"] in req.reporters:
+                        # remove the most recent occurrence of this reporter
+                        idx = len(req.reporters) - 1 - req.reporters[::-1].index(data["user"])
+                        del req.reporters[idx]
+                    self.reprioritize_bin(req.bin_id)
+                    self._persist([req])
+                return True
+
+            return False
 
     def get_all_requests(self):
         """Return list of all requests"""
-        return list(self.queue.items)
+        with self._lock:
+            return list(self.queue)
 
     def get_request_by_id(self, request_id):
         """Get a specific request by ID"""
-        for req in self.queue.items:
-            if req.id == request_id:
-                return req
-        return None
+        with self._lock:
+            return self.queue.get(request_id)
 
     def get_requests_by_status(self, status):
         """Get all requests with a specific status"""
-        return [req for req in self.queue.items if req.status == status]
-
+        with self._lock:
+            return [req for req in self.queue if req.status == status]
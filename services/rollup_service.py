@@ -0,0 +1,324 @@
+# services/rollup_service.py
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from services.history_service import DEFAULT_CATEGORIES, HistoryService
+from services.storage import atomic_write_json, read_json
+
+EPOCH = datetime(1970, 1, 1)
+HOUR = timedelta(hours=1)
+DIMENSIONS = ("category", "action_type", "bin_type", "facility")
+MEASURES = ("actions", "items", "co2")
+
+
+def _hour(timestamp):
+    """Hours since the epoch of an ISO timestamp (None if missing or unreadable)"""
+    if not timestamp:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(timestamp))
+    except ValueError:
+        return None
+    return (dt.replace(tzinfo=None) - EPOCH) // HOUR
+
+
+class HistoryRollup:
+    """
+    Pre-aggregated history for dashboards: per hour and per day, counts and
+    sums keyed by (category, action type, bin type, facility).
+
+    Every action becomes one or more facts (a process_bin action one per
+    request it closed, so each carries its own bin type and facility) with
+    three measures:
+
+        actions  how many history actions (counted in the action's first fact)
+        items    requests, bins or vehicles the action touched
+        co2      kg CO2 attributed to processed requests (see ReportService)
+
+    A query over any time range adds up whole days from the day cells and
+    the partial days at either end from the hour cells, so it costs
+    O(buckets in range), not O(history).
+
+    The cells follow the history as it is now: an undone action is taken
+    out again. Actions pushed through the HistoryService given here arrive
+    through its listener. Anything other services append is found by
+    refresh(), which reads only the actions past each category's high-water
+    mark (how many actions are folded in, and a fingerprint of the newest),
+    and rebuilds a category only if its history no longer continues from
+    there. The cells and marks are saved to `path` every SAVE_INTERVAL
+    seconds and on close().
+    """
+
+    SAVE_INTERVAL = 30
+
+    def __init__(self, history_service=None, path="data/history_rollup.json", categories=DEFAULT_CATEGORIES):
+        self.history = history_service or HistoryService()
+        self.path = path
+        self.categories = tuple(categories)
+        self.hours = {}  # hour since epoch -> {dims: [actions, items, co2]}
+        self.days = {}  # day since epoch -> {dims: [actions, items, co2]}
+        self.undated = {}  # actions without a readable time: {dims: [actions, items, co2]}
+        self.marks = {}  # category -> [actions folded in, fingerprint of the newest]
+        self._pushed = []  # (category, action) heard from the listener, folded in by refresh()
+        # held by every read and change of the cells: the registry shares one
+        # rollup between Streamlit sessions, and listeners fire from any of them
+        self._lock = threading.RLock()
+        self._history_version = None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._load()
+        self.refresh()
+        self.history.add_listener(self._on_history)
+
+    def close(self):
+        self.history.remove_listener(self._on_history)
+        self.save()
+
+    # -------------------- FACTS --------------------
+
+    @staticmethod
+    def _facts(category, action):
+        """(hour, dims, items, co2) for each fact of one action"""
+        data = action.get("data") or {}
+        action_type = action.get("type")
+        # actions recorded before they were timestamped fall back to the request's time
+        hour = _hour(action.get("time") or (data.get("time") if category == "request" else None))
+
+        if action_type == "process_bin":
+            records = data.get("requests") or [{}]
+        elif category == "dispatch":
+            return [(hour, (category, action_type, None, None), len(data.get("bins", [])), 0.0)]
+        else:
+            records = [data]
+
+        facts = []
+        for record in records:
+            co2 = record.get("co2") or {}
+            facts.append((hour, (category, action_type, record.get("bin_type"), co2.get("facility")),
+                          1, co2.get("kg", 0.0)))
+        return facts
+
+    def _apply(self, category, action, sign):
+        for i, (hour, dims, items, co2) in enumerate(self._facts(category, action)):
+            counted = sign if i == 0 else 0
+            if hour is None:
+                tables = [self.undated]
+            else:
+                tables = [self.hours.setdefault(hour, {}), self.days.setdefault(hour // 24, {})]
+            for table in tables:
+                cell = table.get(dims)
+                if cell is None:
+                    cell = table[dims] = [0, 0, 0.0]
+                cell[0] += counted
+                cell[1] += sign * items
+                cell[2] += sign * co2
+                if cell[0] == 0 and cell[1] == 0:
+                    del table[dims]
+            if hour is not None:
+                for buckets, key in ((self.hours, hour), (self.days, hour // 24)):
+                    if key in buckets and not buckets[key]:
+                        del buckets[key]
+        self._dirty = True
+
+    @staticmethod
+    def _fingerprint(action):
+        if action is None:
+            return None
+        return hashlib.sha1(json.dumps(action, sort_keys=True).encode()).hexdigest()
+
+    # -------------------- KEEPING UP --------------------
+
+    def _on_history(self, category, action, undone):
+        with self._lock:
+            if category not in self.categories:
+                return
+            if not undone:
+                # pushes are heard before they are written, and other listeners may
+                # still add to them (ReportService's co2): fold them in on refresh()
+                self._pushed.append((category, action))
+                return
+            for i in range(len(self._pushed) - 1, -1, -1):
+                if self._pushed[i][1] is action:
+                    del self._pushed[i]  # undone before it was ever folded in
+                    return
+            self._apply(category, action, -1)
+            count, _ = self.marks.get(category, [0, None])
+            self.marks[category] = [count - 1, self._fingerprint(self.history.peek_last(category))]
+
+    def refresh(self):
+        """Fold in what other services appended (or undid) since the last call. Returns True if anything changed."""
+        with self._lock:
+            changed = bool(self._pushed)
+            pushed, self._pushed = self._pushed, []
+            for category, action in pushed:
+                self._apply(category, action, 1)
+                count, _ = self.marks.get(category, [0, None])
+                self.marks[category] = [count + 1, self._fingerprint(action)]
+
+            version = self.history.version()
+            if version == self._history_version:
+                return changed
+            for category in self.categories:
+                count, fingerprint = self.marks.get(category, [0, None])
+                if (self.history.count(category), self._fingerprint(self.history.peek_last(category))) == (count, fingerprint):
+                    continue
+                changed = True
+                if count:
+                    # read from the newest action folded in: if it is still there, the
+                    # history continues from the mark and only what follows is new
+                    tail = self.history.actions_since(category, count - 1)
+                    if not tail or self._fingerprint(tail[0]) != fingerprint:
+                        self._rebuild(category)
+                        continue
+                    new = tail[1:]
+                else:
+                    new = self.history.actions_since(category, 0)
+                for action in new:
+                    self._apply(category, action, 1)
+                self.marks[category] = [count + len(new), self._fingerprint(new[-1]) if new else fingerprint]
+            self._history_version = version
+            if self._dirty and time.monotonic() - self._saved_at >= self.SAVE_INTERVAL:
+                self.save()
+            return changed
+
+    def _rebuild(self, category):
+        """Drop a category's cells and fold its whole history in again"""
+        for table in [self.undated] + list(self.hours.values()) + list(self.days.values()):
+            for dims in [dims for dims in table if dims[0] == category]:
+                del table[dims]
+        for buckets in (self.hours, self.days):
+            for key in [key for key, table in buckets.items() if not table]:
+                del buckets[key]
+        actions = self.history.actions_since(category, 0)
+        for action in actions:
+            self._apply(category, action, 1)
+        self.marks[category] = [len(actions), self._fingerprint(actions[-1] if actions else None)]
+        self._dirty = True
+
+    # -------------------- PERSISTENCE --------------------
+
+    def _load(self):
+        try:
+            saved, _ = read_json(self.path, {})
+        except json.JSONDecodeError:
+            return  # everything is rebuilt from the history
+        if not saved:
+            return
+
+        def cells(rows):
+            return {tuple(row[:4]): row[4:] for row in rows}
+
+        self.hours = {int(hour): cells(rows) for hour, rows in saved.get("hours", {}).items()}
+        self.days = {int(day): cells(rows) for day, rows in saved.get("days", {}).items()}
+        self.undated = cells(saved.get("undated", []))
+        self.marks = saved.get("marks", {})
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+
+            def rows(table):
+                return [list(dims) + cell for dims, cell in table.items()]
+
+            atomic_write_json(self.path, {
+                "marks": self.marks,
+                "hours": {str(hour): rows(table) for hour, table in self.hours.items()},
+                "days": {str(day): rows(table) for day, table in self.days.items()},
+                "undated": rows(self.undated),
+            }, indent=None)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    # -------------------- QUERIES --------------------
+
+    @staticmethod
+    def _matches(dims, filters):
+        return all(dims[DIMENSIONS.index(name)] == value for name, value in filters.items())
+
+    def _cells_between(self, start, end):
+        """(bucket start hour, cells) covering [start, end) hours: whole days where possible, hours at the edges"""
+        hours, days = self.hours, self.days
+        first_day, last_day = -(-start // 24), end // 24  # whole days inside the range
+        if first_day >= last_day:
+            return [(hour, hours[hour]) for hour in sorted(hours) if start <= hour < end]
+
+        def span(lo, hi, buckets, scale):
+            # walk the stored buckets or the range, whichever is shorter
+            if hi - lo <= len(buckets):
+                return [(key * scale, buckets[key]) for key in range(lo, hi) if key in buckets]
+            return [(key * scale, buckets[key]) for key in sorted(buckets) if lo <= key < hi]
+
+        return (span(start, first_day * 24, hours, 1)
+                + span(first_day, last_day, days, 24)
+                + span(last_day * 24, end, hours, 1))
+
+    def query(self, start=None, end=None, by=None, **filters):
+        """
+        Measures of the facts from start to end (datetimes, to the hour: the
+        hours holding start and end are included; None leaves that side
+        open, and a range open on both sides also counts undated actions),
+        restricted to the given dimension values (category=, action_type=,
+        bin_type=, facility=).
+
+        by=None returns one {"actions", "items", "co2"} dict; by="hour" or
+        by="day" returns {bucket start datetime: dict} for the non-empty
+        buckets, in time order.
+        """
+        with self._lock:
+            self.refresh()
+            unknown = set(filters) - set(DIMENSIONS)
+            if unknown:
+                raise ValueError(f"Unknown rollup dimension: {', '.join(sorted(unknown))}")
+            if by not in (None, "hour", "day"):
+                raise ValueError("by must be None, 'hour' or 'day'")
+
+            stored = list(self.hours) or [0]
+            lo = (start - EPOCH) // HOUR if start is not None else min(stored)
+            hi = -(-(end - EPOCH) // HOUR) if end is not None else max(stored) + 1
+            if by == "hour":
+                cells = [(hour, self.hours[hour]) for hour in sorted(self.hours) if lo <= hour < hi]
+            else:
+                cells = self._cells_between(lo, hi)
+
+            series = {}
+            for hour, table in cells:
+                bucket = hour if by == "hour" else hour // 24 * 24
+                for dims, cell in table.items():
+                    if self._matches(dims, filters):
+                        total = series.setdefault(bucket, [0, 0, 0.0])
+                        total[0] += cell[0]
+                        total[1] += cell[1]
+                        total[2] += cell[2]
+            if by is None:
+                total = [0, 0, 0.0]
+                for cell in series.values():
+                    total = [a + b for a, b in zip(total, cell)]
+                if start is None and end is None:
+                    for dims, cell in self.undated.items():
+                        if self._matches(dims, filters):
+                            total = [a + b for a, b in zip(total, cell)]
+                return dict(zip(MEASURES, total))
+            return {EPOCH + hour * HOUR: dict(zip(MEASURES, cell)) for hour, cell in sorted(series.items())}
+
+    def values(self, dimension, **filters):
+        """Distinct values of one dimension (e.g. for filter dropdowns), None excluded"""
+        with self._lock:
+            self.refresh()
+            index = DIMENSIONS.index(dimension)
+            found = set()
+            for table in list(self.days.values()) + [self.undated]:
+                for dims in table:
+                    if dims[index] is not None and self._matches(dims, filters):
+                        found.add(dims[index])
+            return sorted(found, key=str)
+
+    def time_range(self):
+        """(first, last) hour bucket holding any dated action, as datetimes ((None, None) if there is none)"""
+        with self._lock:
+            self.refresh()
+            if not self.hours:
+                return None, None
+            return EPOCH + min(self.hours) * HOUR, EPOCH + max(self.hours) * HOUR
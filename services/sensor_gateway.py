@@ -0,0 +1,245 @@
+# services/sensor_gateway.py
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from services.ingest_service import keep_newest, parse_reading, split_newest
+
+
+class GatewayStats:
+    """Counters of a running SensorGateway (see snapshot())"""
+
+    RATE_WINDOW = 10.0  # seconds of batches the current throughput is measured over
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.connections = 0  # open right now
+        self.connections_total = 0
+        self.received = 0  # valid readings accepted from clients
+        self.invalid = 0  # lines that were not valid readings
+        self.applied = 0  # readings folded into a written batch
+        self.unknown = 0  # coalesced readings for bins that do not exist
+        self.batches = 0
+        self.changed = 0  # bin fill levels actually changed
+        self.max_queue_depth = 0
+        self.last_batch_latency = 0.0  # oldest reading in the batch -> batch written, in seconds
+        self.max_batch_latency = 0.0
+        self._latency_total = 0.0
+        self._recent = deque()  # (written at, readings) of the batches inside RATE_WINDOW
+
+    def record_batch(self, readings, unknown, changed, latency):
+        now = time.monotonic()
+        self.batches += 1
+        self.applied += readings
+        self.unknown += unknown
+        self.changed += changed
+        self.last_batch_latency = latency
+        self.max_batch_latency = max(self.max_batch_latency, latency)
+        self._latency_total += latency
+        self._recent.append((now, readings))
+        while self._recent and now - self._recent[0][0] > self.RATE_WINDOW:
+            self._recent.popleft()
+
+    def snapshot(self, queue_depth=0):
+        """The counters as a JSON-serialisable dict; rates are readings per second"""
+        now = time.monotonic()
+        while self._recent and now - self._recent[0][0] > self.RATE_WINDOW:
+            self._recent.popleft()
+        uptime = now - self.started
+        return {
+            "uptime": round(uptime, 3),
+            "connections": self.connections,
+            "connections_total": self.connections_total,
+            "received": self.received,
+            "invalid": self.invalid,
+            "applied": self.applied,
+            "unknown": self.unknown,
+            "batches": self.batches,
+            "changed": self.changed,
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "throughput": round(sum(n for _, n in self._recent) / min(self.RATE_WINDOW, uptime or 1), 1),
+            "throughput_total": round(self.applied / uptime, 1) if uptime else 0.0,
+            "last_batch_latency_ms": round(self.last_batch_latency * 1000, 3),
+            "avg_batch_latency_ms": round(self._latency_total / self.batches * 1000, 3) if self.batches else 0.0,
+            "max_batch_latency_ms": round(self.max_batch_latency * 1000, 3),
+        }
+
+
+class SensorGateway:
+    """
+    asyncio server taking line-delimited JSON sensor readings
+    ({"bin_id": 3, "fill_level": 42.5, "timestamp": ...}) from many clients
+    over TCP or a Unix socket.
+
+    Every connection feeds one bounded queue; when the queue is full the
+    connection stops being read until the writer catches up, so a burst
+    slows the senders instead of growing memory. A single writer task
+    drains the queue, coalesces the newest reading per bin and writes a
+    batch every `flush_interval` seconds or `batch_size` readings with
+    BinService.apply_fill_levels() (in a worker thread, so the event loop
+    keeps accepting). The Streamlit app picks the changes up through its
+    own BinService.refresh().
+
+    A client sending {"cmd": "stats"} gets the counters back as one JSON line.
+    """
+
+    def __init__(self, bin_service, batch_size=5000, flush_interval=0.05, queue_size=20000):
+        self.bin_service = bin_service
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = GatewayStats()
+        self._server = None
+        self._writer_task = None
+        self._clients = {}  # connection handler task -> its StreamWriter
+
+    # -------------------- SERVER --------------------
+
+    async def start(self, host="127.0.0.1", port=8765, path=None):
+        """Listen on a Unix socket if path is given, otherwise on host:port"""
+        if path is not None:
+            if os.path.exists(path):
+                os.remove(path)  # left behind by a gateway that did not shut down
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        self._writer_task = asyncio.create_task(self._writer())
+        return self._server
+
+    async def serve_forever(self, **address):
+        await self.start(**address)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stop accepting, disconnect the clients, write out everything still queued, then stop the writer"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in self._clients.values():
+            writer.close()  # their handlers read EOF and return
+        if self._clients:
+            await asyncio.gather(*self._clients, return_exceptions=True)
+        if self._writer_task is not None:
+            await self.queue.join()
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+
+    def snapshot(self):
+        return self.stats.snapshot(self.queue.qsize())
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        self.stats.connections += 1
+        self.stats.connections_total += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    self.stats.invalid += 1
+                    continue
+                if isinstance(row, dict) and row.get("cmd") == "stats":
+                    writer.write(json.dumps(self.snapshot()).encode() + b"\n")
+                    await writer.drain()
+                    continue
+                reading = parse_reading(row) if isinstance(row, dict) else None
+                if reading is None:
+                    self.stats.invalid += 1
+                    continue
+                # blocks this connection (only) while the queue is full
+                await self.queue.put((reading, time.monotonic()))
+                self.stats.received += 1
+                if self.queue.qsize() > self.stats.max_queue_depth:
+                    self.stats.max_queue_depth = self.queue.qsize()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.stats.connections -= 1
+            self._clients.pop(task, None)
+            writer.close()
+
+    # -------------------- WRITER --------------------
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            reading, oldest = await self.queue.get()
+            latest = {}  # bin_id -> (timestamp, level)
+            keep_newest(latest, reading)
+            count = 1
+            deadline = time.monotonic() + self.flush_interval
+            while count < self.batch_size:
+                try:
+                    reading, _ = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        reading, _ = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                keep_newest(latest, reading)
+                count += 1
+
+            try:
+                unknown, changed = await loop.run_in_executor(None, self._apply, latest)
+                self.stats.record_batch(count, unknown, changed, time.monotonic() - oldest)
+            except Exception as e:
+                # keep serving; the readings of this batch are lost
+                print(f"sensor gateway: batch of {count} readings failed: {e}", file=sys.stderr)
+            finally:
+                for _ in range(count):
+                    self.queue.task_done()
+
+    def _apply(self, latest):
+        """Write one coalesced batch (worker thread). Returns (unknown bins, bins changed)"""
+        self.bin_service.refresh()  # other processes may have changed the bins
+        levels, timestamps = split_newest(latest)
+        unknown = [bin_id for bin_id in levels if bin_id not in self.bin_service.by_id]
+        for bin_id in unknown:
+            del levels[bin_id]
+        return len(unknown), self.bin_service.apply_fill_levels(levels, timestamps)
+
+
+if __name__ == "__main__":
+    # python -m services.sensor_gateway [port | unix socket path]
+    from services.bin_service import BinService
+    from services.fill_series_service import FillSeriesStore
+    from services.prediction_service import PredictionService
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "8765"
+    address = {"port": int(target)} if target.isdigit() else {"path": target}
+    bin_service = BinService()
+    # the readings' history and learned fill rates are kept here, with
+    # the times the readings were taken, whether or not the app is running
+    series = FillSeriesStore(bin_service)
+    predictions = PredictionService(bin_service, series=series)
+    gateway = SensorGateway(bin_service)
+    print(f"sensor gateway listening on {target}")
+    try:
+        asyncio.run(gateway.serve_forever(**address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        predictions.close()
+        series.close()
+        bin_service.close()
@@ -0,0 +1,87 @@
+# services/sequence_service.py
+import json
+import os
+from itertools import islice
+from services.sqlite_store import get_store
+from services.storage import read_json, update_json, write_json
+
+
+class SequenceService:
+    """Persistent, monotonically increasing id counters (one per entity name)."""
+
+    def __init__(self, file_path="data/sequences.json", store=None):
+        self.file_path = file_path
+        self.store = get_store(store)  # with SQLite the counters live in its sequences table
+        self.counters = {}
+        self.load_sequences()
+
+    def load_sequences(self):
+        """Load last issued ids from JSON"""
+        if self.store is not None or not os.path.exists(self.file_path):
+            return
+        try:
+            self.counters, _ = read_json(self.file_path, {})
+        except json.JSONDecodeError:
+            self.counters = {}
+
+    def save_sequences(self):
+        """Persist last issued ids to JSON"""
+        write_json(self.file_path, self.counters)
+
+    def _update(self, fn):
+        """Read-modify-write the counters under the file lock, so processes never issue the same id"""
+        self.counters, _ = update_json(self.file_path, lambda counters: fn(counters or {}), default={})
+
+    def ensure_at_least(self, name, value):
+        """Make sure the next id for `name` is greater than `value` (e.g. ids already on disk)"""
+        if self.store is not None:
+            if value is not None:
+                self.store.ensure_sequence_at_least(name, value)
+            return
+        if value is not None and value > self.counters.get(name, 0):
+            def raise_to(counters):
+                counters[name] = max(counters.get(name, 0), value)
+                return counters
+            self._update(raise_to)
+
+    def next_id(self, name):
+        """Issue the next id for `name`. Ids are never reused, even after removals."""
+        if self.store is not None:
+            return self.store.next_id(name)  # atomic across sessions
+        def increment(counters):
+            counters[name] = counters.get(name, 0) + 1
+            return counters
+        self._update(increment)
+        return self.counters[name]
+
+    def reserve(self, name, count):
+        """Issue `count` consecutive ids for `name` at once (bulk imports). Returns them as a range."""
+        if count <= 0:
+            return range(0)
+        if self.store is not None:
+            last = self.store.next_id(name, count)
+        else:
+            def advance(counters):
+                counters[name] = counters.get(name, 0) + count
+                return counters
+            self._update(advance)
+            last = self.counters[name]
+        return range(last - count + 1, last + 1)
+
+    def assign(self, name, items, chunk_size=10000):
+        """
+        Pair every item of a (possibly huge) iterable with a fresh id, as
+        (id, item), reserving the ids chunk_size at a time.
+        """
+        items = iter(items)
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                return
+            yield from zip(self.reserve(name, len(chunk)), chunk)
+
+    def current(self, name):
+        """Return the last id issued for `name` (0 if none)"""
+        if self.store is not None:
+            return self.store.current_id(name)
+        return self.counters.get(name, 0)
@@ -0,0 +1,423 @@
+# services/sqlite_store.py
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_DB = os.path.join(PROJECT_ROOT, "data", "greenbin.db")
+
+# Each table keeps the full record as JSON in `data`, plus copies of the
+# columns it is looked up or filtered by so SQLite can index them.
+TABLES = {
+    "bins": ("bin_type", "fill_level"),
+    "requests": ("bin_id", "status", "time"),
+    "facilities": ("type",),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bins (
+    id INTEGER PRIMARY KEY,
+    bin_type TEXT,
+    fill_level REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bins_bin_type ON bins(bin_type);
+CREATE INDEX IF NOT EXISTS idx_bins_fill_level ON bins(fill_level);
+
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    bin_id INTEGER,
+    status TEXT,
+    time TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_requests_status_time ON requests(status, time);
+CREATE INDEX IF NOT EXISTS idx_requests_bin_id ON requests(bin_id);
+
+CREATE TABLE IF NOT EXISTS facilities (
+    id INTEGER PRIMARY KEY,
+    type TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_facilities_type ON facilities(type);
+
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT NOT NULL,
+    action TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_category ON history(category, seq);
+
+-- bumped by every write to a table, so readers can tell whether to reload
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL
+);
+
+-- the generation at which each row of a table was last written or deleted,
+-- so a reader applies only the rows changed since the generation it holds
+CREATE TABLE IF NOT EXISTS changes (
+    name TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (name, id)
+);
+CREATE INDEX IF NOT EXISTS idx_changes_generation ON changes(name, generation);
+
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _dumps(record):
+    return json.dumps(record, separators=(",", ":"))
+
+
+class SqliteStore:
+    """
+    One SQLite database (WAL mode) shared by every service in the process.
+
+    Each thread gets its own connection, so several Streamlit sessions can
+    read while another one writes, and every write is its own transaction.
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at each WAL checkpoint, safe against corruption
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises"""
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn  # nested: part of the outer transaction
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def generation(self, name):
+        """How many writes `name` (a table) has seen; 0 if none"""
+        row = self.connection().execute("SELECT generation FROM versions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _bump(conn, name):
+        conn.execute(
+            "INSERT INTO versions(name, generation) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET generation = generation + 1",
+            (name,),
+        )
+        return conn.execute("SELECT generation FROM versions WHERE name = ?", (name,)).fetchone()[0]
+
+    def repository(self, table):
+        return SqliteRepository(self, table)
+
+    def history(self):
+        return SqliteHistoryRepository(self)
+
+    # -------------------- SEQUENCES --------------------
+
+    def next_id(self, name, count=1):
+        """Advance a sequence by `count` and return the last id issued"""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO sequences(name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, count),
+            )
+            return conn.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()[0]
+
+    def ensure_sequence_at_least(self, name, value):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO sequences(name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)",
+                (name, value),
+            )
+
+    def current_id(self, name):
+        row = self.connection().execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    # -------------------- IMPORT / EXPORT --------------------
+
+    def import_json(self, data_dir=os.path.join(PROJECT_ROOT, "data")):
+        """
+        Replace the database contents with the JSON data files (bins.json plus
+        its mutation log, requests.json and its log, facilities.json and the
+        history).
+        """
+        from services.bin_service import BinService
+        from services.history_service import HistoryService, DEFAULT_CATEGORIES
+        from services.request_service import RequestService
+        from services.storage import AppendLog
+
+        bins = BinService(file_path=os.path.join(data_dir, "bins.json"), store=False)
+        history = HistoryService(file_path=os.path.join(data_dir, "history.json"), store=False)
+        requests = {r["id"]: r for r in _read_json(os.path.join(data_dir, "requests.json"), [])}
+        for log in ("requests.log.jsonl.old", "requests.log.jsonl"):
+            for entry in AppendLog.read(os.path.join(data_dir, log)):
+                RequestService._replay(requests, entry)
+        requests = list(requests.values())
+        facilities = _read_json(os.path.join(data_dir, "facilities.json"), [])
+        categories = set(DEFAULT_CATEGORIES) | set(history.index)
+
+        with self.transaction():
+            self.repository("bins").replace_all([b.to_dict() for b in bins.get_all_bins()])
+            self.repository("requests").replace_all(requests)
+            self.repository("facilities").replace_all(facilities)
+            history_repo = self.history()
+            history_repo.clear()
+            for category in sorted(categories):
+                stack = history.get_stack(category)
+                history_repo.push_many([(category, action) for action in stack.to_list()])
+            max_request = max((r["id"] for r in requests if r.get("id") is not None), default=0)
+            self.ensure_sequence_at_least("request", max_request)
+            self.ensure_sequence_at_least("bin", max(bins.by_id, default=0))
+            self.ensure_sequence_at_least("facility", max((f["id"] for f in facilities), default=0))
+
+    def export_json(self, data_dir=os.path.join(PROJECT_ROOT, "data")):
+        """
+        Write the database out in the JSON file format: bins.json,
+        requests.json (pending requests, as the queue stores them),
+        facilities.json and a history.json with every category. The files
+        replace the JSON state in data_dir, so its bin and request mutation
+        logs and history segments are removed (history.json is re-imported
+        from).
+        """
+        import shutil
+        from services.storage import atomic_write_json
+
+        atomic_write_json(os.path.join(data_dir, "bins.json"), self.repository("bins").all(), one_per_line=True)
+        for log in ("bins.log.jsonl", "bins.log.jsonl.old", "requests.log.jsonl", "requests.log.jsonl.old"):
+            if os.path.exists(os.path.join(data_dir, log)):
+                os.remove(os.path.join(data_dir, log))
+        shutil.rmtree(os.path.join(data_dir, "history"), ignore_errors=True)
+        atomic_write_json(os.path.join(data_dir, "requests.json"),
+                          self.repository("requests").find(status="pending"))
+        atomic_write_json(os.path.join(data_dir, "facilities.json"), self.repository("facilities").all())
+        history_repo = self.history()
+        atomic_write_json(os.path.join(data_dir, "history.json"),
+                          {category: history_repo.actions(category) for category in history_repo.categories()})
+
+
+class SqliteRepository:
+    """Records of one table, addressed by id (the primary key)"""
+
+    def __init__(self, store, table):
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        self.store = store
+        self.table = table
+        self.columns = TABLES[table]
+
+    def _row(self, record):
+        return (record["id"],) + tuple(record.get(c) for c in self.columns) + (_dumps(record),)
+
+    def _upsert_sql(self):
+        cols = ("id",) + self.columns + ("data",)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in cols[1:])
+        return (f"INSERT INTO {self.table}({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}")
+
+    def get(self, record_id):
+        row = self.store.connection().execute(
+            f"SELECT data FROM {self.table} WHERE id = ?", (record_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self):
+        rows = self.store.connection().execute(f"SELECT data FROM {self.table} ORDER BY id")
+        return [json.loads(data) for (data,) in rows]
+
+    def find(self, order_by="id", **equals):
+        """Records whose indexed columns equal the given values, e.g. find(status="pending")"""
+        for column in list(equals) + [order_by]:
+            if column != "id" and column not in self.columns:
+                raise ValueError(f"{self.table}.{column} is not an indexed column")
+        where = " AND ".join(f"{c} = ?" for c in equals) or "1"
+        rows = self.store.connection().execute(
+            f"SELECT data FROM {self.table} WHERE {where} ORDER BY {order_by}, id", tuple(equals.values()))
+        return [json.loads(data) for (data,) in rows]
+
+    def put(self, record):
+        return self.put_many([record])
+
+    def put_many(self, records):
+        return self.write([("put", r) for r in records])
+
+    def delete(self, record_id):
+        return self.write([("del", record_id)])
+
+    def _track(self, conn, generation, ids):
+        """Record that the rows `ids` changed at `generation` (see changed_since)"""
+        conn.executemany(
+            "INSERT INTO changes(name, id, generation) VALUES (?, ?, ?) "
+            "ON CONFLICT(name, id) DO UPDATE SET generation = excluded.generation",
+            [(self.table, record_id, generation) for record_id in ids])
+
+    def write(self, ops):
+        """
+        Apply ("put", record) / ("del", id) operations, in order, in one
+        transaction. Returns the table's new generation.
+        """
+        with self.store.transaction() as conn:
+            generation = self.store._bump(conn, self.table)
+            for op, value in ops:
+                if op == "put":
+                    conn.execute(self._upsert_sql(), self._row(value))
+                elif op == "del":
+                    conn.execute(f"DELETE FROM {self.table} WHERE id = ?", (value,))
+            self._track(conn, generation, dict.fromkeys(value["id"] if op == "put" else value for op, value in ops))
+            return generation
+
+    def replace_all(self, records):
+        with self.store.transaction() as conn:
+            generation = self.store._bump(conn, self.table)
+            # the rows dropped count as changed too
+            conn.execute(
+                f"INSERT INTO changes(name, id, generation) SELECT ?, id, ? FROM {self.table} WHERE true "
+                f"ON CONFLICT(name, id) DO UPDATE SET generation = excluded.generation",
+                (self.table, generation))
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.executemany(self._upsert_sql(), [self._row(r) for r in records])
+            self._track(conn, generation, [r["id"] for r in records])
+            return generation
+
+    def changed_since(self, generation):
+        """
+        (current generation, {id: record, or None if deleted}) of the rows
+        written after `generation`. The generation is read first, so a write
+        racing this call can only add rows that are newer still (applying
+        them twice is harmless), never hide one.
+        """
+        conn = self.store.connection()
+        current = self.store.generation(self.table)
+        rows = conn.execute(
+            f"SELECT c.id, t.data FROM changes c LEFT JOIN {self.table} t ON t.id = c.id "
+            f"WHERE c.name = ? AND c.generation > ? ORDER BY c.id",
+            (self.table, generation))
+        return current, {record_id: json.loads(data) if data is not None else None for record_id, data in rows}
+
+
+class SqliteHistoryRepository:
+    """Undo stacks per category: the newest row of a category is its top"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def push(self, category, action):
+        self.push_many([(category, action)])
+
+    def push_many(self, items):
+        with self.store.transaction() as conn:
+            conn.executemany("INSERT INTO history(category, action) VALUES (?, ?)",
+                             [(category, _dumps(action)) for category, action in items])
+            self.store._bump(conn, "history")
+
+    def _last(self, conn, category):
+        return conn.execute(
+            "SELECT seq, action FROM history WHERE category = ? ORDER BY seq DESC LIMIT 1",
+            (category,)).fetchone()
+
+    def pop(self, category):
+        with self.store.transaction() as conn:
+            row = self._last(conn, category)
+            if row is None:
+                return None
+            conn.execute("DELETE FROM history WHERE seq = ?", (row[0],))
+            self.store._bump(conn, "history")
+        return json.loads(row[1])
+
+    def peek(self, category):
+        row = self._last(self.store.connection(), category)
+        return json.loads(row[1]) if row else None
+
+    def count(self, category):
+        return self.store.connection().execute(
+            "SELECT COUNT(*) FROM history WHERE category = ?", (category,)).fetchone()[0]
+
+    def actions(self, category, offset=0):
+        rows = self.store.connection().execute(
+            "SELECT action FROM history WHERE category = ? ORDER BY seq LIMIT -1 OFFSET ?", (category, offset))
+        return [json.loads(action) for (action,) in rows]
+
+    def categories(self):
+        rows = self.store.connection().execute("SELECT DISTINCT category FROM history ORDER BY category")
+        return [category for (category,) in rows]
+
+    def clear(self):
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM history")
+            self.store._bump(conn, "history")
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return default
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(store=None):
+    """
+    Resolve the storage backend for a service.
+
+    A SqliteStore passed in is used as is, False means the JSON files, and
+    None picks the process default: SQLite when GREENBIN_DB names a database
+    file, otherwise the JSON files. Returns None for the JSON files.
+    """
+    if store is False:
+        return None
+    if store is not None:
+        return store
+    path = os.environ.get("GREENBIN_DB")
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = SqliteStore(path)
+        return _stores[path]
+
+
+if __name__ == "__main__":
+    # python -m services.sqlite_store import|export [db_path] [data_dir]
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        sys.exit("usage: python -m services.sqlite_store import|export [db_path] [data_dir]")
+    db = SqliteStore(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DB)
+    data_dir = sys.argv[3] if len(sys.argv) > 3 else os.path.join(PROJECT_ROOT, "data")
+    if sys.argv[1] == "import":
+        db.import_json(data_dir)
+    else:
+        db.export_json(data_dir)
+    print(f"{sys.argv[1]}ed {data_dir} {'into' if sys.argv[1] == 'import' else 'from'} {db.path}")
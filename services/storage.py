@@ -0,0 +1,368 @@
+# services/storage.py
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, a single process is assumed
+    fcntl = None
+
+
+class VersionConflict(Exception):
+    """A file changed on disk after it was read (another session or process wrote it)"""
+
+
+class CorruptSnapshot(Exception):
+    """A snapshot file could not be parsed; it is left as it is rather than overwritten"""
+
+
+def file_version(path):
+    """(inode, mtime_ns, size) of a file, or None if it does not exist. Changes whenever the file does."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+_encode = json.JSONEncoder().encode  # skips json.dumps' per-call argument handling
+
+# the process umask (it can only be read by setting it), for the mode of new files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write_json(path, data, indent=4, one_per_line=False):
+    """
+    Write JSON to a temp file in the same folder, fsync it, then rename over `path`.
+    With one_per_line a list is written as one record per line instead of
+    indented: still readable and diffable, but encoded by the C encoder,
+    which is many times faster for large snapshots. The file keeps the
+    mode of the one it replaces (a new one gets the usual 0666 minus the
+    umask), not the 0600 mkstemp creates the temp file with.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w") as f:
+            os.chmod(tmp_path, mode)
+            if one_per_line:
+                f.write("[\n" + ",\n".join(map(_encode, data)) + "\n]\n" if data else "[]\n")
+            else:
+                json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Advisory lock (fcntl.flock) on `path + ".lock"`, held for the block.
+    The lock lives in its own file so it survives `path` being replaced by a rename.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_json(path, default=None):
+    """
+    Read a JSON file under a shared lock. Returns (data, version), or
+    (default, None) if the file does not exist. Pass the version back to
+    write_json() to detect lost updates.
+    """
+    with file_lock(path, shared=True):
+        version = file_version(path)
+        if version is None:
+            return default, None
+        with open(path, "r") as f:
+            raw = f.read()
+    return (json.loads(raw) if raw.strip() else default), version
+
+
+_UNCHECKED = object()
+
+
+def write_json(path, data, expected_version=_UNCHECKED, indent=4):
+    """
+    Atomically replace a JSON file under an exclusive lock and return its new
+    version. With expected_version, raise VersionConflict instead of writing
+    if the file is no longer the version the caller read.
+    """
+    with file_lock(path):
+        if expected_version is not _UNCHECKED and file_version(path) != expected_version:
+            raise VersionConflict(f"{path} was changed by another session")
+        atomic_write_json(path, data, indent=indent)
+        return file_version(path)
+
+
+def update_json(path, fn, default=None, indent=4):
+    """
+    Read-modify-write a JSON file under one exclusive lock: the file is
+    replaced with fn(current data). Returns (new data, new version).
+    """
+    with file_lock(path):
+        data = default
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                raw = f.read()
+            if raw.strip():
+                data = json.loads(raw)
+        data = fn(data)
+        atomic_write_json(path, data, indent=indent)
+        return data, file_version(path)
+
+
+def merge_records(records, put=(), delete=()):
+    """
+    Apply changes to a list of {"id": ...} records: each `put` record replaces
+    the one with the same id (or is appended) and ids in `delete` are dropped.
+    """
+    put = {r["id"]: r for r in put}
+    delete = set(delete)
+    merged = []
+    for r in records:
+        if r["id"] in delete:
+            continue
+        merged.append(put.pop(r["id"], r))
+    merged.extend(r for r in put.values() if r["id"] not in delete)
+    return merged
+
+
+class AppendLog:
+    """
+    Append-only JSONL mutation log.
+
+    Every record is flushed to the OS as soon as it is appended (so other
+    readers see it), while the more expensive fsync is batched: it happens
+    once `fsync_every` records have accumulated or `fsync_interval` seconds
+    have passed since the last one.
+
+    Appends take an exclusive file lock, so several processes can share one
+    log; a log rotated away by another process is noticed and reopened.
+    """
+
+    def __init__(self, path, fsync_every=32, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.RLock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.entries = 0  # records appended since the log was last reset
+
+    # -------------------- WRITE --------------------
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            torn = False
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            self._file = open(self.path, "a")
+            if torn:
+                # a crash left a partial last line; never glue a new record onto it
+                self._file.write("\n")
+        return self._file
+
+    def append(self, record):
+        """Append one record (a JSON-serialisable dict) as a single line"""
+        return self.append_many([record])
+
+    def append_many(self, records):
+        """
+        Append several records with one write and at most one fsync.
+        Returns (inode, end offset, bytes written) so the caller can tell
+        whether anyone else appended in between.
+        """
+        if not records:
+            return None
+        payload = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        with self.locked():
+            f = self._open()
+            if os.fstat(f.fileno()).st_ino != (file_version(self.path) or (None,))[0]:
+                # another process rotated the log since we opened it
+                self._sync_locked()
+                f.close()
+                self._file = None
+                f = self._open()
+            f.write(payload)
+            f.flush()
+            written = (os.fstat(f.fileno()).st_ino, f.tell(), len(payload.encode()))
+            self.entries += len(records)
+            self._unsynced += len(records)
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync_locked()
+        return written
+
+    def _sync_locked(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Force any batched records to disk"""
+        with self.lock:
+            self._sync_locked()
+
+    @contextmanager
+    def locked(self):
+        """Hold the log against appends from this and every other process"""
+        with self.lock, file_lock(self.path):
+            yield
+
+    def rotate(self, rotated_path):
+        """
+        Move the current log aside (to be deleted once a snapshot covers it)
+        and start a fresh one. Returns False if there was nothing to rotate.
+        Call it inside locked() when other processes may be appending.
+        """
+        with self.lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.entries = 0
+            if not os.path.exists(self.path):
+                return False
+            if os.path.exists(rotated_path):
+                # an earlier compaction never finished: keep its records, in order
+                with open(self.path, "r") as src, open(rotated_path, "a") as dst:
+                    dst.write("\n")  # terminate a possibly torn last line
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, rotated_path)
+            return True
+
+    def close(self):
+        with self.lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # -------------------- READ --------------------
+
+    @staticmethod
+    def read_from(path, offset=0):
+        """
+        Records after byte `offset` of a log file, and the offset just past
+        the last complete one (where the next read should start).
+        """
+        records = []
+        if not os.path.exists(path):
+            return records, offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # incomplete trailing record, read it next time
+                offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records, offset
+
+    @staticmethod
+    def read(path):
+        """Yield the records of a log file. Torn lines (crash mid-write) are skipped."""
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # incomplete trailing record
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def append_record(path, record):
+    """Append one JSON record as a line to `path` (used for small, rotating files)"""
+    return append_records(path, [record])
+
+
+def append_records(path, records):
+    """Append several JSON records to `path` with a single write"""
+    line = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+    torn = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+    with open(path, "a") as f:
+        if torn:
+            f.write("\n")  # never glue a record onto a partial line
+        f.write(line)
+        f.flush()
+    return len(line)
+
+
+def read_last_record(path):
+    """
+    Return (offset, record) for the last complete record of a JSONL file, or
+    (None, None) if it has none. Reads backwards, so the cost is the size of
+    the record rather than the size of the file.
+    """
+    if not os.path.exists(path):
+        return None, None
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        buf = b""
+        while pos > 0:
+            step = min(8192, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+
+            # anything after the last newline is a torn write, not a record
+            body = buf[:buf.rfind(b"\n")] if b"\n" in buf else None
+            while body is not None:
+                nl = body.rfind(b"\n")
+                if nl < 0 and pos > 0:
+                    break  # this line may start before the buffer; read further back
+                line = body[nl + 1:]
+                if line.strip():
+                    try:
+                        return pos + nl + 1, json.loads(line)
+                    except json.JSONDecodeError:
+                        pass
+                body = body[:nl] if nl >= 0 else None
+    return None, None
@@ -0,0 +1,96 @@
+# services/unit_of_work.py
+from contextlib import ExitStack
+
+
+class UnitOfWork:
+    """
+    Groups changes to several services so they reach disk in one flush.
+
+        with UnitOfWork(bin_service, bin_service.history, vehicle_service):
+            ...  # mutate as usual
+
+    Every participant has begin() / commit() / rollback() / compensate().
+    Between begin() and commit() it keeps its changes in memory and buffers
+    the writes; commit() writes them out at once and rollback() undoes the
+    in-memory changes and drops the buffer. compensate() takes back what
+    its last commit() did, in memory and on disk. Leaving the block
+    normally commits every participant in order, an exception rolls all of
+    them back (in reverse order) and is re-raised.
+
+    The commit is all or nothing: if one participant fails, the rest are
+    rolled back and the ones already flushed are compensated. Participants
+    backed by a SQLite store all commit inside one transaction of it, so
+    there a failure rolls their writes back in the database and
+    compensate() only has to restore memory.
+    """
+
+    def __init__(self, *participants):
+        self.participants = []
+        for p in participants:
+            # the same service may be reachable twice (e.g. a shared HistoryService)
+            if p is not None and all(p is not q for q in self.participants):
+                self.participants.append(p)
+        self.active = False
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def begin(self):
+        started = []
+        try:
+            for p in self.participants:
+                p.begin()
+                started.append(p)
+        except BaseException:
+            for p in reversed(started):
+                p.rollback()
+            raise
+        self.active = True
+
+    def commit(self):
+        """
+        Flush each participant in order. If one of them fails, the ones not
+        yet flushed are rolled back and those already flushed compensated
+        (newest first), then the error is re-raised.
+        """
+        if not self.active:
+            return
+        self.active = False
+        flushed = []
+        try:
+            with ExitStack() as transactions:
+                for store in self._stores():
+                    transactions.enter_context(store.transaction())
+                for p in self.participants:
+                    p.commit()
+                    flushed.append(p)
+        except BaseException:
+            for p in reversed(self.participants[len(flushed):]):
+                p.rollback()
+            for p in reversed(flushed):
+                p.compensate()
+            raise
+
+    def _stores(self):
+        """The distinct SQLite stores of the participants (JSON-backed ones have none)"""
+        stores = []
+        for p in self.participants:
+            store = getattr(p, "store", None)
+            if store is not None and all(store is not s for s in stores):
+                stores.append(store)
+        return stores
+
+    def rollback(self):
+        if not self.active:
+            return
+        self.active = False
+        for p in reversed(self.participants):
+            p.rollback()
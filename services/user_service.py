@@ -2,15 +2,26 @@
 import json
 import os
 from models.user import User
+from services.storage import file_version
 
 class UserService:
     def __init__(self, file_path="data/users.json"):
         self.file_path = file_path
         self.users = []
+        self._version = None  # file_version() of the data currently loaded
         self.load_users()
 
+    def refresh(self):
+        """Reload the users if users.json changed; a no-op otherwise"""
+        if file_version(self.file_path) == self._version:
+            return False
+        self.users = []
+        self.load_users()
+        return True
+
     def load_users(self):
         """Load users from JSON file into memory"""
+        self._version = file_version(self.file_path)
         if not os.path.exists(self.file_path):
             return
         try:
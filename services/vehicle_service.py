@@ -5,8 +5,9 @@ import json
 from models.vehicle import Vehicle
 from services.bin_service import BinService
 from services.facility_service import FacilityService
-from data_structures.priority_queue import MaxHeap
 from services.history_service import HistoryService
+from services.storage import VersionConflict, merge_records, read_json, update_json, write_json
+from services.unit_of_work import UnitOfWork
 from services.dijkstra import generate_grid_graph, find_nearest_node, dijkstra
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -22,10 +23,16 @@ class VehicleService:
         self.actual_vehicles_file = "data/actual_vehicles.json"
         
         # Load vehicles (prefer actual state if exists)
+        self._version = None  # version of actual_vehicles.json we last read or wrote
         self.vehicles = self.load_vehicles()
+        # While a unit of work is open: vehicle id -> (to_dict(), target_bin,
+        # target_facility) from before its first change, and whether a save is due
+        self._batch_prior = None
+        self._save_pending = False
+        self._committed = None  # (_batch_prior, saved) of the last commit(), for compensate()
         
-        # Prepare max-heap for bins
-        self.bin_heap = self.create_bin_heap()
+        # Max-heap of bins by fill level, maintained live by BinService
+        self.bin_heap = self.bin_service.heap
         self.facility_service = FacilityService() 
         self.history = HistoryService()
         
@@ -39,8 +46,7 @@ class VehicleService:
         # Try loading actual state first
         if os.path.exists(self.actual_vehicles_file):
             try:
-                with open(self.actual_vehicles_file, "r") as f:
-                    vehicles_data = json.load(f)
+                vehicles_data, self._version = read_json(self.actual_vehicles_file, [])
                 return [Vehicle.from_dict(v) for v in vehicles_data]
             except json.JSONDecodeError:
                 pass # Fallback to seed
@@ -50,19 +56,85 @@ class VehicleService:
             vehicles_data = json.load(f)
         return [Vehicle(v["id"], v["x"], v["y"]) for v in vehicles_data]
 
-    def save_vehicles(self):
-        """Save current vehicle state to actual_vehicles.json"""
+    def save_vehicles(self, changed_ids=None):
+        """
+        Save current vehicle state to actual_vehicles.json. With changed_ids,
+        only those vehicles are ours to write: if another session saved the
+        file meanwhile, they are merged into its version instead of
+        overwriting the whole fleet.
+        """
+        if self._batch_prior is not None:
+            self._save_pending = True  # written once, on commit
+            return
+        self._write_vehicles(changed_ids)
+
+    def _write_vehicles(self, changed_ids=None):
         data = [v.to_dict() for v in self.vehicles]
-        with open(self.actual_vehicles_file, "w") as f:
-            json.dump(data, f, indent=4)
+        if changed_ids is None:
+            self._version = write_json(self.actual_vehicles_file, data)
+            return
+        try:
+            self._version = write_json(self.actual_vehicles_file, data, expected_version=self._version)
+        except VersionConflict:
+            ours = [item for item in data if item["id"] in changed_ids]
+            merged, self._version = update_json(
+                self.actual_vehicles_file, lambda current: merge_records(current or data, ours), default=None)
+            # pick up what the other session did to the vehicles we left alone
+            vehicles_by_id = {v.id: v for v in self.vehicles}
+            for item in merged:
+                if item["id"] not in changed_ids and item["id"] in vehicles_by_id:
+                    vehicles_by_id[item["id"]].update_from_dict(item)
+
+    # -------------------- UNIT OF WORK --------------------
+
+    def begin(self):
+        """Defer save_vehicles() until commit() (see services/unit_of_work.py)"""
+        if self._batch_prior is not None:
+            raise RuntimeError("VehicleService already has an open unit of work")
+        self._batch_prior = {}
+        self._save_pending = False
+        self._committed = None
+
+    def commit(self):
+        if self._batch_prior is None:
+            return
+        if self._save_pending:
+            # if this fails the batch state is still here for rollback()
+            self._write_vehicles(changed_ids=set(self._batch_prior))
+        # kept until the next unit of work, in case compensate() is needed
+        self._committed = (self._batch_prior, self._save_pending)
+        self._batch_prior = None
+        self._save_pending = False
 
-    def create_bin_heap(self):
-        """Create max-heap of bins based on fill level"""
-        heap = MaxHeap()
-        for b in self.bin_service.bins:
-            if b.fill_level > 0:
-                heap.push(b)
-        return heap
+    def rollback(self):
+        """Put every vehicle touched in the unit of work back as it was"""
+        if self._batch_prior is None:
+            return
+        self._restore(self._batch_prior)
+        self._batch_prior = None
+        self._save_pending = False
+
+    def compensate(self):
+        """Undo the last commit() (a later participant failed): restore the vehicles and save them again"""
+        if self._committed is None:
+            return
+        (prior, saved), self._committed = self._committed, None
+        self._restore(prior)
+        if saved:
+            self._write_vehicles(changed_ids=set(prior))
+
+    def _restore(self, prior):
+        vehicles_by_id = {v.id: v for v in self.vehicles}
+        for vehicle_id, (data, target_bin, target_facility) in prior.items():
+            v = vehicles_by_id.get(vehicle_id)
+            if v is not None:
+                v.update_from_dict(data)
+                v.target_bin = target_bin
+                v.target_facility = target_facility
+
+    def _remember(self, v):
+        if self._batch_prior is not None and v.id not in self._batch_prior:
+            self._batch_prior[v.id] = (v.to_dict(), v.target_bin, v.target_facility)
 
     def get_route(self, start_lat, start_lon, end_lat, end_lon):
         """Helper to get route using new Dijkstra"""
@@ -87,9 +159,11 @@ class VehicleService:
         # but keeping it for compatibility or alternative usage.
         # Simplified version of dispatch logic.
         
-        for v in self.vehicles:
-            if not self.bin_heap.is_empty():
-                top_bin = self.bin_heap.pop()
+        urgent_bins = self.bin_heap.peek_k(len(self.vehicles))
+
+        for i, v in enumerate(self.vehicles):
+            if i < len(urgent_bins):
+                top_bin = urgent_bins[i]
                 v.target_bin = top_bin
 
                 # 1. Vehicle -> Bin
@@ -127,29 +201,43 @@ class VehicleService:
         self.save_vehicles()
 
     def reload_bins(self):
-        """Reload bins from file to ensure we have the latest data."""
-        self.bin_service = BinService(file_path=self.bin_service.file_path)
-        self.bin_heap = self.create_bin_heap()
+        """Catch up with bin changes made elsewhere (a no-op when nothing changed)."""
+        self.bin_service.refresh()
 
-    def _capture_state(self):
-        """Capture current state of vehicles and bins."""
-        return {
-            "vehicles": [v.to_dict() for v in self.vehicles],
-            "bins": [b.to_dict() for b in self.bin_service.bins]
-        }
+    @staticmethod
+    def _diff_fields(before, after):
+        """Prior values of the fields that changed between two to_dict() snapshots."""
+        return {key: value for key, value in before.items() if after.get(key) != value}
 
     def dispatch_all_vehicles(self):
         """
-        Greedy dispatch strategy with new Dijkstra
+        Greedy dispatch strategy with new Dijkstra.
+
+        Runs as one unit of work: the emptied bins go to the bin log as a
+        single record, the history entries are appended once per category
+        and the fleet is saved once. If anything fails on the way, the
+        vehicles and bins are rolled back and nothing is written.
         """
         self.reload_bins()
-        state = self._capture_state()
-        self.history.push_action("dispatch", "dispatch_all", state)
+        # The fleet commits first, so if its save fails nothing else is written
+        with UnitOfWork(self, self.bin_service, self.bin_service.history, self.history):
+            self._dispatch_all_vehicles()
+
+    def _dispatch_all_vehicles(self):
+
+        # Undo only needs what this dispatch changes: the prior fields of the
+        # vehicles it touches and the prior fill of the bins it empties.
+        vehicle_diffs = []
+        emptied_bins = []
 
         # Track assigned bins
         assigned_bin_ids = set()
+        bins = self.bin_service.get_all_bins()
         
         for v in self.vehicles:
+            self._remember(v)
+            before = v.to_dict()
+            before_target = v.target_bin
             # Find nearest unassigned bin
             best_bin = None
             min_dist = float('inf')
@@ -159,7 +247,7 @@ class VehicleService:
             # as Dijkstra is expensive to run for ALL bins.
             
             candidates = []
-            for b in self.bin_service.bins:
+            for b in bins:
                 if b.id in assigned_bin_ids or b.fill_level <= 0:
                     continue
                 # Approx distance
@@ -215,34 +303,52 @@ class VehicleService:
                 v.total_distance += total_dist # Accumulate distance
                 
                 # Empty bin
-                best_bin.fill_level = 0
+                emptied_bins.append({"id": best_bin.id, "fill_level": best_bin.fill_level})
                 self.bin_service.update_bin(best_bin.id, 0)
             else:
                 v.target_bin = None
                 v.target_facility = None
                 v.current_route = []
+
+            prior = self._diff_fields(before, v.to_dict())
+            if v.target_bin is not before_target:
+                # the new target is the live bin; keep the old one even if it looks equal
+                prior["target_bin"] = before["target_bin"]
+            if prior:
+                vehicle_diffs.append({"id": v.id, "prior": prior})
         
         self.save_vehicles()
+        self.history.push_action("dispatch", "dispatch_delta", {
+            "vehicles": vehicle_diffs,
+            "bins": emptied_bins
+        })
 
     def undo_last(self):
         """Undo the last dispatch action."""
         action = self.history.pop_action("dispatch")
-        if not action or action["type"] != "dispatch_all":
+        if not action:
             return False
 
         data = action["data"]
-        self.vehicles = [Vehicle.from_dict(v_data) for v_data in data["vehicles"]]
-        self.save_vehicles()
-        
-        from models.bin import Bin
-        from data_structures.linked_list import LinkedList
-        
-        new_bins = LinkedList()
-        for b_data in data["bins"]:
-            new_bins.append(Bin.from_dict(b_data))
-            
-        self.bin_service.bins = new_bins
-        self.bin_service.save_bins()
+        if action["type"] == "dispatch_delta":
+            # Apply the recorded diff in place
+            vehicles_by_id = {v.id: v for v in self.vehicles}
+            for entry in data["vehicles"]:
+                v = vehicles_by_id.get(entry["id"])
+                if v is not None:
+                    v.update_from_dict(entry["prior"])
+            changed_ids = {entry["id"] for entry in data["vehicles"]}
+            levels = {b["id"]: b["fill_level"] for b in data["bins"]}
+        elif action["type"] == "dispatch_all":
+            # Older entries hold a full snapshot of the fleet and every bin
+            self.vehicles = [Vehicle.from_dict(v_data) for v_data in data["vehicles"]]
+            changed_ids = None
+            levels = {b["id"]: b["fill_level"] for b in data["bins"]}
+        else:
+            return False
+
+        self.save_vehicles(changed_ids)
+        self.bin_service.restore_fill_levels(levels)
         return "Undid dispatch. Restored vehicle locations and bin levels."
 
     def reset_vehicles(self):
@@ -0,0 +1,138 @@
+# tests/test_avl_trees.py
+import random
+import unittest
+from types import SimpleNamespace
+
+from data_structures.avl_trees import FacilityAVLTree
+
+
+def facility(facility_id, name=None):
+    return SimpleNamespace(id=facility_id, name=name or f"Facility {facility_id}")
+
+
+class FacilityAVLTreeTest(unittest.TestCase):
+    def assert_valid(self, tree):
+        """Keys in order, and every node balanced with the right cached height and size"""
+        def check(node):
+            if node is None:
+                return 0, 0
+            lh, ls = check(node.left)
+            rh, rs = check(node.right)
+            self.assertLessEqual(abs(lh - rh), 1)
+            self.assertEqual(node.height, max(lh, rh) + 1)
+            self.assertEqual(node.size, ls + rs + 1)
+            return node.height, node.size
+        check(tree.root)
+        keys = [f.id for f in tree]
+        self.assertEqual(keys, sorted(keys))
+
+    def ids(self, values):
+        return [f.id for f in values]
+
+    def test_bulk_load_builds_a_balanced_tree(self):
+        for n in (0, 1, 2, 7, 100):
+            tree = FacilityAVLTree()
+            tree.bulk_load(facility(i) for i in range(n))
+            self.assert_valid(tree)
+            self.assertEqual(len(tree), n)
+            self.assertEqual(self.ids(tree.inorder()), list(range(n)))
+            self.assertLessEqual(tree.get_height(tree.root), n.bit_length())
+
+    def test_bulk_load_sorts_values_out_of_order(self):
+        tree = FacilityAVLTree()
+        tree.bulk_load([facility(i) for i in (5, 2, 9, 1, 7)])
+        self.assert_valid(tree)
+        self.assertEqual(self.ids(tree), [1, 2, 5, 7, 9])
+
+    def test_bulk_load_replaces_the_tree(self):
+        tree = FacilityAVLTree()
+        tree.insert(facility(42))
+        tree.bulk_load([facility(1), facility(2)])
+        self.assertEqual(self.ids(tree), [1, 2])
+        self.assertIsNone(tree.search(42))
+
+    def test_sorted_inserts_stay_balanced(self):
+        tree = FacilityAVLTree()
+        for i in range(1, 65):
+            tree.insert(facility(i))
+        self.assert_valid(tree)
+        self.assertEqual(tree.get_height(tree.root), 7)
+        self.assertEqual(tree.search(33).name, "Facility 33")
+        self.assertIsNone(tree.search(99))
+
+    def test_delete_leaf_inner_node_and_root(self):
+        tree = FacilityAVLTree()
+        tree.bulk_load(facility(i) for i in range(1, 16))
+        tree.delete(1)                 # a leaf
+        tree.delete(12)                # two children: its successor moves up
+        tree.delete(tree.root.key)
+        tree.delete(99)                # missing: nothing happens
+        self.assert_valid(tree)
+        self.assertEqual(self.ids(tree), [2, 3, 4, 5, 6, 7, 9, 10, 11, 13, 14, 15])
+        for key in (2, 3, 4, 5, 6, 7, 9, 10, 11, 13, 14, 15):
+            tree.delete(key)
+            self.assert_valid(tree)
+        self.assertIsNone(tree.root)
+        self.assertEqual(len(tree), 0)
+
+    def test_select_rank_and_slice(self):
+        tree = FacilityAVLTree()
+        tree.bulk_load(facility(i) for i in range(0, 100, 10))
+        self.assertEqual(tree.select(0).id, 0)
+        self.assertEqual(tree.select(4).id, 40)
+        self.assertEqual(tree.select(9).id, 90)
+        self.assertIsNone(tree.select(10))
+        self.assertIsNone(tree.select(-1))
+        self.assertEqual(tree.rank(40), 4)
+        self.assertEqual(tree.rank(45), 5)
+        self.assertEqual(tree.rank(-5), 0)
+        self.assertEqual(self.ids(tree.slice(3, 2)), [30, 40])
+        self.assertEqual(self.ids(tree.slice(8)), [80, 90])
+        self.assertEqual(self.ids(tree.slice(20, 5)), [])
+        self.assertEqual(self.ids(tree.slice(0, 0)), [])
+
+    def test_range_floor_and_ceiling(self):
+        tree = FacilityAVLTree()
+        tree.bulk_load(facility(i) for i in range(0, 100, 10))
+        self.assertEqual(self.ids(tree.range(25, 60)), [30, 40, 50, 60])
+        self.assertEqual(self.ids(tree.range(hi=15)), [0, 10])
+        self.assertEqual(self.ids(tree.range(lo=85)), [90])
+        self.assertEqual(tree.count_range(25, 60), 4)
+        self.assertEqual(tree.count_range(61, 25), 0)
+        self.assertEqual(tree.count_range(), 10)
+        self.assertEqual(tree.floor(35).id, 30)
+        self.assertEqual(tree.ceiling(35).id, 40)
+        self.assertEqual(tree.floor(40).id, 40)
+        self.assertIsNone(tree.floor(-1))
+        self.assertIsNone(tree.ceiling(91))
+
+    def test_custom_key(self):
+        tree = FacilityAVLTree(key=lambda f: f.name.lower())
+        tree.bulk_load([facility(1, "Beta"), facility(2, "alpha"), facility(3, "Gamma")])
+        self.assertEqual(self.ids(tree), [2, 1, 3])
+        self.assertEqual(tree.search("gamma").id, 3)
+
+    def test_random_operations_match_a_sorted_list(self):
+        rng = random.Random(3)
+        tree, expected = FacilityAVLTree(), set()
+        tree.bulk_load(facility(i) for i in range(0, 200, 2))
+        expected.update(range(0, 200, 2))
+        for _ in range(2000):
+            key = rng.randrange(300)
+            if rng.random() < 0.5:
+                if key not in expected:
+                    tree.insert(facility(key))
+                    expected.add(key)
+            else:
+                tree.delete(key)
+                expected.discard(key)
+        self.assert_valid(tree)
+        ordered = sorted(expected)
+        self.assertEqual(self.ids(tree), ordered)
+        for k in (0, len(ordered) // 2, len(ordered) - 1):
+            self.assertEqual(tree.select(k).id, ordered[k])
+            self.assertEqual(tree.rank(ordered[k]), k)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+# tests/test_bin_service.py
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from services.bin_service import BinService
+from services.history_service import HistoryService
+
+
+class BinLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bins_path = os.path.join(self.tmp.name, "bins.json")
+        self.log_path = os.path.join(self.tmp.name, "bins.log.jsonl")
+        with open(self.bins_path, "w") as f:
+            json.dump([{"id": i, "location": f"Bin {i}", "fill_level": 10 * i, "x": 0.0, "y": 0.0}
+                       for i in (1, 2, 3)], f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_bins(self):
+        history = HistoryService(os.path.join(self.tmp.name, "history.json"), store=False)
+        return BinService(file_path=self.bins_path, store=False, history=history)
+
+    def state(self, bins):
+        return {b.id: (b.location, b.fill_level) for b in bins.get_all_bins()}
+
+    def snapshot_ids(self):
+        with open(self.bins_path) as f:
+            return sorted(item["id"] for item in json.load(f))
+
+    def log_records(self):
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def change(self, bins):
+        bins.update_bin(1, 75)
+        bins.remove_bin(2)
+        return bins.add_bin("Elm St", 40).id
+
+    def test_changes_are_logged_and_replayed(self):
+        bins = self.open_bins()
+        added = self.change(bins)
+        bins.close()
+        self.assertEqual(self.snapshot_ids(), [1, 2, 3])  # the snapshot is not rewritten
+        self.assertEqual([r["op"] for r in self.log_records()], ["put", "del", "put"])
+        self.assertEqual(self.state(self.open_bins()),
+                         {1: ("Bin 1", 75), 3: ("Bin 3", 30), added: ("Elm St", 40)})
+
+    def test_compaction_folds_the_log_into_the_snapshot(self):
+        bins = self.open_bins()
+        added = self.change(bins)
+        before = self.state(bins)
+        bins.compact()
+        self.assertEqual(self.snapshot_ids(), [1, 3, added])
+        self.assertEqual(self.log_records(), [])
+        self.assertFalse(os.path.exists(self.log_path + ".old"))
+        self.assertEqual(self.state(self.open_bins()), before)
+
+        bins.update_bin(3, 0)  # the log starts over after it
+        self.assertEqual(len(self.log_records()), 1)
+        self.assertEqual(self.state(self.open_bins())[3], ("Bin 3", 0))
+
+    def test_log_left_by_an_interrupted_compaction_is_replayed_first(self):
+        with open(self.log_path + ".old", "w") as f:
+            f.write(json.dumps({"op": "put", "bin": {"id": 1, "location": "Bin 1", "fill_level": 20,
+                                                     "x": 0.0, "y": 0.0}}) + "\n")
+            f.write(json.dumps({"op": "del", "id": 3}) + "\n")
+        with open(self.log_path, "w") as f:
+            f.write(json.dumps({"op": "put", "bin": {"id": 1, "location": "Bin 1", "fill_level": 60,
+                                                     "x": 0.0, "y": 0.0}}) + "\n")
+            f.write('{"op": "put", "bin": {"id": 2')  # torn by a crash mid-write
+        bins = self.open_bins()
+        self.assertEqual(self.state(bins), {1: ("Bin 1", 60), 2: ("Bin 2", 20)})
+
+        bins.compact()
+        self.assertFalse(os.path.exists(self.log_path + ".old"))
+        self.assertEqual(self.snapshot_ids(), [1, 2])
+
+    def test_refresh_applies_another_instance_records_in_place(self):
+        writer, reader = self.open_bins(), self.open_bins()
+        kept = reader.get_bin_by_id(1)
+        heard = []
+        reader.add_fill_listener(lambda b, old, t: heard.append((b.id, old, b.fill_level)))
+        added = self.change(writer)
+        self.assertTrue(reader.refresh())
+        self.assertIs(reader.get_bin_by_id(1), kept)
+        self.assertEqual(self.state(reader), self.state(writer))
+        self.assertEqual(heard, [(1, 10, 75)])
+        self.assertEqual([b.location for b in reader.search_by_location("elm")], ["Elm St"])
+        self.assertFalse(reader.refresh())
+
+        writer.compact()  # a rewritten snapshot: read again, still in place
+        writer.update_bin(added, 90)
+        self.assertTrue(reader.refresh())
+        self.assertIs(reader.get_bin_by_id(1), kept)
+        self.assertEqual(self.state(reader), self.state(writer))
+
+    def test_a_batch_record_applies_as_a_whole(self):
+        bins = self.open_bins()
+        self.assertEqual(bins.apply_fill_levels({1: 90, 2: 20, 3: 5, 99: 50}, {1: 1000.0}), 2)
+        records = self.log_records()
+        self.assertEqual(len(records), 1)
+        self.assertEqual([op["bin"]["id"] for op in records[0]["ops"]], [1, 3])
+        self.assertEqual(records[0]["ops"][0]["time"], 1000.0)
+        self.assertEqual(self.state(self.open_bins()), self.state(bins))
+
+    def test_log_is_compacted_in_the_background_once_large(self):
+        bins = self.open_bins()
+        bins.COMPACT_EVERY = 5
+        for level in range(1, 7):
+            bins.update_bin(1, level)
+        deadline = time.monotonic() + 10
+        while bins._compacting or bins.log.entries >= bins.COMPACT_EVERY:
+            self.assertLess(time.monotonic(), deadline, "no compaction ran")
+            time.sleep(0.01)
+        self.assertLess(len(self.log_records()), 5)
+        self.assertEqual(self.state(self.open_bins())[1], ("Bin 1", 6))
+
+
+class BinSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bins_path = os.path.join(self.tmp.name, "bins.json")
+        with open(self.bins_path, "w") as f:
+            json.dump([{"id": i, "location": "Elm St" if i == 7 else f"Lot {chr(64 + i)}", "fill_level": 0,
+                        "x": 0.0, "y": 0.0} for i in range(1, 26)], f)
+        self.bins = BinService(file_path=self.bins_path, store=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def ids(self, query):
+        return [b.id for b in self.bins.search(query)]
+
+    def test_matches_ids_and_locations_as_substrings(self):
+        self.assertEqual(self.ids("1"), [1] + list(range(10, 20)) + [21])
+        self.assertEqual(self.ids("25"), [25])
+        self.assertEqual(self.ids("elm"), [7])
+        self.assertEqual(self.ids("lot a"), [1])
+        self.assertEqual(self.ids("nowhere"), [])
+        self.assertEqual(len(self.ids("")), 25)
+
+    def test_follows_added_and_removed_bins(self):
+        added = self.bins.add_bin("Oak Ave", 10)
+        self.assertEqual(added.id, 26)
+        self.bins.remove_bin(12)
+        self.assertEqual(self.ids("2"), [2] + list(range(20, 27)))
+        self.assertEqual(self.ids("26"), [26])
+
+        other = BinService(file_path=self.bins_path, store=False)
+        self.assertEqual([b.id for b in other.search("2")], self.ids("2"))
+        other.remove_bin(21)
+        self.assertTrue(self.bins.refresh())
+        self.assertNotIn(21, self.ids("21"))
+
+
+if __name__ == "__main__":
+    unittest.main()
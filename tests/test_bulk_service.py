@@ -0,0 +1,56 @@
+# tests/test_bulk_service.py
+import json
+import os
+import tempfile
+import unittest
+
+from services import bulk_service
+from services.bin_service import BinService
+from services.request_service import RequestService
+
+
+class RequestRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp.name, "bins.json"), "w") as f:
+            json.dump([{"id": i, "location": f"Bin {i}", "fill_level": 0, "x": 0.0, "y": 0.0}
+                       for i in (1, 2)], f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_requests(self, name):
+        folder = os.path.join(self.tmp.name, name)
+        os.makedirs(folder)
+        bins = BinService(file_path=os.path.join(self.tmp.name, "bins.json"), store=False)
+        return RequestService(file_path=os.path.join(folder, "requests.json"), bin_service=bins, store=False)
+
+    def summary(self, requests):
+        return sorted((r.bin_id, r.request_type, r.count, r.reporters, r.time) for r in requests.get_all_requests())
+
+    def round_trip(self, ext, fmt=None):
+        source = self.open_requests("source")
+        for user in ("alice", "bob", "alice"):
+            source.add_request(user, 1, "Collect")
+        source.add_request("carol", 2, "Maintain")
+        path = os.path.join(self.tmp.name, "requests" + ext)
+        self.assertEqual(bulk_service.export_requests(source, path, fmt), 2)
+
+        target = self.open_requests("target")
+        self.assertEqual(bulk_service.import_requests(target, path, fmt), 2)
+        self.assertEqual(self.summary(target), self.summary(source))
+        self.assertEqual(target.open_requests_for_bin(1)[0].reporters, ["alice", "bob", "alice"])
+
+    def test_csv(self):
+        self.round_trip(".csv")
+
+    def test_jsonl(self):
+        self.round_trip(".jsonl")
+
+    @unittest.skipIf(bulk_service.pyarrow is None, "pyarrow is not installed")
+    def test_parquet(self):
+        self.round_trip(".parquet")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# tests/test_facility_service.py
+import json
+import os
+import tempfile
+import unittest
+
+from services.facility_service import FacilityService
+
+
+def row(name, capacity=100, efficiency=0.5, type="Recycling"):
+    return {"name": name, "location": f"{name} Rd", "x": 0.0, "y": 0.0,
+            "type": type, "capacity": capacity, "efficiency": efficiency}
+
+
+class FacilityServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, "facilities.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_facilities(self):
+        return FacilityService(file_path=self.file_path, store=False)
+
+    def assert_indexed(self, facilities):
+        """Every index holds each facility once, under its current keys"""
+        ids = sorted(f.id for f in facilities.tree)
+        self.assertEqual(len(set(ids)), len(ids))
+        for name, index in facilities.indexes.items():
+            self.assertEqual(sorted(f.id for f in index), ids, name)
+            for f in facilities.tree:
+                self.assertIs(index.search(index.key(f)), f)
+        for f in facilities.tree:
+            self.assertEqual(facilities.name_index.texts[f.id], f.name.lower())
+
+    def stored(self):
+        with open(self.file_path) as f:
+            return {item["id"]: item["name"] for item in json.load(f)}
+
+    def test_bulk_add_indexes_the_rows(self):
+        facilities = self.open_facilities()
+        added = facilities.bulk_add([row("North", 300, "0.9"), row("South", "150", 0.4)])
+        self.assertEqual([f.id for f in added], [1, 2])
+        self.assertEqual((added[0].efficiency, added[1].capacity), (0.9, 150.0))
+        self.assert_indexed(facilities)
+        self.assertEqual([f.name for f in facilities.get_sorted("capacity")], ["South", "North"])
+        self.assertEqual(self.stored(), {1: "North", 2: "South"})
+
+    def test_bulk_add_rejects_a_bad_row_before_adding_any(self):
+        facilities = self.open_facilities()
+        facilities.add_facility("Depot", "Depot Rd", 0.0, 0.0, "Landfill", 500, 0.7)
+        bad_rows = [
+            [row("North"), {**row("x"), "name": None}],
+            [row("North"), row("South", capacity=None)],
+            [row("North"), row("South", efficiency="high")],
+            [row("North"), {key: value for key, value in row("South").items() if key != "type"}],
+        ]
+        for rows in bad_rows:
+            with self.assertRaises(ValueError):
+                facilities.bulk_add(rows)
+        self.assertEqual([f.name for f in facilities.get_all()], ["Depot"])
+        self.assert_indexed(facilities)
+        self.assertEqual(self.stored(), {1: "Depot"})
+        self.assertEqual([f.id for f in facilities.bulk_add([row("North")])], [2])
+
+    def test_id_taken_by_another_session_is_reindexed(self):
+        a, b = self.open_facilities(), self.open_facilities()
+        a.add_facility("Alpha", "A Rd", 0.0, 0.0, "Landfill", 100, 0.5)
+        b.refresh = lambda: False  # look at what the merge left in b's indexes, not a reload
+        fac = b.add_facility("Beta", "B Rd", 0.0, 0.0, "Recycling", 200, 0.6)
+        self.assertEqual(fac.id, 2)
+        self.assert_indexed(b)
+        self.assertIs(b.get_by_id(2), fac)
+        self.assertIsNone(b.get_by_id(1))
+        self.assertEqual(self.stored(), {1: "Alpha", 2: "Beta"})
+
+        del b.refresh
+        self.assertTrue(b.refresh())
+        self.assertEqual([f.name for f in b.get_all()], ["Alpha", "Beta"])
+        self.assertEqual([f.id for f in b.search_by_name("beta")], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# tests/test_history_service.py
+import json
+import os
+import tempfile
+import unittest
+
+from services.history_service import HistoryService
+
+
+class HistorySegmentTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, "history.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_history(self, max_bytes=None):
+        history = HistoryService(self.file_path, store=False)
+        if max_bytes is not None:
+            history.SEGMENT_MAX_BYTES = max_bytes
+        return history
+
+    def push(self, history, *ids):
+        for bin_id in ids:
+            history.push_action("bin", "update_bin", {"id": bin_id})
+
+    def ids(self, actions):
+        return [action["data"]["id"] for action in actions]
+
+    def segment_files(self):
+        return sorted(name for name in os.listdir(os.path.join(self.tmp.name, "history"))
+                      if name.startswith("bin-"))
+
+    def test_push_and_pop_in_stack_order(self):
+        history = self.open_history()
+        self.push(history, 1, 2, 3)
+        self.assertEqual(history.count("bin"), 3)
+        self.assertEqual(history.peek_last("bin")["data"], {"id": 3})
+        self.assertEqual(history.pop_action("bin")["data"], {"id": 3})
+        self.assertEqual(history.pop_action("bin")["data"], {"id": 2})
+        self.push(history, 4)
+        self.assertEqual(self.ids(history.get_stack("bin").to_list()), [1, 4])
+        self.assertEqual(self.ids(self.open_history().actions_since("bin", 0)), [1, 4])
+        self.assertEqual(history.count("request"), 0)
+        self.assertIsNone(history.pop_action("request"))
+
+    def test_segments_roll_over_and_pop_back_across_them(self):
+        history = self.open_history(max_bytes=150)
+        self.push(history, *range(1, 11))
+        files = self.segment_files()
+        self.assertGreater(len(files), 2)
+        segments = history.index["bin"]
+        self.assertEqual([s["file"] for s in segments], files)
+        self.assertEqual(sum(s["count"] for s in segments[:-1]) + history._count_records(
+            os.path.join(self.tmp.name, "history", files[-1])), 10)
+
+        reopened = self.open_history(max_bytes=150)
+        self.assertEqual(reopened.count("bin"), 10)
+        self.assertEqual(self.ids(reopened.actions_since("bin", 7)), [8, 9, 10])
+        self.assertEqual(self.ids(reopened.get_stack("bin").to_list()), list(range(1, 11)))
+
+        popped = [reopened.pop_action("bin")["data"]["id"] for _ in range(8)]
+        self.assertEqual(popped, list(range(10, 2, -1)))
+        self.assertLess(len(self.segment_files()), len(files))  # emptied segments are dropped
+        self.assertEqual(self.ids(self.open_history().actions_since("bin", 0)), [1, 2])
+
+        self.push(reopened, 11)
+        self.assertEqual(self.ids(self.open_history().actions_since("bin", 0)), [1, 2, 11])
+
+    def test_other_instance_sees_pushes_and_pops(self):
+        writer, reader = self.open_history(), self.open_history()
+        self.assertEqual(self.ids(reader.get_stack("bin").to_list()), [])
+        self.push(writer, 1, 2)
+        self.assertTrue(reader.refresh())
+        self.assertEqual(self.ids(reader.get_stack("bin").to_list()), [1, 2])
+        writer.pop_action("bin")
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.peek_last("bin")["data"], {"id": 1})
+        self.assertEqual(reader.count("bin"), 1)
+        self.assertFalse(reader.refresh())
+
+    def test_legacy_history_file_is_imported_once(self):
+        with open(self.file_path, "w") as f:
+            json.dump({"bin": [{"type": "update_bin", "data": {"id": 1}},
+                               {"type": "update_bin", "data": {"id": 2}}],
+                       "request": []}, f)
+        history = self.open_history()
+        self.assertEqual(history.count("bin"), 2)
+        history.pop_action("bin")
+        self.assertEqual(self.open_history().count("bin"), 1)  # not imported again
+
+
+if __name__ == "__main__":
+    unittest.main()
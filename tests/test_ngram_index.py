@@ -0,0 +1,73 @@
+# tests/test_ngram_index.py
+import random
+import unittest
+
+from data_structures.ngram_index import NGramIndex
+
+
+class NGramIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = NGramIndex()
+        self.index.add_many([(1, "Main Street"), (2, "Elm Street"), (3, "Market Square"), (4, "banana")])
+
+    def test_substring_search_ignores_case(self):
+        self.assertEqual(self.index.search("street"), {1, 2})
+        self.assertEqual(self.index.search("MAR"), {3})
+        self.assertEqual(self.index.search("n St"), {1})
+        self.assertEqual(self.index.search("square"), {3})
+        self.assertEqual(self.index.search("avenue"), set())
+
+    def test_short_and_empty_queries(self):
+        self.assertEqual(self.index.search("m"), {1, 2, 3})
+        self.assertEqual(self.index.search("an"), {4})
+        self.assertEqual(self.index.search(""), {1, 2, 3, 4})
+        self.assertEqual(self.index.search(None), {1, 2, 3, 4})
+
+    def test_candidates_are_checked_against_the_text(self):
+        # "banana" holds both of the trigrams of "ananan" but not the word itself
+        self.assertEqual(self.index.search("ananan"), set())
+        self.assertEqual(self.index.search("anana"), {4})
+
+    def test_postings_are_built_on_the_first_search(self):
+        self.assertIsNone(self.index.postings)
+        self.index.search("m")  # a scan needs no postings
+        self.assertIsNone(self.index.postings)
+        self.index.search("street")
+        self.assertIsNotNone(self.index.postings)
+
+    def test_updates_before_and_after_the_build(self):
+        for built in (False, True):
+            index = NGramIndex()
+            index.add_many([(1, "Main Street"), (2, "Elm Street")])
+            if built:
+                index.search("street")
+            index.add(2, "Oak Avenue")  # re-indexed under its new text
+            index.add(5, "Pine Street")
+            index.remove(1)
+            index.remove(9)  # unknown: nothing happens
+            self.assertEqual(index.search("street"), {5})
+            self.assertEqual(index.search("avenue"), {2})
+            self.assertEqual(index.search("elm"), set())
+            self.assertEqual((len(index), 1 in index, 2 in index), (2, False, True))
+        self.assertNotIn("mai", index.postings)  # emptied postings are dropped
+
+    def test_clear(self):
+        self.index.search("street")
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.search("street"), set())
+        self.index.add(1, "Main Street")
+        self.assertEqual(self.index.search("street"), {1})
+
+    def test_random_queries_match_a_scan(self):
+        rng = random.Random(5)
+        texts = {i: "".join(rng.choice("abc ") for _ in range(rng.randint(0, 12))) for i in range(300)}
+        index = NGramIndex()
+        index.add_many(texts.items())
+        for _ in range(300):
+            query = "".join(rng.choice("abc ") for _ in range(rng.randint(1, 5)))
+            self.assertEqual(index.search(query), {i for i, text in texts.items() if query in text})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# tests/test_priority_queue.py
+import random
+import unittest
+
+from data_structures.priority_queue import IndexedMaxHeap
+
+
+class IndexedMaxHeapTest(unittest.TestCase):
+    def assert_valid(self, heap):
+        """Every parent sits above its children, and the index points at each entry"""
+        for i, entry in enumerate(heap.heap):
+            self.assertEqual(heap.position[entry[1]], i)
+            if i:
+                self.assertFalse(heap._higher(entry, heap.heap[(i - 1) // 2]))
+        self.assertEqual(len(heap.position), len(heap.heap))
+
+    def drain(self, heap):
+        items = []
+        while not heap.is_empty():
+            items.append(heap.pop())
+        return items
+
+    def test_pops_highest_first_and_equal_priorities_by_key(self):
+        heap = IndexedMaxHeap()
+        for key, priority in ((3, 50), (1, 80), (4, 50), (2, 10), (5, 80)):
+            heap.push(key, priority, f"bin {key}")
+        self.assert_valid(heap)
+        self.assertEqual(heap.peek(), "bin 1")
+        self.assertEqual(self.drain(heap), ["bin 1", "bin 5", "bin 3", "bin 4", "bin 2"])
+        self.assertIsNone(heap.pop())
+        self.assertIsNone(heap.peek())
+
+    def test_update_moves_an_entry_both_ways(self):
+        heap = IndexedMaxHeap()
+        for key in range(1, 8):
+            heap.push(key, key * 10, key)
+        self.assertTrue(heap.update(1, 100))
+        self.assert_valid(heap)
+        self.assertEqual(heap.peek(), 1)
+        self.assertTrue(heap.update(1, 0))
+        self.assertTrue(heap.update(7, 5))
+        self.assert_valid(heap)
+        self.assertEqual(heap.priority(7), 5)
+        self.assertEqual(self.drain(heap), [6, 5, 4, 3, 2, 7, 1])
+        self.assertFalse(heap.update(42, 1))
+
+    def test_push_of_a_known_key_reprioritises_it(self):
+        heap = IndexedMaxHeap()
+        heap.push("a", 10, "old")
+        heap.push("b", 20, "b")
+        heap.push("a", 30, "new")
+        self.assertEqual(len(heap), 2)
+        self.assertEqual(heap.peek(), "new")
+
+    def test_remove_from_the_middle(self):
+        heap = IndexedMaxHeap()
+        for key in range(10):
+            heap.push(key, (key * 7) % 10, key)
+        self.assertEqual(heap.remove(4), 4)
+        self.assertIsNone(heap.remove(4))
+        self.assertNotIn(4, heap)
+        self.assert_valid(heap)
+        self.assertEqual(len(heap), 9)
+
+    def test_push_many_matches_single_pushes(self):
+        rng = random.Random(1)
+        entries = [(key, rng.randint(0, 20), key) for key in range(200)]
+        one_by_one, bulk = IndexedMaxHeap(), IndexedMaxHeap()
+        for entry in entries:
+            one_by_one.push(*entry)
+        bulk.push(0, 99, 0)
+        bulk.push_many(entries)  # also re-prioritises key 0
+        self.assert_valid(bulk)
+        self.assertEqual(self.drain(bulk), self.drain(one_by_one))
+
+    def test_peek_k_leaves_the_heap_alone(self):
+        heap = IndexedMaxHeap()
+        for key, priority in enumerate((5, 9, 1, 7, 3)):
+            heap.push(key, priority, key)
+        before = [list(entry) for entry in heap.heap]
+        self.assertEqual(heap.peek_k(3), [1, 3, 0])
+        self.assertEqual(heap.peek_k(10), [1, 3, 0, 4, 2])
+        self.assertEqual(heap.peek_k(0), [])
+        self.assertEqual(heap.heap, before)
+
+    def test_random_operations_keep_the_order(self):
+        rng = random.Random(7)
+        heap, expected = IndexedMaxHeap(), {}
+        for _ in range(2000):
+            key = rng.randrange(100)
+            op = rng.random()
+            if op < 0.5:
+                priority = rng.randint(0, 50)
+                heap.push(key, priority, key)
+                expected[key] = priority
+            elif op < 0.8:
+                self.assertEqual(heap.remove(key), key if key in expected else None)
+                expected.pop(key, None)
+            elif expected:
+                top = min(expected, key=lambda k: (-expected[k], k))
+                self.assertEqual(heap.pop(), top)
+                del expected[top]
+        self.assert_valid(heap)
+        self.assertEqual(self.drain(heap), sorted(expected, key=lambda k: (-expected[k], k)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# tests/test_queue.py
+import unittest
+from types import SimpleNamespace
+
+from data_structures.queue import IndexedQueue
+
+
+def item(item_id, name=None):
+    return SimpleNamespace(id=item_id, name=name or f"request {item_id}")
+
+
+class IndexedQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = IndexedQueue()
+        for item_id in (3, 1, 2):
+            self.queue.enqueue(item(item_id))
+
+    def ids(self):
+        return [i.id for i in self.queue]
+
+    def test_fifo_order(self):
+        self.assertEqual(self.ids(), [3, 1, 2])
+        self.assertEqual(self.queue.peek().id, 3)
+        self.assertEqual(self.queue.dequeue().id, 3)
+        self.assertEqual(self.queue.dequeue().id, 1)
+        self.assertEqual(self.queue.dequeue().id, 2)
+        self.assertIsNone(self.queue.dequeue())
+        self.assertIsNone(self.queue.peek())
+        self.assertTrue(self.queue.is_empty())
+
+    def test_lookup_and_removal_by_key(self):
+        self.assertEqual(self.queue.get(1).name, "request 1")
+        self.assertIsNone(self.queue.get(9))
+        self.assertIn(2, self.queue)
+        self.assertEqual(self.queue.remove(1).id, 1)
+        self.assertIsNone(self.queue.remove(1))
+        self.assertNotIn(1, self.queue)
+        self.assertEqual(self.ids(), [3, 2])
+        self.assertEqual((len(self.queue), self.queue.size()), (2, 2))
+
+    def test_re_enqueue_keeps_the_place_in_line(self):
+        self.queue.enqueue(item(1, "updated"))
+        self.assertEqual(self.ids(), [3, 1, 2])
+        self.assertEqual(self.queue.get(1).name, "updated")
+        self.assertEqual(len(self.queue), 3)
+
+    def test_removed_key_goes_to_the_back_when_added_again(self):
+        self.queue.remove(3)
+        self.queue.enqueue(item(3))
+        self.assertEqual(self.ids(), [1, 2, 3])
+
+    def test_custom_key(self):
+        queue = IndexedQueue(key=lambda entry: entry["name"])
+        queue.enqueue({"name": "a"})
+        queue.enqueue({"name": "b"})
+        self.assertEqual(queue.remove("a"), {"name": "a"})
+        self.assertEqual(queue.peek(), {"name": "b"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+# tests/test_request_service.py
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from services.bin_service import BinService
+from services.request_service import RequestService
+
+
+class RequestCompactionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bins_path = os.path.join(self.tmp.name, "bins.json")
+        with open(self.bins_path, "w") as f:
+            json.dump([{"id": i, "location": f"Bin {i}", "fill_level": 0, "x": 0.0, "y": 0.0}
+                       for i in (1, 2)], f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_requests(self):
+        """A service as another process would have it: its own bins, on the shared data dir"""
+        bins = BinService(file_path=self.bins_path, store=False)
+        return RequestService(file_path=os.path.join(self.tmp.name, "requests.json"), bin_service=bins, store=False)
+
+    def compact(self, requests):
+        # run it aside, so a compaction that waits on its own lock fails the test instead of hanging it
+        worker = threading.Thread(target=requests.compact, daemon=True)
+        worker.start()
+        worker.join(timeout=10)
+        self.assertFalse(worker.is_alive(), "compact() did not finish")
+
+    def queue(self, requests):
+        return [(r.id, r.bin_id, r.request_type, r.count) for r in requests.queue]
+
+    def test_compact_after_another_instance_compacted(self):
+        a, b = self.open_requests(), self.open_requests()
+        a.add_request("alice", 1, "Collect")
+        self.compact(a)
+        # b sees a rewritten snapshot and reloads it while holding the compaction lock
+        self.compact(b)
+        self.assertEqual(self.queue(b), self.queue(a))
+
+    def test_compact_folds_in_other_instance_log(self):
+        a, b = self.open_requests(), self.open_requests()
+        a.add_request("alice", 1, "Collect")
+        b.add_request("bob", 2, "Maintain")
+        self.compact(b)
+        self.compact(a)
+        self.assertEqual(len(a.queue), 2)
+        self.assertEqual(self.queue(self.open_requests()), self.queue(a))
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        bins_path = os.path.join(self.tmp.name, "bins.json")
+        with open(bins_path, "w") as f:
+            json.dump([{"id": i, "location": f"Bin {i}", "fill_level": fill, "x": 0.0, "y": 0.0}
+                       for i, fill in ((1, 50), (2, 55), (3, 50))], f)
+        self.bins = BinService(file_path=bins_path, store=False)
+        self.requests = RequestService(file_path=os.path.join(self.tmp.name, "requests.json"),
+                                       bin_service=self.bins, store=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def order(self):
+        return [(r.bin_id, r.request_type) for r in self.requests.next_batch(10)]
+
+    def test_type_then_fill_level(self):
+        self.requests.add_request("alice", 3, "Maintain")
+        self.requests.add_request("bob", 1, "Collect")
+        self.requests.add_request("carol", 2, "Collect")
+        self.assertEqual(self.order(), [(2, "Collect"), (1, "Collect"), (3, "Maintain")])
+
+    def test_every_report_on_a_bin_counts(self):
+        self.requests.add_request("alice", 1, "Collect")
+        self.requests.add_request("bob", 2, "Collect")
+        self.requests.add_request("carol", 1, "Maintain")  # a second report on bin 1, of another type
+        self.assertEqual(self.order()[0], (1, "Collect"))
+
+    def test_duplicate_reports_raise_urgency(self):
+        self.requests.add_request("alice", 1, "Collect")
+        self.requests.add_request("bob", 2, "Collect")
+        self.assertEqual(self.order()[0], (2, "Collect"))
+        coalesced = self.requests.add_request("carol", 1, "Collect")
+        self.assertEqual((coalesced.count, coalesced.reporters), (2, ["alice", "carol"]))
+        self.assertEqual(len(self.requests.queue), 2)
+        self.assertEqual(self.order()[0], (1, "Collect"))
+
+    def test_dict_snapshot_is_not_changed_by_later_reports(self):
+        req = self.requests.add_request("alice", 1, "Collect")
+        data = req.to_dict()
+        self.requests.add_request("bob", 1, "Collect")
+        self.assertEqual(data["reporters"], ["alice"])
+        self.assertEqual(req.reporters, ["alice", "bob"])
+
+    def test_fill_changes_reorder_the_queue(self):
+        self.requests.add_request("alice", 1, "Collect")
+        self.requests.add_request("bob", 2, "Collect")
+        self.bins.update_bin(1, 90)
+        self.assertEqual(self.order(), [(1, "Collect"), (2, "Collect")])
+
+    def test_waiting_requests_age_past_newer_ones(self):
+        now = datetime.now()
+        self.requests.bulk_add([
+            {"user": "alice", "bin_id": 3, "request_type": "Maintain", "time": now - timedelta(hours=20)},
+            {"user": "bob", "bin_id": 1, "request_type": "Collect", "time": now},
+        ])
+        # 40 + 50 + 20h * 5 beats 100 + 50
+        self.assertEqual(self.order(), [(3, "Maintain"), (1, "Collect")])
+        old, new = self.requests.next_batch(2)
+        self.assertAlmostEqual(self.requests.request_priority(old, now), 190)
+        self.assertAlmostEqual(self.requests.request_priority(new, now), 150)
+        self.assertAlmostEqual(self.requests.request_priority(new, now + timedelta(hours=2)), 160)
+
+    def test_process_next_takes_the_top_request(self):
+        self.requests.add_request("alice", 1, "Collect")
+        self.requests.add_request("bob", 2, "Collect")
+        self.assertEqual(self.requests.process_next().bin_id, 2)
+        self.assertEqual(self.order(), [(1, "Collect")])
+        self.assertEqual(self.requests.next_request().bin_id, 1)
+        self.requests.process_next()
+        self.assertIsNone(self.requests.process_next())
+
+
+if __name__ == "__main__":
+    unittest.main()
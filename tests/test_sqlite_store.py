@@ -0,0 +1,83 @@
+# tests/test_sqlite_store.py
+import os
+import tempfile
+import unittest
+
+from services.bin_service import BinService
+from services.history_service import HistoryService
+from services.request_service import RequestService
+from services.sqlite_store import SqliteStore
+
+
+class DeltaRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "greenbin.db")
+        SqliteStore(self.db_path).repository("bins").replace_all(
+            [{"id": i, "location": f"Bin {i}", "fill_level": 10 * i, "x": 0.0, "y": 0.0} for i in (1, 2, 3)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_services(self):
+        """Bins and requests as another process would have them: a store of their own on the shared database"""
+        store = SqliteStore(self.db_path)
+        history = HistoryService(os.path.join(self.tmp.name, "history.json"), store=store)
+        bins = BinService(file_path=os.path.join(self.tmp.name, "bins.json"), store=store, history=history)
+        requests = RequestService(file_path=os.path.join(self.tmp.name, "requests.json"),
+                                  bin_service=bins, store=store)
+        return bins, requests
+
+    @staticmethod
+    def forbid_full_reads(bins, requests):
+        def fail(*args, **kwargs):
+            raise AssertionError("refresh() read the whole table")
+        bins.repo.all = fail
+        requests.repo.find = fail
+
+    def test_changed_since_lists_written_and_deleted_rows(self):
+        repo = SqliteStore(self.db_path).repository("bins")
+        start = repo.store.generation("bins")
+        repo.put({"id": 2, "location": "Bin 2", "fill_level": 55, "x": 0.0, "y": 0.0})
+        repo.delete(3)
+        generation, changes = repo.changed_since(start)
+        self.assertEqual(generation, start + 2)
+        self.assertEqual(changes, {2: {"id": 2, "location": "Bin 2", "fill_level": 55, "x": 0.0, "y": 0.0},
+                                   3: None})
+        self.assertEqual(repo.changed_since(generation), (generation, {}))
+
+    def test_bins_refresh_applies_only_changed_rows(self):
+        writer, _ = self.open_services()
+        bins, requests = self.open_services()
+        kept = bins.get_bin_by_id(1)
+        self.forbid_full_reads(bins, requests)
+
+        writer.update_bin(1, 80)
+        writer.remove_bin(2)
+        added = writer.add_bin("Elm St", 30)
+        self.assertTrue(bins.refresh())
+        self.assertIs(bins.get_bin_by_id(1), kept)  # updated in place
+        self.assertEqual(kept.fill_level, 80)
+        self.assertEqual(sorted(bins.by_id), [1, 3, added.id])
+        self.assertEqual([b.id for b in bins.most_urgent_bins(2)], [1, 3])
+        self.assertFalse(bins.refresh())
+
+    def test_requests_refresh_applies_only_changed_rows(self):
+        writer_bins, writer = self.open_services()
+        bins, requests = self.open_services()
+        self.forbid_full_reads(bins, requests)
+
+        first = writer.add_request("alice", 1, "Collect")
+        second = writer.add_request("bob", 2, "Maintain")
+        self.assertTrue(requests.refresh())
+        self.assertEqual([r.id for r in requests.queue], [first.id, second.id])
+
+        writer.add_request("carol", 1, "Collect")  # coalesced into the first
+        writer.process_request(second.id)
+        self.assertTrue(requests.refresh())
+        self.assertEqual([(r.id, r.count) for r in requests.queue], [(first.id, 2)])
+        self.assertFalse(requests.refresh())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# tests/test_storage.py
+import json
+import os
+import stat
+import tempfile
+import unittest
+
+from services.bin_service import BinService
+from services.request_service import RequestService
+from services import storage
+from services.storage import CorruptSnapshot, atomic_write_json
+
+
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "data.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def mode(self):
+        return stat.S_IMODE(os.stat(self.path).st_mode)
+
+    def test_keeps_the_mode_of_the_replaced_file(self):
+        with open(self.path, "w") as f:
+            f.write("[]")
+        os.chmod(self.path, 0o640)
+        atomic_write_json(self.path, [1, 2])
+        self.assertEqual(self.mode(), 0o640)
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), [1, 2])
+
+    def test_new_file_follows_the_umask(self):
+        atomic_write_json(self.path, {"a": 1})
+        # as open() would create it, not mkstemp's 0600
+        self.assertEqual(self.mode(), 0o666 & ~storage._UMASK)
+        self.assertEqual(os.listdir(self.tmp.name), ["data.json"])
+
+
+class CorruptSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bins_path = os.path.join(self.tmp.name, "bins.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_corrupt(self, path):
+        with open(path, "w") as f:
+            f.write('[{"id": 1, "location": "Main St", "fill_lev')
+
+    def test_bins_are_not_compacted_over_a_corrupt_snapshot(self):
+        self.write_corrupt(self.bins_path)
+        bins = BinService(file_path=self.bins_path, store=False)
+        self.assertEqual(len(bins.by_id), 0)
+        added = bins.add_bin("Park Ave", 40).id  # logged, not compacted
+        with self.assertRaises(CorruptSnapshot):
+            bins.compact()
+        with self.assertRaises(CorruptSnapshot):
+            bins.bulk_add([{"location": "Elm St", "fill_level": 0, "x": 0.0, "y": 0.0}])
+        with open(self.bins_path) as f:
+            self.assertIn("fill_lev", f.read())
+
+        # once repaired, the log is replayed on top and compaction works again
+        atomic_write_json(self.bins_path, [{"id": 100, "location": "Main St", "fill_level": 10, "x": 0.0, "y": 0.0}])
+        bins.refresh()
+        self.assertEqual(sorted(bins.by_id), [added, 100])
+        bins.compact()
+        self.assertEqual(sorted(BinService(file_path=self.bins_path, store=False).by_id), [added, 100])
+
+    def test_requests_are_not_compacted_over_a_corrupt_snapshot(self):
+        with open(self.bins_path, "w") as f:
+            json.dump([{"id": 1, "location": "Main St", "fill_level": 10, "x": 0.0, "y": 0.0}], f)
+        requests_path = os.path.join(self.tmp.name, "requests.json")
+        self.write_corrupt(requests_path)
+        bins = BinService(file_path=self.bins_path, store=False)
+        requests = RequestService(file_path=requests_path, bin_service=bins, store=False)
+        requests.add_request("alice", 1, "Collect")
+        with self.assertRaises(CorruptSnapshot):
+            requests.compact()
+        with open(requests_path) as f:
+            self.assertIn("fill_lev", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# tests/test_unit_of_work.py
+import json
+import os
+import tempfile
+import unittest
+
+from services.bin_service import BinService
+from services.history_service import HistoryService
+from services.sqlite_store import SqliteStore
+from services.unit_of_work import UnitOfWork
+
+
+class FailingParticipant:
+    """A participant whose commit() fails, as a full disk or a lost database would"""
+
+    def __init__(self):
+        self.rolled_back = False
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        raise OSError("injected failure")
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def compensate(self):
+        raise AssertionError("a participant that never committed is not compensated")
+
+
+class UnitOfWorkFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bins_path = os.path.join(self.tmp.name, "bins.json")
+        with open(self.bins_path, "w") as f:
+            json.dump([{"id": 1, "location": "Main St", "fill_level": 10, "x": 0.0, "y": 0.0},
+                       {"id": 2, "location": "Park Ave", "fill_level": 20, "x": 0.0, "y": 0.0}], f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open_bins(self, store=False):
+        history = HistoryService(os.path.join(self.tmp.name, "history.json"), store=store)
+        return BinService(file_path=self.bins_path, store=store, history=history)
+
+    def assert_untouched(self, bins):
+        self.assertEqual(bins.get_bin_by_id(1).fill_level, 10)
+        self.assertIsNone(bins.get_bin_by_id(3))
+        self.assertEqual(bins.history.count("bin"), 0)
+
+    def fail_second(self, bins):
+        failing = FailingParticipant()
+        with self.assertRaises(OSError):
+            with UnitOfWork(bins, failing, bins.history):
+                bins.update_bin(1, 90)
+                bins.add_bin("New St", fill=50)
+        self.assertTrue(failing.rolled_back)
+
+    def test_flushed_participant_is_compensated(self):
+        bins = self.open_bins()
+        self.fail_second(bins)
+        self.assert_untouched(bins)
+        bins.close()
+        self.assert_untouched(self.open_bins())  # what is on disk
+
+    def test_flushed_history_is_taken_back(self):
+        history = HistoryService(os.path.join(self.tmp.name, "history.json"), store=False)
+        history.push_action("bin", "update_bin", {"id": 2})
+        heard = []
+        history.add_listener(lambda category, action, undone: heard.append((action["type"], undone)))
+        with self.assertRaises(OSError):
+            with UnitOfWork(history, FailingParticipant()):
+                history.push_action("bin", "update_bin", {"id": 1})
+        self.assertEqual(history.count("bin"), 1)
+        self.assertEqual(history.peek_last("bin")["data"], {"id": 2})
+        self.assertEqual(heard, [("update_bin", False), ("update_bin", True)])
+
+    def test_sqlite_participants_share_one_transaction(self):
+        store = SqliteStore(os.path.join(self.tmp.name, "greenbin.db"))
+        store.repository("bins").replace_all(json.load(open(self.bins_path)))
+        bins = self.open_bins(store)
+        self.fail_second(bins)
+        self.assert_untouched(bins)
+        self.assertEqual(store.repository("bins").get(1)["fill_level"], 10)
+        self.assert_untouched(self.open_bins(store))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 # helpers/history_helpers.py
+from datetime import datetime, timedelta
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 from services.history_service import HistoryService
 
 def show_history_search(category="request"):
@@ -9,7 +11,8 @@ def show_history_search(category="request"):
     category: "request", "bin", "dispatch"
     """
     history_service = HistoryService()
-    history_data = history_service.get_category(category)  # list of dicts
+    stack = history_service.get_stack(category)
+    history_data = stack.to_list() if stack else []  # list of dicts
     
     if not history_data:
         st.info(f"No {category} history available.")
@@ -66,3 +69,68 @@ def show_history_search(category="request"):
 
     st.subheader(f"{category.capitalize()} History")
     st.dataframe(df, use_container_width=True)
+
+
+RANGES = {
+    "Last 24 hours": (timedelta(hours=24), "hour"),
+    "Last 7 days": (timedelta(days=7), "day"),
+    "Last 30 days": (timedelta(days=30), "day"),
+    "Last 365 days": (timedelta(days=365), "day"),
+    "All time": (None, "day"),
+}
+
+
+def show_activity_summary(rollup, facility_names=None):
+    """
+    Totals and a per-hour/per-day chart of the history, read from a
+    HistoryRollup (services/rollup_service.py) instead of the raw actions.
+    facility_names maps facility ids to names for the facility filter.
+    """
+    facility_names = facility_names or {}
+
+    with st.container(border=True):
+        c_range, c_category, c_action, c_bin, c_facility = st.columns(5)
+        with c_range:
+            range_label = st.selectbox("Period", list(RANGES), index=2, key="rollup_range")
+        with c_category:
+            category = st.selectbox("Category", ["All"] + rollup.values("category"), key="rollup_category")
+        filters = {} if category == "All" else {"category": category}
+        with c_action:
+            action_type = st.selectbox("Action", ["All"] + rollup.values("action_type", **filters), key="rollup_action")
+        if action_type != "All":
+            filters["action_type"] = action_type
+        with c_bin:
+            bin_type = st.selectbox("Bin Type", ["All"] + rollup.values("bin_type", **filters), key="rollup_bin_type")
+        if bin_type != "All":
+            filters["bin_type"] = bin_type
+        with c_facility:
+            facilities = rollup.values("facility", **filters)
+            facility = st.selectbox("Facility", ["All"] + facilities, key="rollup_facility",
+                                    format_func=lambda f: f if f == "All" else facility_names.get(f, f"Facility {f}"))
+        if facility != "All":
+            filters["facility"] = facility
+
+    span, by = RANGES[range_label]
+    start = datetime.now() - span if span else None
+    totals = rollup.query(start, None, **filters)
+    series = rollup.query(start, None, by=by, **filters)
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Actions", totals["actions"])
+    m2.metric("Items", totals["items"])
+    m3.metric("CO2 (kg)", f"{totals['co2']:.1f}")
+
+    if series:
+        df = pd.DataFrame([{"Time": bucket, "Actions": cell["actions"], "Items": cell["items"]}
+                           for bucket, cell in series.items()])
+        fig = px.bar(df, x="Time", y="Actions", hover_data=["Items"],
+                     title=f"Actions per {by}")
+        fig.update_layout(
+            height=300,
+            margin=dict(l=20, r=20, t=40, b=20),
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No activity in this period.")
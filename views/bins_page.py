@@ -1,5 +1,7 @@
+import time
 import streamlit as st
 import pandas as pd
+from services.registry import registry
 
 def show_bins_page(bin_service):
     st.title("Bins Management")
@@ -9,11 +11,12 @@ def show_bins_page(bin_service):
     load_css("metric_card.css")
     
     # Overview metrics at the top
-    total_bins = len(bin_service.bins)
-    full_bins = sum(1 for b in bin_service.bins if b.fill_level >= 90)
-    half_bins = sum(1 for b in bin_service.bins if 50 <= b.fill_level < 90)
-    empty_bins = sum(1 for b in bin_service.bins if b.fill_level < 50)
-    avg_fill = sum(b.fill_level for b in bin_service.bins) / total_bins if total_bins > 0 else 0
+    bins = bin_service.get_all_bins()
+    total_bins = len(bins)
+    full_bins = sum(1 for b in bins if b.fill_level >= 90)
+    half_bins = sum(1 for b in bins if 50 <= b.fill_level < 90)
+    empty_bins = sum(1 for b in bins if b.fill_level < 50)
+    avg_fill = sum(b.fill_level for b in bins) / total_bins if total_bins > 0 else 0
     
     # Metrics row
     m1, m2, m3, m4, m5 = st.columns(5)
@@ -61,7 +64,7 @@ def show_bins_page(bin_service):
     st.markdown("---")
     
     # Main Content - Tabbed Interface
-    tab1, tab2, tab3, tab4 = st.tabs(["Current Inventory", "Add Bin", "Update Bin", "Delete Bin"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Current Inventory", "Add Bin", "Update Bin", "Delete Bin", "Fill History"])
     
     # TAB 1: Current Inventory (with Undo)
     with tab1:
@@ -87,9 +90,16 @@ def show_bins_page(bin_service):
             with c_order:
                 sort_order = st.selectbox("Order", ["Ascending", "Descending"], label_visibility="collapsed")
 
-            if bin_service.bins:
+            if bins:
+                # Filter Logic: ID and location substring matches come from the
+                # service's trigram indexes, so a search never walks every bin
+                if search_query:
+                    shown = bin_service.search(search_query.strip())
+                else:
+                    shown = bins
+
                 bins_data = []
-                for b in bin_service.bins:
+                for b in shown:
                     # Add status based on fill level
                     if b.fill_level >= 90:
                         status = "Critical"
@@ -111,15 +121,7 @@ def show_bins_page(bin_service):
                         "Y": b.y
                     })
                 
-                df = pd.DataFrame(bins_data)
-                
-                # Filter Logic
-                if search_query:
-                    query = search_query.lower()
-                    df = df[
-                        df["Location"].str.lower().str.contains(query) | 
-                        df["ID"].astype(str).str.contains(query)
-                    ]
+                df = pd.DataFrame(bins_data, columns=["ID", "Location", "Type", "Fill Level", "Capacity", "Status", "X", "Y"])
                 
                 # Sort Logic
                 ascending = sort_order == "Ascending"
@@ -176,7 +178,6 @@ def show_bins_page(bin_service):
                 if submitted:
                     if location.strip():
                         bin_service.add_bin(location, fill, x,y, bin_type)
-                        bin_service.save_bins()
                         st.success(f"Added!")
                         st.rerun()
                     else:
@@ -186,14 +187,14 @@ def show_bins_page(bin_service):
     with tab3:
         with st.container(border=True):
             st.subheader("Update Bin Status")
-            bin_ids = [b.id for b in bin_service.bins]
+            bin_ids = [b.id for b in bins]
             
             if bin_ids:
                 with st.form("update_bin_form"):
                     selected_id = st.selectbox("Select Bin", bin_ids)
                     
                     # Show current fill level
-                    current_bin = next((b for b in bin_service.bins if b.id == selected_id), None)
+                    current_bin = bin_service.get_bin_by_id(selected_id)
                     if current_bin:
                         st.caption(f"Current: {current_bin.fill_level}%")
                     
@@ -213,7 +214,7 @@ def show_bins_page(bin_service):
     with tab4:
         with st.container(border=True):
             st.subheader("Remove Bin")
-            bins_removal = [b.id for b in bin_service.bins]
+            bins_removal = [b.id for b in bins]
             
             if bins_removal:
                 with st.form("delete_bin_form"):
@@ -227,3 +228,31 @@ def show_bins_page(bin_service):
                         st.rerun()
             else:
                 st.info("No bins")
+
+    # TAB 5: Fill History (hourly min/mean/max from the fill series store)
+    with tab5:
+        with st.container(border=True):
+            st.subheader("Fill History")
+            history_ids = [b.id for b in bins]
+
+            if history_ids:
+                col_bin, col_range = st.columns(2)
+                with col_bin:
+                    history_id = st.selectbox("Select Bin", history_ids, key="fill_history_bin")
+                with col_range:
+                    days = st.selectbox("Range", [1, 7, 30], key="fill_history_days",
+                                        format_func=lambda d: f"Last {d} day{'s' if d > 1 else ''}")
+
+                hourly = registry.get("fill_series").downsample(history_id, start=time.time() - days * 86400)
+                if len(hourly["time"]):
+                    df_history = pd.DataFrame({
+                        "Hour": pd.to_datetime(hourly["time"], unit="s"),
+                        "Min": hourly["min"],
+                        "Mean": hourly["mean"],
+                        "Max": hourly["max"],
+                    })
+                    st.line_chart(df_history, x="Hour", y=["Min", "Mean", "Max"])
+                else:
+                    st.info("No fill readings recorded for this bin in that range")
+            else:
+                st.info("No bins")
@@ -13,8 +13,9 @@ def show_dispatch_page(vehicle_service, bin_service):
     service = vehicle_service
     
     # Metrics
-    total_bins = len(bin_service.bins)
-    full_bins = sum(1 for b in bin_service.bins if b.fill_level > 80)
+    bins = bin_service.get_all_bins()
+    total_bins = len(bins)
+    full_bins = sum(1 for b in bins if b.fill_level > 80)
     active_vehicles = sum(1 for v in service.vehicles if v.target_bin)
     
     # Calculate total distance (km)
@@ -60,7 +61,7 @@ def show_dispatch_page(vehicle_service, bin_service):
 
     # Prepare Data for JavaScript (Moved up to be available for map generation)
     bins_data = []
-    for b in bin_service.bins:
+    for b in bins:
         bins_data.append({
             "id": b.id,
             "lat": b.x,
@@ -77,23 +77,32 @@ def show_facilities_page(service):
         
         st.markdown("### Facilities Grid")
         
-        # Filter Logic
-        filtered_facilities = facilities
-        if search_name:
-            filtered_facilities = [f for f in filtered_facilities if search_name.lower() in f.name.lower()]
-        
-        if filter_type != "All":
-            filtered_facilities = [f for f in filtered_facilities if f.type == filter_type]
-            
-        # Sort Logic
-        if sort_option == "ID":
-            filtered_facilities.sort(key=lambda x: x.id)
-        elif sort_option == "Name":
-            filtered_facilities.sort(key=lambda x: x.name.lower())
-        elif sort_option == "Capacity":
-            filtered_facilities.sort(key=lambda x: x.capacity, reverse=True)
-        elif sort_option == "Efficiency":
-            filtered_facilities.sort(key=lambda x: x.efficiency, reverse=True)
+        sort_attribute, descending = {
+            "ID": ("id", False),
+            "Name": ("name", False),
+            "Capacity": ("capacity", True),
+            "Efficiency": ("efficiency", True),
+        }[sort_option]
+        page_size = 30
+
+        if not search_name and filter_type == "All":
+            # Page straight out of the service's index for that ordering
+            total = service.count()
+            pages = max((total - 1) // page_size + 1, 1)
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="facility_page") if pages > 1 else 1
+            filtered_facilities = service.get_page(sort_attribute, (page - 1) * page_size, page_size, descending)
+        else:
+            # Sort Logic: walk the index for that ordering, then filter
+            filtered_facilities = service.get_sorted(sort_attribute, descending)
+            if search_name:
+                matches = {f.id for f in service.search_by_name(search_name)}
+                filtered_facilities = [f for f in filtered_facilities if f.id in matches]
+            if filter_type != "All":
+                filtered_facilities = [f for f in filtered_facilities if f.type == filter_type]
+
+            pages = max((len(filtered_facilities) - 1) // page_size + 1, 1)
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="facility_page") if pages > 1 else 1
+            filtered_facilities = filtered_facilities[(page - 1) * page_size:page * page_size]
 
         # Display Grid
         if filtered_facilities:
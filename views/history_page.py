@@ -1,7 +1,8 @@
 # views/history_page.py
 import streamlit as st
 import pandas as pd
-from services.history_service import HistoryService
+from services.registry import registry
+from utils.history_helper import show_activity_summary
 
 def show_request_history(history_service):
     """Display request history in a clean format with filters"""
@@ -21,8 +22,25 @@ def show_request_history(history_service):
                 status = "Processed"
             elif action_type == "cancel_request":
                 status = "Cancelled"
+            elif action_type == "coalesce_request":
+                status = "Coalesced"
+            elif action_type == "process_bin":
+                status = "Processed (Bin)"
             else:
                 status = action_type
+
+            if action_type == "process_bin":
+                requests = data.get("requests", [])
+                history_data.append({
+                    "#": i,
+                    "Action": status,
+                    "Request ID": ", ".join(str(r.get("id")) for r in requests),
+                    "User": ", ".join(sorted({u for r in requests for u in r.get("reporters", [r.get("user")])})),
+                    "Bin ID": data.get("bin_id", "N/A"),
+                    "Type": ", ".join(sorted({r.get("request_type", "N/A") for r in requests})),
+                    "Timestamp": max((r.get("time", "") for r in requests), default="N/A")
+                })
+                continue
             
             history_data.append({
                 "#": i,
@@ -120,6 +138,15 @@ def show_dispatch_history(history_service):
                     st.caption("Vehicles")
                     vehicle_data = []
                     for v in vehicles[:10]:
+                        if "prior" in v:
+                            # delta entry: only the fields this dispatch changed
+                            prior_bin = v["prior"].get("target_bin")
+                            vehicle_data.append({
+                                "ID": v.get("id"),
+                                "Previous Target": prior_bin.get("id") if prior_bin else "None",
+                                "Changed": ", ".join(sorted(v["prior"]))
+                            })
+                            continue
                         vehicle_data.append({
                             "ID": v.get("id"),
                             "Load": v.get("load"),
@@ -132,9 +159,15 @@ def show_dispatch_history(history_service):
                         st.caption(f"... and {len(vehicles) - 10} more vehicles")
 
                 with col2:
-                    st.caption("Bins")
+                    st.caption("Bins" if action_type == "dispatch_all" else "Bins Emptied")
                     bin_data = []
                     for b in bins[:10]:
+                        if action_type == "dispatch_delta":
+                            bin_data.append({
+                                "ID": b.get("id"),
+                                "Fill Before": f"{b.get('fill_level', 0)}%"
+                            })
+                            continue
                         bin_data.append({
                             "ID": b.get("id"),
                             "Location": b.get("location"),
@@ -155,16 +188,12 @@ def show_history_page():
     from utils.ui_helper import load_css
     load_css("metric_card.css")
     
-    history_service = HistoryService()
-    
-    # Metrics overview
-    request_stack = history_service.get_stack("request")
-    bin_stack = history_service.get_stack("bin")
-    dispatch_stack = history_service.get_stack("dispatch")
+    history_service = registry.get("history")
     
-    request_count = len(request_stack.to_list()) if request_stack and not request_stack.is_empty() else 0
-    bin_count = len(bin_stack.to_list()) if bin_stack and not bin_stack.is_empty() else 0
-    dispatch_count = len(dispatch_stack.to_list()) if dispatch_stack and not dispatch_stack.is_empty() else 0
+    # Metrics overview (counts come from the segment index, no full load)
+    request_count = history_service.count("request")
+    bin_count = history_service.count("bin")
+    dispatch_count = history_service.count("dispatch")
     total_actions = request_count + bin_count + dispatch_count
     
     col1, col2, col3, col4 = st.columns(4)
@@ -202,6 +231,13 @@ def show_history_page():
         """, unsafe_allow_html=True)
     
     st.markdown("---")
+
+    # Activity over time, from the pre-aggregated rollups
+    st.markdown("### Activity")
+    facility_names = {f.id: f.name for f in registry.get("facilities").get_all()}
+    show_activity_summary(registry.get("rollups"), facility_names)
+
+    st.markdown("---")
     
     # Tabs for different history types
     tab1, tab2, tab3 = st.tabs(["Request History", "Bin History", "Dispatch History"])
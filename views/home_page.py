@@ -2,8 +2,7 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from services.reporting_service import ReportService
-from services.prediction_service import PredictionService
+from services.registry import registry
 from utils.ui_helper import load_css
 
 def show_home(bin_service, vehicle_service):
@@ -12,7 +11,7 @@ def show_home(bin_service, vehicle_service):
     st.subheader("Environmental & Operational Report")
     load_css("metric_card.css")
 
-    report_service = ReportService()
+    report_service = registry.get("reports")
 
     # Summary metrics
     total_requests = report_service.total_requests()
@@ -90,7 +89,6 @@ def show_home(bin_service, vehicle_service):
 
     # Container 1: Table + Pie chart
     with st.container():
-        report_service = ReportService() # Keep this if other parts of the report still need it
         co2_dict = report_service.co2_saved_per_facility()
         df_co2 = pd.DataFrame(list(co2_dict.items()), columns=["Facility", "CO2_Saved"])
         
@@ -130,8 +128,8 @@ def show_home(bin_service, vehicle_service):
             st.plotly_chart(fig2, use_container_width=True)
 
 
-    # Initialize prediction
-    prediction_service = PredictionService(bin_service)
+    # Fill rates learned from sensor updates (shared, so it keeps learning across reruns)
+    prediction_service = registry.get("predictions")
     top_bins = prediction_service.top_overflow_bins(hours_ahead=2, top_n=20)
 
     df_top_bins = pd.DataFrame([
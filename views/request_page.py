@@ -1,9 +1,7 @@
 # views/request_page.py
 import streamlit as st
 import pandas as pd
-from services.request_service import RequestService
-from services.user_service import UserService
-from services.bin_service import BinService
+from services.registry import registry
 from datetime import datetime
 
 def show_request_page():
@@ -14,9 +12,9 @@ def show_request_page():
     load_css("metric_card.css")
     
     # Initialize services
-    user_service = UserService()
-    bin_service = BinService()
-    request_service = RequestService()
+    user_service = registry.get("users")
+    bin_service = registry.get("bins")
+    request_service = registry.get("requests")
     
     # Metrics Overview
     all_requests = request_service.get_all_requests()
@@ -81,19 +79,22 @@ def show_request_page():
                     st.warning("Nothing to undo")
         
         if all_requests:
-            for i, r in enumerate(all_requests):
+            # Highest priority first (request type, bin fill, duplicates and waiting time)
+            for i, r in enumerate(request_service.next_batch(total_requests)):
                 with st.container(border=True):
                     col_info, col_actions = st.columns([3, 1])
                     
                     with col_info:
                         st.markdown(f"**Request #{r.id}**")
-                        st.caption(f"Created: {r.time.strftime('%Y-%m-%d %H:%M')}")
+                        st.caption(f"Created: {r.time.strftime('%Y-%m-%d %H:%M')} | Priority: {request_service.request_priority(r):.0f}")
                         
                         c_a, c_b = st.columns(2)
                         c_a.markdown(f"User: **{r.user}**")
                         c_b.markdown(f"Bin ID: **{r.bin_id}**")
                         
                         st.markdown(f"Type: **{r.request_type}**")
+                        if r.count > 1:
+                            st.caption(f"Reported {r.count} times by {', '.join(sorted(set(r.reporters)))}")
                         
                     with col_actions:
                         if st.button("Process", key=f"process_{r.id}", use_container_width=True, type="primary"):
@@ -104,6 +105,11 @@ def show_request_page():
                             request_service.cancel_request(r.id)
                             st.warning(f"Cancelled #{r.id}")
                             st.rerun()
+                        if len(request_service.open_requests_for_bin(r.bin_id)) > 1:
+                            if st.button("Process Bin", key=f"process_bin_{r.id}", use_container_width=True, type="secondary"):
+                                closed = request_service.process_bin(r.bin_id)
+                                st.success(f"Closed {closed} requests for Bin {r.bin_id}")
+                                st.rerun()
         else:
             st.info("No pending requests. Great job!")
     
@@ -134,7 +140,7 @@ def show_request_page():
                 
                 with col_right:
                     # Bin selection
-                    bins = bin_service.bins
+                    bins = bin_service.get_all_bins()
                     bin_options = {f"Bin {b.id} - {b.location} ({b.fill_level}%)": b.id for b in bins}
                     
                     if bin_options: